@@ -0,0 +1 @@
+# Stub file, the socket classes are built in
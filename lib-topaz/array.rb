@@ -1,27 +1,4 @@
 class Array
-  def initialize(size_or_arr = nil, obj = nil, &block)
-    self.clear
-    return self if size_or_arr.nil?
-    if obj.nil?
-      if ary = Topaz.try_convert_type(size_or_arr, Array, :to_ary)
-        return self.replace(ary)
-      end
-    end
-    length = Topaz.convert_type(size_or_arr, Fixnum, :to_int)
-    raise ArgumentError.new("negative array size") if length < 0
-    if block
-      # TODO: Emit "block supersedes default value argument" warning
-      length.times { |i| self << yield(i) }
-    else
-      length.times { self << obj }
-    end
-    return self
-  end
-
-  def self.[](*args)
-    args.inject(allocate) { |array, arg| array << arg}
-  end
-
   def inspect
     result = "["
     recursion = Thread.current.recursion_guard(:array_inspect, self) do
@@ -180,30 +157,6 @@ class Array
     Array.new(self).sort_by!(&block)
   end
 
-  def ==(other)
-    if self.equal?(other)
-      return true
-    end
-    if !other.kind_of?(Array)
-      if other.respond_to?(:to_ary)
-        return other == self
-      else
-        return false
-      end
-    end
-    if self.size != other.size
-      return false
-    end
-    Thread.current.recursion_guard(:array_equals, self) do
-      self.each_with_index do |x, i|
-        if x != other[i]
-          return false
-        end
-      end
-    end
-    return true
-  end
-
   def <=>(other)
     return 0 if self.equal?(other)
     other = Array.try_convert(other)
@@ -220,37 +173,6 @@ class Array
     nil
   end
 
-  def eql?(other)
-    if self.equal?(other)
-      return true
-    end
-    if !other.kind_of?(Array)
-      return false
-    end
-    if self.length != other.length
-      return false
-    end
-    Thread.current.recursion_guard(:array_eqlp, self) do
-      self.each_with_index do |x, i|
-        if !x.eql?(other[i])
-          return false
-        end
-      end
-    end
-    return true
-  end
-
-  def hash
-    res = 0x345678
-    Thread.current.recursion_guard(:array_hash, self) do
-      self.each do |x|
-        # We want to keep this within a fixnum range.
-        res = Topaz.intmask((1000003 * res) ^ x.hash)
-      end
-    end
-    return res
-  end
-
   def map!(&block)
     return self.enum_for(:map!) unless block
     raise RuntimeError.new("can't modify frozen #{self.class}") if frozen?
@@ -260,37 +182,6 @@ class Array
 
   alias :collect! :map!
 
-  def uniq!(&block)
-    raise RuntimeError.new("can't modify frozen #{self.class}") if frozen?
-    seen = {}
-    old_length = self.length
-    i = 0
-    shifted = 0
-    while i < old_length do
-      item = self[i]
-      item = yield(item) if block
-      if seen.include? item
-        shifted += 1
-      else
-        seen[item] = nil
-        self[i - shifted] = item if shifted > 0
-      end
-      i += 1
-    end
-    if shifted > 0
-      self.slice!(-shifted, shifted)
-      return self
-    else
-      return nil
-    end
-  end
-
-  def uniq(&block)
-    arr = self.dup
-    arr.uniq!(&block)
-    return arr
-  end
-
   def values_at(*args)
     out = []
     args.each do |arg|
@@ -384,28 +275,6 @@ class Array
     self.instance_of?(Array) ? self : Array.new(self)
   end
 
-  def &(other)
-    other = Topaz.convert_type(other, Array, :to_ary)
-    h = {}
-    other.each { |e| h[e] = true }
-    self.select { |e| h.delete(e) }
-  end
-
-  def |(other)
-    other = Topaz.convert_type(other, Array, :to_ary)
-    h = {}
-    self.each { |e| h[e] = true }
-    other.each { |e| h.fetch(e) { |v| h[v] = true } }
-    h.keys
-  end
-
-  def -(other)
-    other = Topaz.convert_type(other, Array, :to_ary)
-    h = {}
-    other.each { |e| h[e] = true }
-    self.reject { |e| h.has_key?(e) }
-  end
-
   def permutation(r = nil, &block)
     return self.enum_for(:permutation, r) unless block
     r = r ? Topaz.convert_type(r, Fixnum, :to_int) : self.size
@@ -434,67 +303,6 @@ class Array
     self
   end
 
-  def fill(*args, &block)
-    raise RuntimeError.new("can't modify frozen #{self.class}") if frozen?
-
-    if block
-      raise ArgumentError.new("wrong number of arguments (#{args.size} for 0..2)") if args.size > 2
-      one, two = args
-    else
-      raise ArgumentError.new("wrong number of arguments (#{args.size} for 1..3)") if args.empty? || args.size > 3
-      obj, one, two = args
-    end
-
-    if one.kind_of?(Range)
-      raise TypeError.new("no implicit conversion of Range into Integer") if two
-
-      left = Topaz.convert_type(one.begin, Fixnum, :to_int)
-      left += size if left < 0
-      raise RangeError.new("#{one} out of range") if left < 0
-
-      right = Topaz.convert_type(one.end, Fixnum, :to_int)
-      right += size if right < 0
-      right += 1 unless one.exclude_end?
-      return self if right <= left
-
-    elsif one
-      left = Topaz.convert_type(one, Fixnum, :to_int)
-      left += size if left < 0
-      left = 0 if left < 0
-
-      if two
-        right = Topaz.convert_type(two, Fixnum, :to_int)
-        return self if right == 0
-        right += left
-      else
-        right = size
-      end
-    else
-      left = 0
-      right = size
-    end
-
-    right_bound = (right > size) ? size : right
-
-    i = left
-    while i < right_bound
-      self[i] = block ? yield(i) : obj
-      i += 1
-    end
-
-    if left > size
-      self.concat([nil] * (left - size))
-      i = size
-    end
-
-    while i < right
-      self << (block ? yield(i) : obj)
-      i += 1
-    end
-
-    self
-  end
-
   def transpose
     return [] if self.empty?
 
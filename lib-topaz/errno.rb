@@ -25,4 +25,23 @@ module Errno
 
   class ENOTEMPTY < SystemCallError
   end
+
+  class EAGAIN < SystemCallError
+  end
+  EWOULDBLOCK = EAGAIN
+
+  class EPIPE < SystemCallError
+  end
+
+  class EADDRINUSE < SystemCallError
+  end
+
+  class ECONNREFUSED < SystemCallError
+  end
+
+  class ECONNRESET < SystemCallError
+  end
+
+  class ENOTCONN < SystemCallError
+  end
 end
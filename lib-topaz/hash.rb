@@ -1,18 +1,4 @@
 class Hash
-  def each(&block)
-    return self.enum_for(:each) if !block
-    iter = Topaz::HashIterator.new(self)
-    while true
-      begin
-        key, value = iter.next()
-      rescue StopIteration
-        return self
-      end
-      yield [key, value]
-    end
-  end
-  alias each_pair each
-
   def self.[](*args)
     if args.size == 1
       arg = args[0]
@@ -41,72 +27,6 @@ class Hash
     h
   end
 
-  def each_key(&block)
-    return self.enum_for(:each_key) if !block
-    each { |k, v| yield k }
-  end
-
-  def each_value(&block)
-    return self.enum_for(:each_value) if !block
-    each { |k, v| yield v }
-  end
-
-  def to_a
-    res = []
-    each do |k, v|
-      res << [k, v]
-    end
-    res
-  end
-
-  def ==(other)
-    return true if self.equal?(other)
-    return false unless other.kind_of?(Hash)
-    return false unless self.size == other.size
-    Thread.current.recursion_guard(:hash_compare, self) do
-      self.each do |key, value|
-        return false unless other.has_key?(key) && value == other[key]
-      end
-    end
-    true
-  end
-
-  def eql?(other)
-    return true if self.equal?(other)
-    return false unless other.kind_of?(Hash)
-    return false unless self.size == other.size
-    Thread.current.recursion_guard(:hash_eql, self) do
-      self.each do |key, value|
-        return false unless other.has_key?(key) && value.eql?(other[key])
-      end
-    end
-    true
-  end
-
-  def merge!(other, &block)
-    raise RuntimeError.new("can't modify frozen #{self.class}") if frozen?
-    other = Topaz.convert_type(other, Hash, :to_hash)
-    if block
-      other.each do |key, val|
-        if has_key? key
-          self[key] = block.call key, self[key], val
-        else
-          self[key] = val
-        end
-      end
-    else
-      other.each do |key, val|
-        self[key] = val
-      end
-    end
-    self
-  end
-  alias update merge!
-
-  def merge(other, &block)
-    dup.merge! other, &block
-  end
-
   def assoc(key)
     each do |k, v|
       return [k, v] if key == k
@@ -188,11 +108,6 @@ class Hash
     self
   end
 
-  def select(&block)
-    return enum_for(:select) unless block
-    dup.keep_if(&block)
-  end
-
   def reject!(&block)
     return enum_for(:reject!) unless block
     raise RuntimeError.new("can't modify frozen #{self.class}") if frozen?
@@ -213,11 +128,6 @@ class Hash
     self
   end
 
-  def reject(&block)
-    return enum_for(:reject) unless block
-    dup.delete_if(&block)
-  end
-
   def flatten(level = 1)
     level = Topaz.convert_type(level, Fixnum, :to_int)
     out = []
@@ -1,4 +1,18 @@
 class IO
+  module WaitReadable
+  end
+
+  module WaitWritable
+  end
+
+  class EAGAINWaitReadable < Errno::EAGAIN
+    include IO::WaitReadable
+  end
+
+  class EAGAINWaitWritable < Errno::EAGAIN
+    include IO::WaitWritable
+  end
+
   class << self
     alias for_fd new
   end
@@ -26,78 +40,12 @@ class IO
     seek(i, IO::SEEK_SET)
   end
 
-  def each_line(sep = $/, limit = nil)
-    if sep.is_a?(Fixnum) && limit.nil?
-      limit = sep
-      sep = $/
-    end
-
-    if sep.nil?
-      yield(limit ? read(limit) : read)
-      return self
-    end
-
-    if limit == 0
-      raise ArgumentError.new("invalid limit: 0 for each_line")
-    end
-
-    rest = ""
-    nxt = read(8192)
-    need_read = false
-    while nxt || rest
-      if nxt && need_read
-        rest = rest ? rest + nxt : nxt
-        nxt = read(8192)
-        need_read = false
-      end
-
-      line, rest = *rest.split(sep, 2)
-
-      if limit && line.size > limit
-        left = 0
-        right = limit
-        while right < line.size
-          yield line[left...right]
-          left, right = right, right + limit
-        end
-        rest = line[right - limit..-1] + sep + (rest || "")
-      elsif rest || nxt.nil?
-        yield line
-      else
-        need_read = true
-      end
-    end
-    self
-  end
-  alias each each_line
-  alias lines each_line
-
   def readline(sep = $/, limit = nil)
     line = gets(sep, limit)
     raise EOFError.new("end of file reached") if line.nil?
     line
   end
 
-  def gets(sep = $/, limit = nil)
-    if sep.nil?
-      return read
-    end
-    if sep.is_a?(Fixnum) && limit.nil?
-      limit = sep
-      sep = $/
-    end
-    raise IOError.new("closed stream") if closed?
-    line = ""
-    loop do
-      c = getc
-      break if c.nil? || c.empty?
-      line << c
-      break if c == sep || line.length == limit
-    end
-    $_ = line
-    line.empty? ? nil : line
-  end
-
   def readlines(sep = $/, limit = nil)
     lines = []
     each_line(sep, limit) { |line| lines << line }
@@ -1,34 +1,4 @@
 class Range
-  def each(&block)
-    return self.enum_for unless block
-    unless self.begin.respond_to?(:succ)
-      raise TypeError.new("can't iterate from #{self.begin.class}")
-    end
-
-    case self.begin
-    when String
-      self.begin.upto(self.end, self.exclude_end?, &block)
-    when Symbol
-      self.begin.to_s.upto(self.end.to_s, self.exclude_end?) do |s|
-        yield s.to_sym
-      end
-    else
-      i = self.begin
-      if self.exclude_end?
-        while (i <=> self.end) < 0 do
-          yield i
-          i = i.succ
-        end
-      else
-        while (i <=> self.end) <= 0 do
-          yield i
-          i = i.succ
-        end
-      end
-    end
-    self
-  end
-
   def step(step_size = 1, &block)
     return self.to_enum(:step, step_size) unless block
     first = self.begin
@@ -1,12 +1,23 @@
+from rpython.config.config import OptionDescription, BoolOption
 from rpython.jit.codewriter.policy import JitPolicy
 
 from topaz.main import create_entry_point, get_topaz_config_options
 
 
+def get_additional_config_options():
+    return OptionDescription("topaz", "Topaz options", [
+        BoolOption("kernel_snapshot",
+            "Load the Ruby kernel (lib-topaz) during translation, instead of at every startup",
+            default=False, cmdline="--kernel-snapshot"),
+    ])
+
+
 def target(driver, args):
     driver.exe_name = "bin/topaz"
     driver.config.set(**get_topaz_config_options())
-    return create_entry_point(driver.config), None
+    return create_entry_point(
+        driver.config, kernel_snapshot=driver.config.topaz.kernel_snapshot
+    ), None
 
 
 def jitpolicy(driver):
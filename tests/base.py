@@ -45,10 +45,9 @@ class BaseTopazTest(object):
             return [self.unwrap(space, w_x) for w_x in space.listview(w_obj)]
         elif isinstance(w_obj, W_HashObject):
             h = {}
-            contents = w_obj.strategy.unerase(w_obj.dict_storage)
-            w_hash = contents
-            for w_key in w_hash.keys():
-                h[self.unwrap(space, w_key)] = self.unwrap(space, w_hash[w_key])
+            for w_key in w_obj.strategy.keys(space, w_obj.dict_storage):
+                w_value = w_obj.strategy.getitem(space, w_obj.dict_storage, w_key)
+                h[self.unwrap(space, w_key)] = self.unwrap(space, w_value)
             return h
         elif isinstance(w_obj, W_ModuleObject):
             return w_obj
@@ -19,6 +19,9 @@ def pytest_funcarg__space(request):
             overrides=get_topaz_config_options(),
         ))
         space.setup(topaz.__file__)
+        # stdout isn't a terminal under capture, make it unbuffered anyway so
+        # tests can read what was written with capfd right away.
+        space.execute("$stdout.sync = true")
         return space
 
     space = request.cached_setup(
@@ -180,3 +180,52 @@ class TestEnumberable(BaseTopazTest):
         assert self.unwrap(space, w_res) == range(1, 11)
         w_res = space.execute("return (1..10).reject { |i| i < 11 }")
         assert self.unwrap(space, w_res) == []
+
+    def test_inject_op(self, space):
+        w_res = space.execute("""
+        return [1, 2, 3].inject(:+), (1..5).inject(10, :*), [2, 3].inject("*"), [].inject(:+), {1 => 2}.inject(:+)
+        """)
+        assert self.unwrap(space, w_res) == [6, 1200, 6, None, [1, 2]]
+        with self.raises(space, "ArgumentError", "wrong number of arguments (3 for 0..2)"):
+            space.execute("[1].inject(1, 2, 3)")
+
+    def test_each_slice(self, space):
+        w_res = space.execute("""
+        res = []
+        [1, 2, 3, 4, 5].each_slice(2) { |s| res << s }
+        (1..3).each_slice(3) { |s| res << s }
+        {:a => 1, :b => 2}.each_slice(1) { |s| res << s }
+        return res, [1, 2, 3].each_slice(2).to_a
+        """)
+        assert self.unwrap(space, w_res) == [
+            [[1, 2], [3, 4], [5], [1, 2, 3], [["a", 1]], [["b", 2]]],
+            [[1, 2], [3]],
+        ]
+        with self.raises(space, "ArgumentError", "invalid slice size"):
+            space.execute("[1].each_slice(0) {}")
+
+    def test_builtin_fast_paths(self, space):
+        w_res = space.execute("""
+        h = {:a => 1, :b => 2}
+        return [
+          h.map { |k, v| v * 2 }, h.each_with_index.map { |(k, v), i| [v, i] },
+          (1...4).map { |i| i * i }, (1..6).select(&:even?), ("a".."c").map(&:upcase),
+          [[1, 2], [3, 4]].map { |a, b| a + b }, [1, 2, 3].map { |x| break 42 },
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            [2, 4], [[1, 0], [2, 1]], [1, 4, 9], [2, 4, 6], ["A", "B", "C"], [3, 7], 42
+        ]
+
+    def test_overridden_each(self, space):
+        w_res = space.execute("""
+        class MyHash < Hash
+          def each
+            yield [:x, 1]
+          end
+        end
+        h = MyHash.new
+        h[:a] = 2
+        return h.map { |k, v| k }, h.inject { |a, b| a }
+        """)
+        assert self.unwrap(space, w_res) == [["x"], ["x", 1]]
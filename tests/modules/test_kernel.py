@@ -344,6 +344,57 @@ class TestRequire(BaseTopazTest):
         """ % (f, f, f))
         assert space.int_w(w_res) == 1
 
+    def test_loaded_features_modified(self, space, tmpdir):
+        f = tmpdir.join("f.rb")
+        f.write("""
+        @a += 1
+        """)
+
+        w_res = space.execute("""
+        @a = 0
+        require '%s'
+        $".delete('%s')
+        require '%s'
+        require '%s'
+        return @a, $".last.frozen?
+        """ % (f, f, f, f))
+        assert self.unwrap(space, w_res) == [2, True]
+        g = tmpdir.join("g.rb")
+        g.write("""
+        @b += 1
+        """)
+        w_res = space.execute("""
+        @b = 0
+        $" << '%s'
+        require '%s'
+        $".pop
+        require '%s'
+        $".push('x', 'y')
+        $".shift
+        require '%s'
+        return @b
+        """ % (g, g, g, g))
+        assert space.int_w(w_res) == 1
+
+    def test_load_path_modified(self, space, tmpdir):
+        tmpdir.join("a", "t.rb").write("$where = :a", ensure=True)
+        tmpdir.join("b", "t.rb").write("$where = :b", ensure=True)
+
+        w_res = space.execute("""
+        res = []
+        $LOAD_PATH.unshift '%s'
+        load 't.rb'
+        res << $where
+        $LOAD_PATH.unshift '%s'
+        load 't.rb'
+        res << $where
+        $LOAD_PATH.shift
+        load 't.rb'
+        res << $where
+        return res
+        """ % (tmpdir.join("a"), tmpdir.join("b")))
+        assert self.unwrap(space, w_res) == ["a", "b", "a"]
+
     def test_load(self, space, tmpdir):
         f = tmpdir.join("f.rb")
         f.write("""
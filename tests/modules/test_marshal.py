@@ -378,6 +378,8 @@ class TestMarshal(BaseTopazTest):
     def test_short_data(self, space):
         with self.raises(space, "ArgumentError", "marshal data too short"):
             space.execute("Marshal.load('')")
+        with self.raises(space, "ArgumentError", "marshal data too short"):
+            space.execute('Marshal.load("\\x04\\b\\"\\xFAabc")')
 
     def test_parameters(self, space):
         with self.raises(space, "TypeError", "instance of IO needed"):
@@ -387,15 +389,197 @@ class TestMarshal(BaseTopazTest):
         f = tmpdir.join("testfile")
 
         w_res = space.execute("""
-        Marshal.dump('hallo', File.new('%s', 'wb'))
+        File.open('%s', 'wb') { |f| Marshal.dump('hallo', f) }
         file = File.open('%s', 'rb')
         return Marshal.load(file.read)
         """ % (f, f))
         assert space.str_w(w_res) == "hallo"
 
         w_res = space.execute("""
-        Marshal.dump('hallo', File.new('%s', 'wb'))
+        File.open('%s', 'wb') { |f| Marshal.dump('hallo', f) }
         file = File.open('%s', 'rb')
         return Marshal.load(file)
         """ % (f, f))
         assert space.str_w(w_res) == "hallo"
+
+    def test_io_stream(self, space, tmpdir):
+        f = tmpdir.join("testfile")
+        w_res = space.execute("""
+        File.open('%s', 'wb') do |f|
+          Marshal.dump([1, "two"], f)
+          Marshal.dump({:three => 3}, f)
+        end
+        File.open('%s', 'rb') do |f|
+          return Marshal.load(f), Marshal.load(f)
+        end
+        """ % (f, f))
+        assert self.unwrap(space, w_res) == [[1, "two"], {"three": 3}]
+
+    def test_dump_bignum(self, space):
+        w_res = space.execute("return Marshal.dump(2 ** 40)")
+        assert space.str_w(w_res) == "\x04\bl+\b\x00\x00\x00\x00\x00\x01"
+
+        w_res = space.execute("return Marshal.dump(2 ** 30)")
+        assert space.str_w(w_res) == "\x04\bl+\a\x00\x00\x00@"
+
+        w_res = space.execute("return Marshal.dump(-(2 ** 70))")
+        assert space.str_w(w_res) == "\x04\bl-\n\x00\x00\x00\x00\x00\x00\x00\x00@\x00"
+
+    def test_load_bignum(self, space):
+        w_res = space.execute("return Marshal.load(Marshal.dump(2 ** 70)) == 2 ** 70")
+        assert w_res is space.w_true
+
+        w_res = space.execute('return Marshal.load("\\x04\\bl+\\a\\x00\\x00\\x00@")')
+        assert space.int_w(w_res) == 2 ** 30
+
+        w_res = space.execute("return Marshal.load(Marshal.dump(-(2 ** 70))) == -(2 ** 70)")
+        assert w_res is space.w_true
+
+    def test_dump_float_formats(self, space):
+        w_res = space.execute("""
+        return [1e100, 1.5e-10, 123456789.123456789, -0.0, 1e15, 2.5e-5, 0.0001, 100.0].map do |f|
+          Marshal.dump(f)[4..-1]
+        end
+        """)
+        assert self.unwrap(space, w_res) == [
+            "1e100", "1.5e-10", "123456789.12345679", "-0", "1e15", "2.5e-5", "0.0001", "1e2"
+        ]
+
+    def test_load_float_special(self, space):
+        w_res = space.execute("""
+        return [Marshal.load(Marshal.dump(1.0 / 0)), Marshal.load(Marshal.dump(-1.0 / 0)),
+          Marshal.load(Marshal.dump(0.0 / 0)).nan?, 1.0 / Marshal.load(Marshal.dump(-0.0))]
+        """)
+        assert self.unwrap(space, w_res) == [float("inf"), float("-inf"), True, float("-inf")]
+
+    def test_links(self, space):
+        w_res = space.execute("""
+        a = "x"
+        f = 1.5
+        return Marshal.dump([a, a, :s, :s, f, f])
+        """)
+        assert space.str_w(w_res) == "\x04\b[\vI\"\x06x\x06:\x06ET@\x06:\x06s;\x06f\b1.5@\a"
+
+        w_res = space.execute("""
+        a = "x"
+        res = Marshal.load(Marshal.dump([a, a]))
+        arr = [1]
+        arr << arr
+        loaded = Marshal.load(Marshal.dump(arr))
+        return res[0].equal?(res[1]), loaded[1].equal?(loaded)
+        """)
+        assert self.unwrap(space, w_res) == [True, True]
+
+    def test_object(self, space):
+        w_res = space.execute("""
+        class Foo
+          attr_reader :a, :b
+          def initialize
+            @a = 1
+            @b = "s"
+          end
+        end
+        return Marshal.dump(Foo.new)
+        """)
+        assert space.str_w(w_res) == "\x04\bo:\bFoo\a:\a@ai\x06:\a@bI\"\x06s\x06:\x06ET"
+
+        w_res = space.execute("""
+        foo = Marshal.load(Marshal.dump(Foo.new))
+        return foo.class, foo.a, foo.b
+        """)
+        assert self.unwrap(space, w_res) == [space.w_object.constants_w["Foo"], 1, "s"]
+
+    def test_struct(self, space):
+        w_res = space.execute("""
+        S = Struct.new(:x, :y)
+        s = Marshal.load(Marshal.dump(S.new(1, [2])))
+        return Marshal.dump(S.new(1, 2)), s.class == S, s.x, s.y
+        """)
+        assert self.unwrap(space, w_res) == ["\x04\bS:\x06S\a:\x06xi\x06:\x06yi\a", True, 1, [2]]
+
+    def test_user_dump(self, space):
+        w_res = space.execute("""
+        class UserDump
+          attr_reader :v
+          def initialize(v)
+            @v = v
+          end
+
+          def _dump(limit)
+            @v.to_s
+          end
+
+          def self._load(s)
+            new(s)
+          end
+        end
+        return Marshal.dump(UserDump.new(3)), Marshal.load(Marshal.dump(UserDump.new(3))).v
+        """)
+        assert self.unwrap(space, w_res) == ["\x04\bIu:\rUserDump\x063\x06:\x06ET", "3"]
+
+    def test_marshal_dump(self, space):
+        w_res = space.execute("""
+        class UserMarshal
+          attr_reader :data
+          def marshal_dump
+            [1, 2]
+          end
+
+          def marshal_load(data)
+            @data = data
+          end
+        end
+        return Marshal.dump(UserMarshal.new), Marshal.load(Marshal.dump(UserMarshal.new)).data
+        """)
+        assert self.unwrap(space, w_res) == ["\x04\bU:\x10UserMarshal[\ai\x06i\a", [1, 2]]
+
+    def test_hash_default(self, space):
+        w_res = space.execute("""
+        h = Hash.new(5)
+        h[1] = 2
+        loaded = Marshal.load(Marshal.dump(h))
+        return Marshal.dump(h), loaded[1], loaded[7]
+        """)
+        assert self.unwrap(space, w_res) == ["\x04\b}\x06i\x06i\ai\n", 2, 5]
+
+        with self.raises(space, "TypeError", "can't dump hash with default proc"):
+            space.execute("Marshal.dump(Hash.new { 1 })")
+
+    def test_regexp_class_range(self, space):
+        w_res = space.execute("""
+        return Marshal.dump(/ab+c/i), Marshal.dump([String, Kernel]), Marshal.dump(1..3)
+        """)
+        assert self.unwrap(space, w_res) == [
+            "\x04\bI/\tab+c\x01\x06:\x06EF",
+            "\x04\b[\ac\vStringm\vKernel",
+            "\x04\bo:\nRange\b:\texclF:\nbegini\x06:\bendi\b",
+        ]
+
+        w_res = space.execute("""
+        return Marshal.load(Marshal.dump([/ab+c/i, String, Kernel, 1...3]))
+        """)
+        w_regexp, w_string, w_kernel, w_range = space.listview(w_res)
+        assert w_regexp.source == "ab+c"
+        assert w_string is space.w_string
+        assert w_kernel is space.w_kernel
+        assert self.unwrap(space, space.send(w_range, "to_a")) == [1, 2]
+
+    def test_subclass(self, space):
+        w_res = space.execute("""
+        class MyArray < Array
+        end
+        return Marshal.dump(MyArray.new([1])), Marshal.load(Marshal.dump(MyArray.new([1]))).class
+        """)
+        assert self.unwrap(space, w_res) == [
+            "\x04\bC:\fMyArray[\x06i\x06", space.w_object.constants_w["MyArray"]
+        ]
+
+    def test_errors(self, space):
+        with self.raises(space, "TypeError", "no _dump_data is defined for class Proc"):
+            space.execute("Marshal.dump(proc {})")
+        with self.raises(space, "ArgumentError", "undefined class/module Bar"):
+            space.execute('Marshal.load("\\x04\\bo:\\bBar\\x00")')
+        with self.raises(space, "ArgumentError", "marshal data too short"):
+            space.execute("Marshal.load('\x04\b[\x06')")
+        with self.raises(space, "ArgumentError", "exceed depth limit"):
+            space.execute("Marshal.dump([[[1]]], 1)")
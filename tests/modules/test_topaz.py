@@ -0,0 +1,34 @@
+from ..base import BaseTopazTest
+
+
+class TestTopaz(BaseTopazTest):
+    def test_jit_stats(self, space):
+        w_res = space.execute("""
+        stats = Topaz.jit_stats
+        return stats[:loops], stats[:bridges], stats[:aborts][:trace_too_long], stats[:tracing_time]
+        """)
+        assert self.unwrap(space, w_res) == [0, 0, 0, 0.0]
+
+    def test_jit_set_param(self, space):
+        w_res = space.execute("""
+        return Topaz.jit_set_param("threshold=200,trace_limit=5000"), Topaz.jit_set_param(:threshold => 100)
+        """)
+        assert self.unwrap(space, w_res) == [None, None]
+        with self.raises(space, "ArgumentError", "invalid JIT parameters: nonsense=1"):
+            space.execute("Topaz.jit_set_param('nonsense=1')")
+        with self.raises(space, "ArgumentError", "trace_limit is too high"):
+            space.execute("Topaz.jit_set_param('trace_limit=100000')")
+
+    def test_gc_stats(self, space):
+        w_res = space.execute("""
+        before = Topaz.gc_stats
+        ObjectSpace.garbage_collect
+        after = Topaz.gc_stats
+        return [
+          after[:collections] - before[:collections],
+          after[:collection_time] >= before[:collection_time],
+          after[:total_memory] > 0,
+          after[:rss].nil? || after[:rss] <= after[:peak_rss],
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [1, True, True, True]
@@ -2,6 +2,9 @@
 
 import struct
 
+from topaz.objects.arrayobject import (EmptyArrayStrategy, ObjectArrayStrategy,
+    FixnumArrayStrategy, FloatArrayStrategy)
+
 from ..base import BaseTopazTest
 
 
@@ -102,6 +105,38 @@ class TestArrayObject(BaseTopazTest):
         w_res = space.execute("return [1, 1, 2, '3'] - [1, '3']")
         assert self.unwrap(space, w_res) == [2]
 
+    def test_set_operations(self, space):
+        w_res = space.execute("""
+        a = [1, 2, 2, "a", "a", :s, [1], [1], nil]
+        return [a & [2, "a", [1], 7], a | ["b", 2, [1]], a - [2, "a", [1]]]
+        """)
+        assert self.unwrap(space, w_res) == [
+            [2, "a", [1]],
+            [1, 2, "a", "s", [1], None, "b"],
+            [1, "s", None],
+        ]
+
+    def test_uniq(self, space):
+        w_res = space.execute("""
+        a = [3, 3, 1, "x", "x", 1.0]
+        return [a.uniq, [1, 2, 3, 4].uniq { |x| x % 2 }, a.uniq!, a, a.uniq!]
+        """)
+        assert self.unwrap(space, w_res) == [
+            [3, 1, "x", 1.0], [1, 2], [3, 1, "x", 1.0], [3, 1, "x", 1.0], None
+        ]
+        w_res = space.execute("""
+        class Foo
+          attr_reader :x
+          def initialize(x); @x = x; end
+          def hash; @x.hash; end
+          def eql?(other); other.x == @x; end
+        end
+        return [Foo.new(1), Foo.new(1), Foo.new(2)].uniq.size
+        """)
+        assert space.int_w(w_res) == 2
+        with self.raises(space, "RuntimeError", "can't modify frozen Array"):
+            space.execute("[1].freeze.uniq!")
+
     def test_lshift(self, space):
         w_res = space.execute("return [] << 1")
         assert self.unwrap(space, w_res) == [1]
@@ -335,6 +370,14 @@ class TestArrayObject(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == []
 
+    def test_hash(self, space):
+        w_res = space.execute("""
+        a = [1]
+        a << a
+        return [[1, "a", :b].hash == [1, "a", :b].hash, [1, 2].hash == [2, 1].hash, a.hash == a.hash]
+        """)
+        assert self.unwrap(space, w_res) == [True, False, True]
+
     def test_hashability(self, space):
         w_res = space.execute("return {[] => 2}[[]]")
         assert space.int_w(w_res) == 2
@@ -371,6 +414,99 @@ class TestArrayObject(BaseTopazTest):
         with self.raises(space, "ArgumentError", "comparison of Array with Object failed"):
             space.execute("[Object.new, []].sort")
 
+    def test_sort_native(self, space):
+        w_res = space.execute("""
+        return [5, 3, 9, 1].sort, [2.5, -1.0, 3.0].sort, %w(pear apple fig).sort, [3, 1.5, 2].sort
+        """)
+        assert self.unwrap(space, w_res) == [
+            [1, 3, 5, 9], [-1.0, 2.5, 3.0], ["apple", "fig", "pear"], [1.5, 2, 3]
+        ]
+        w_res = space.execute("""
+        class Fixnum
+          alias old_cmp <=>
+          def <=>(other)
+            -old_cmp(other)
+          end
+        end
+        res = [[3, 1, 2].sort, [3, 1, 2].max]
+        class Fixnum
+          alias <=> old_cmp
+        end
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [[3, 2, 1], 1]
+
+    def test_sort_by(self, space):
+        w_res = space.execute("""
+        calls = 0
+        res = [5, 3, 9, 1].sort_by { |x| calls += 1; -x }
+        return [
+          res, calls, %w(pear apple fig).sort_by(&:size), [1, 2, 3].sort_by { |x| x * -0.5 },
+          %w(bb a ccc).sort_by { |s| s }, [[2, :b], [1, :a]].sort_by { |x| x },
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            [9, 5, 3, 1], 4, ["fig", "pear", "apple"], [3, 2, 1], ["a", "bb", "ccc"],
+            [[1, "a"], [2, "b"]],
+        ]
+
+    def test_min_max(self, space):
+        w_res = space.execute("""
+        a = [5, 3, 9, 1, 7, 3]
+        return [
+          a.min, a.max, a.min(2), a.max(3), a.min(0), a.max(10), [].min, [].max(2),
+          a.minmax, [].minmax, a.min { |x, y| y <=> x }, a.max(2) { |x, y| y <=> x },
+          [1, 2.0, 0.5].min,
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            1, 9, [1, 3], [9, 7, 5], [], [9, 7, 5, 3, 3, 1], None, [],
+            [1, 9], [None, None], 9, [1, 3], 0.5,
+        ]
+        w_res = space.execute("""
+        a = %w(pear apple fig)
+        return a.min_by(&:size), a.max_by(&:size), a.min_by(2, &:size), a.max_by.class
+        """)
+        assert self.unwrap(space, w_res) == [
+            "fig", "apple", ["fig", "pear"], space.w_object.constants_w["Enumerator"]
+        ]
+        with self.raises(space, "ArgumentError", "negative size (-1)"):
+            space.execute("[1].min(-1)")
+        with self.raises(space, "ArgumentError", "comparison of String with Fixnum failed"):
+            space.execute("[1, 'a'].max")
+
+    def test_new(self, space):
+        w_res = space.execute("""
+        return [Array.new, Array.new(2), Array.new(3, 0), Array.new(3) { |i| i * i }, Array.new([1, 2])]
+        """)
+        assert self.unwrap(space, w_res) == [[], [None, None], [0, 0, 0], [0, 1, 4], [1, 2]]
+        w_res = space.execute("""
+        class SubArray < Array
+        end
+        return [SubArray[1, 2].class, Array[1, :a]]
+        """)
+        assert self.unwrap(space, w_res) == [space.w_object.constants_w["SubArray"], [1, "a"]]
+        with self.raises(space, "ArgumentError", "negative array size"):
+            space.execute("Array.new(-1)")
+
+    def test_fill(self, space):
+        w_res = space.execute("""
+        a = [1, 2, 3, 4]
+        return [
+          a.dup.fill(0), a.dup.fill(9, 2), a.dup.fill(9, 1, 2), a.dup.fill(9, 6, 1),
+          a.dup.fill(9, 1...-1), a.dup.fill(9, 3, -1), a.dup.fill(2) { |i| i * 10 },
+          [].fill(1.5, 0, 2),
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            [0, 0, 0, 0], [1, 2, 9, 9], [1, 9, 9, 4], [1, 2, 3, 4, None, None, 9],
+            [1, 9, 9, 4], [1, 2, 3, 4], [1, 2, 20, 30], [1.5, 1.5],
+        ]
+        with self.raises(space, "ArgumentError", "wrong number of arguments (0 for 1..3)"):
+            space.execute("[].fill")
+        with self.raises(space, "RangeError", "-10..2 out of range"):
+            space.execute("[1].fill(1, -10..2)")
+
     def test_multiply(self, space):
         w_res = space.execute("return [ 1, 2, 3 ] * 3")
         assert self.unwrap(space, w_res) == [1, 2, 3, 1, 2, 3, 1, 2, 3]
@@ -395,6 +531,59 @@ class TestArrayObject(BaseTopazTest):
             """)
 
 
+class TestArrayStrategies(BaseTopazTest):
+    def test_literal_strategies(self, space):
+        w_res = space.execute("return []")
+        assert w_res.strategy is space.fromcache(EmptyArrayStrategy)
+        w_res = space.execute("return [1, 2, 3]")
+        assert w_res.strategy is space.fromcache(FixnumArrayStrategy)
+        w_res = space.execute("return [1.5, 2.0]")
+        assert w_res.strategy is space.fromcache(FloatArrayStrategy)
+        w_res = space.execute("return [1, 2.0]")
+        assert w_res.strategy is space.fromcache(ObjectArrayStrategy)
+
+    def test_generalize(self, space):
+        w_res = space.execute("a = []; a << 1; a << 2; return a")
+        assert w_res.strategy is space.fromcache(FixnumArrayStrategy)
+        assert self.unwrap(space, w_res) == [1, 2]
+        w_res = space.execute("a = [1, 2]; a << 'x'; return a")
+        assert w_res.strategy is space.fromcache(ObjectArrayStrategy)
+        assert self.unwrap(space, w_res) == [1, 2, "x"]
+        w_res = space.execute("a = [1.5]; a[3] = 2.5; return a")
+        assert w_res.strategy is space.fromcache(ObjectArrayStrategy)
+        assert self.unwrap(space, w_res) == [1.5, None, None, 2.5]
+        w_res = space.execute("a = [1, 2, 3]; a[1..1] = [4, :x]; return a")
+        assert self.unwrap(space, w_res) == [1, 4, "x", 3]
+
+    def test_clear_resets_strategy(self, space):
+        w_res = space.execute("a = [1, 'x']; a.clear; return a")
+        assert w_res.strategy is space.fromcache(EmptyArrayStrategy)
+        w_res = space.execute("a = [1, 'x']; a.clear; a << 2.5; return a")
+        assert w_res.strategy is space.fromcache(FloatArrayStrategy)
+
+    def test_typed_operations(self, space):
+        w_res = space.execute("""
+        a = [3, 1, 2]
+        b = a + [4]
+        c = a * 2
+        a.sort!
+        a.reverse!
+        return a.dup, b, c, a.shift, a.pop, a, [1, 2, 3, 4].rotate!(3)
+        """)
+        assert self.unwrap(space, w_res) == [
+            [3, 2, 1], [3, 1, 2, 4], [3, 1, 2, 3, 1, 2], 3, 1, [2], [4, 1, 2, 3]
+        ]
+
+    def test_block_args_do_not_modify_array(self, space):
+        w_res = space.execute("""
+        a = ["x"]
+        [a].each { |x, y| }
+        b, *c, d = a
+        return a
+        """)
+        assert self.unwrap(space, w_res) == ["x"]
+
+
 class TestArrayPack(BaseTopazTest):
     def test_garbage_format(self, space):
         assert space.str_w(space.execute("return [].pack ''")) == ""
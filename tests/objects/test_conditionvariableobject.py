@@ -0,0 +1,44 @@
+from ..base import BaseTopazTest
+
+
+class TestConditionVariableObject(BaseTopazTest):
+    def test_signal(self, space):
+        w_res = space.execute("""
+        m = Mutex.new
+        cv = ConditionVariable.new
+        ready = false
+        t = Thread.new do
+          m.synchronize do
+            cv.wait(m) until ready
+            :woke
+          end
+        end
+        Thread.pass
+        m.synchronize do
+          ready = true
+          cv.signal
+        end
+        return t.value
+        """)
+        assert space.symbol_w(w_res) == "woke"
+
+    def test_broadcast(self, space):
+        w_res = space.execute("""
+        m = Mutex.new
+        cv = ConditionVariable.new
+        threads = (1..3).map do |i|
+          Thread.new { m.synchronize { cv.wait(m); i } }
+        end
+        Thread.pass
+        m.synchronize { cv.broadcast }
+        return threads.map(&:value)
+        """)
+        assert self.unwrap(space, w_res) == [1, 2, 3]
+
+    def test_wait_timeout(self, space):
+        w_res = space.execute("""
+        m = Mutex.new
+        m.synchronize { ConditionVariable.new.wait(m, 0.01) }
+        return m.locked?
+        """)
+        assert w_res is space.w_false
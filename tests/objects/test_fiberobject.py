@@ -137,3 +137,26 @@ class TestFiberObject(BaseTopazTest):
         """)
         with self.raises(space, "RuntimeError", "error"):
             space.execute("$f.resume")
+
+    def test_schedule(self, space):
+        w_res = space.execute("""
+        log = []
+        r, w = IO.pipe
+        Fiber.schedule { log << :reader; log << r.read(3) }
+        Fiber.schedule { log << :writer; sleep 0.01; w.write("xyz") }
+        log << :main
+        Fiber.run_scheduled
+        return log
+        """)
+        assert self.unwrap(space, w_res) == ["reader", "writer", "main", "xyz"]
+
+    def test_schedule_many(self, space):
+        w_res = space.execute("""
+        pipes = (1..8).map { IO.pipe }
+        results = []
+        pipes.each { |r, _| Fiber.schedule { results << r.read(1) } }
+        pipes.reverse_each { |_, w| Fiber.schedule { w.write("x") } }
+        Fiber.run_scheduled
+        return results.size
+        """)
+        assert space.int_w(w_res) == 8
@@ -1,3 +1,7 @@
+from topaz.objects.hashobject import (EmptyDictStrategy, ObjectDictStrategy,
+    IdentityDictStrategy, FixnumDictStrategy, SymbolDictStrategy,
+    StringDictStrategy)
+
 from ..base import BaseTopazTest
 
 
@@ -158,6 +162,52 @@ class TestHashObject(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == [[2, 3]]
 
+    def test_each_value(self, space):
+        w_res = space.execute("""
+        result = []
+        {2 => 3, "four" => 5}.each_value { |v| result << v }
+        return result
+        """)
+        assert self.unwrap(space, w_res) == [3, 5]
+
+    def test_each_delete(self, space):
+        w_res = space.execute("""
+        h = {1 => 2, 3 => 4, 5 => 6}
+        result = []
+        h.each { |k, v| result << k; h.delete(k) }
+        return result, h.size
+        """)
+        assert self.unwrap(space, w_res) == [[1, 3, 5], 0]
+
+    def test_to_a(self, space):
+        w_res = space.execute("return {1 => 2, :a => 'b'}.to_a")
+        assert self.unwrap(space, w_res) == [[1, 2], ["a", "b"]]
+
+    def test_select_reject(self, space):
+        w_res = space.execute("""
+        h = {1 => 2, 3 => 4, 5 => 6}
+        return h.select { |k, v| k > 1 }.keys, h.reject { |k, v| v == 4 }.keys, h.size
+        """)
+        assert self.unwrap(space, w_res) == [[3, 5], [1, 5], 3]
+
+    def test_merge(self, space):
+        w_res = space.execute("""
+        h = {1 => 2, 3 => 4}
+        return h.merge({3 => 5, "a" => 6}).to_a, h.merge({3 => 5}) { |k, a, b| a + b }.to_a, h.to_a
+        """)
+        assert self.unwrap(space, w_res) == [
+            [[1, 2], [3, 5], ["a", 6]],
+            [[1, 2], [3, 9]],
+            [[1, 2], [3, 4]],
+        ]
+        w_res = space.execute("""
+        h = {}
+        h.merge!({"a" => 1}) { |k, a, b| a + b }
+        h.merge!({"a" => 2, "b" => 3}) { |k, a, b| a + b }
+        return h.to_a, h.keys.map(&:frozen?)
+        """)
+        assert self.unwrap(space, w_res) == [[["a", 3], ["b", 3]], [True, True]]
+
     def test_includep(self, space):
         w_res = space.execute("""
         h = { "a" => 100, "b" => 200 }
@@ -191,6 +241,14 @@ class TestHashObject(BaseTopazTest):
         return h == h
         """)
         assert w_res is space.w_true
+        w_res = space.execute("""
+        a = {}
+        a[1] = a
+        b = {}
+        b[1] = b
+        return a == b, {1 => 1} == {1 => 1.0}, {1 => 1}.eql?({1 => 1.0})
+        """)
+        assert self.unwrap(space, w_res) == [True, True, False]
 
     def test_shift(self, space):
         w_res = space.execute("return {}.shift")
@@ -201,3 +259,68 @@ class TestHashObject(BaseTopazTest):
     def test_dup(self, space):
         w_res = space.execute("return {2 => 4}.dup.length")
         assert space.int_w(w_res) == 1
+
+
+class TestHashStrategies(BaseTopazTest):
+    def test_key_strategies(self, space):
+        w_res = space.execute("return {}")
+        assert w_res.strategy is space.fromcache(EmptyDictStrategy)
+        w_res = space.execute("return {1 => 2}")
+        assert w_res.strategy is space.fromcache(FixnumDictStrategy)
+        w_res = space.execute("return {:a => 2}")
+        assert w_res.strategy is space.fromcache(SymbolDictStrategy)
+        w_res = space.execute("return {'a' => 2}")
+        assert w_res.strategy is space.fromcache(StringDictStrategy)
+        w_res = space.execute("return {[1] => 2}")
+        assert w_res.strategy is space.fromcache(ObjectDictStrategy)
+
+    def test_lookup_keeps_empty_strategy(self, space):
+        w_res = space.execute("h = {}; h[[1]]; h.key?(:a); h.delete('a'); return h")
+        assert w_res.strategy is space.fromcache(EmptyDictStrategy)
+        w_res = space.execute("""
+        h = {1 => 2}
+        h[[1]]; h[1.0]; h.fetch(:a, nil); h.key?('a'); h.delete(:a)
+        h.merge!({}) { }; h == {:a => 1}
+        return h
+        """)
+        assert w_res.strategy is space.fromcache(FixnumDictStrategy)
+
+    def test_generalize(self, space):
+        w_res = space.execute("""
+        h = {1 => :a, 2 => :b}
+        h[:c] = 3
+        return h, h
+        """)
+        w_hash = space.listview(w_res)[0]
+        assert w_hash.strategy is space.fromcache(ObjectDictStrategy)
+        assert self.unwrap(space, w_res)[0] == {1: "a", 2: "b", "c": 3}
+        w_res = space.execute("""
+        h = {1 => :a}
+        return h[1.0], h.key?(1.0), h[1]
+        """)
+        assert self.unwrap(space, w_res) == [None, False, "a"]
+
+    def test_string_keys(self, space):
+        w_res = space.execute("""
+        h = {}
+        k = "abc"
+        h[k] = 1
+        k << "d"
+        h["ab" + "c"] += 1
+        return h["abc"], h["abcd"], h.keys[0].frozen?
+        """)
+        assert self.unwrap(space, w_res) == [2, None, True]
+        w_res = space.execute("""
+        class MyString < String
+          def hash; 1; end
+          def eql?(other); true; end
+        end
+        h = {"abc" => 1}
+        h[MyString.new("x")] = 2
+        return h["abc"], h[MyString.new("y")]
+        """)
+        assert self.unwrap(space, w_res) == [1, 2]
+
+    def test_compare_by_identity_stays(self, space):
+        w_res = space.execute("h = {}; h.compare_by_identity; h[1] = 2; return h")
+        assert w_res.strategy is space.fromcache(IdentityDictStrategy)
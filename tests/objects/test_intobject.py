@@ -306,3 +306,30 @@ class TestFixnumObject(BaseTopazTest):
         return res
         """)
         assert self.unwrap(space, w_res) == [1.0, 1.6]
+        w_res = space.execute("""
+        res = []
+        10.step(1, -4) { |i| res << i }
+        1.step(0.0, -0.25) { |f| res << f }
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [10, 6, 2, 1.0, 0.75, 0.5, 0.25, 0.0]
+        w_res = space.execute("return 1.step(5, 2).to_a, 1.step(2, 0.1).to_a.size")
+        assert self.unwrap(space, w_res) == [[1, 3, 5], 11]
+        with self.raises(space, "ArgumentError", "step can't be 0"):
+            space.execute("1.step(3, 0) {}")
+
+    def test_loop_limits(self, space):
+        w_res = space.execute("""
+        res = []
+        3.upto(1) { res << :never }
+        1.upto(2.5) { |i| res << i }
+        3.downto(1) { |i| res << i }
+        3.downto(1.5) { |i| res << i }
+        0.times { res << :never }
+        max = 2 ** 62 - 1 + 2 ** 62
+        (max - 1).upto(max) { |i| res << (i == max) }
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 2, 3, 2, 1, 3, 2, False, True]
+        w_res = space.execute("return 3.times.to_a, 1.upto(3).to_a, 3.downto(1).to_a, 3.times {}")
+        assert self.unwrap(space, w_res) == [[0, 1, 2], [1, 2, 3], [3, 2, 1], 3]
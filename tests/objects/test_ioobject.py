@@ -31,7 +31,7 @@ class TestIO(BaseTopazTest):
 
     def test_write(self, space, capfd, tmpdir):
         content = "foo\n"
-        space.execute('return IO.new(1, "w").write("%s")' % content)
+        space.execute('io = IO.new(1, "w"); io.write("%s"); io.flush' % content)
         out, err = capfd.readouterr()
         assert out == content
         content = "foo\n"
@@ -45,7 +45,7 @@ class TestIO(BaseTopazTest):
             """ % f)
 
     def test_push(self, space, capfd, tmpdir):
-        space.execute('return IO.new(1, "w") << "hello" << "world"')
+        space.execute('(IO.new(1, "w") << "hello" << "world").flush')
         out, err = capfd.readouterr()
         assert out == "helloworld"
 
@@ -75,8 +75,20 @@ class TestIO(BaseTopazTest):
         """ % f)
         assert space.str_w(w_res) == contents[:10]
 
+        w_res = space.execute("""
+        a = 'hello world'
+        f = File.new('%s')
+        f.read
+        return f.read(10, a), a
+        """ % f)
+        assert self.unwrap(space, w_res) == [None, ""]
+
         with self.raises(space, "ArgumentError"):
             space.execute("File.new('%s').read(-1)" % f)
+        with self.raises(space, "TypeError"):
+            space.execute("File.new('%s').read(10, 1)" % f)
+        with self.raises(space, "RuntimeError", "can't modify frozen String"):
+            space.execute("File.new('%s').read(10, 'a'.freeze)" % f)
 
         with self.raises(space, "IOError", "closed stream"):
             space.execute("""
@@ -86,7 +98,7 @@ class TestIO(BaseTopazTest):
             """ % f)
 
     def test_simple_print(self, space, capfd, tmpdir):
-        space.execute('IO.new(1, "w").print("foo")')
+        space.execute('io = IO.new(1, "w"); io.print("foo"); io.flush')
         out, err = capfd.readouterr()
         assert out == "foo"
 
@@ -99,30 +111,30 @@ class TestIO(BaseTopazTest):
             """ % f)
 
     def test_multi_print(self, space, capfd):
-        space.execute('IO.new(1, "w").print("This", "is", 100, "percent")')
+        space.execute('io = IO.new(1, "w"); io.print("This", "is", 100, "percent"); io.flush')
         out, err = capfd.readouterr()
         assert out == "Thisis100percent"
 
     def test_print_globals(self, space, capfd):
         space.globals.set(space, "$,", space.newstr_fromstr(":"))
         space.globals.set(space, "$\\", space.newstr_fromstr("\n"))
-        space.execute('IO.new(1, "w").print("foo", "bar", "baz")')
+        space.execute('io = IO.new(1, "w"); io.print("foo", "bar", "baz"); io.flush')
         space.globals.set(space, "$_", space.newstr_fromstr('lastprint'))
-        space.execute('IO.new(1, "w").print')
+        space.execute('io = IO.new(1, "w"); io.print; io.flush')
         out, err = capfd.readouterr()
         assert out == "foo:bar:baz\nlastprint\n"
 
     def test_non_string_print_globals(self, space, capfd):
         space.globals.set(space, "$,", space.w_nil)
         space.globals.set(space, "$\\", space.w_nil)
-        space.execute('IO.new(1, "w").print("foo", "bar", "baz")')
+        space.execute('io = IO.new(1, "w"); io.print("foo", "bar", "baz"); io.flush')
         space.globals.set(space, "$_", space.w_nil)
-        space.execute('IO.new(1, "w").print')
+        space.execute('io = IO.new(1, "w"); io.print; io.flush')
         out, err = capfd.readouterr()
         assert out == "foobarbaz"
 
     def test_puts(self, space, capfd, tmpdir):
-        space.execute("IO.new(1, 'w').puts('This', 'is\n', 100, 'percent')")
+        space.execute("io = IO.new(1, 'w'); io.puts('This', 'is\n', 100, 'percent'); io.flush")
         out, err = capfd.readouterr()
         assert out == "This\nis\n100\npercent\n"
 
@@ -135,7 +147,7 @@ class TestIO(BaseTopazTest):
             """ % f)
 
     def test_flush(self, space, capfd, tmpdir):
-        space.execute("IO.new(1, 'w').flush.puts('String')")
+        space.execute("io = IO.new(1, 'w'); io.flush.puts('String'); io.flush")
         out, err = capfd.readouterr()
         assert out == "String\n"
 
@@ -306,7 +318,7 @@ class TestIO(BaseTopazTest):
         res << f2.readlines[0]
         return res
         """ % (f, f))
-        assert self.unwrap(space, w_res) == [content, content, ""]
+        assert self.unwrap(space, w_res) == [content + "\n", content + "\n", None]
 
     def test_reopen_path(self, space, tmpdir):
         content = "This is line one"
@@ -321,7 +333,7 @@ class TestIO(BaseTopazTest):
         res << f.readlines[0]
         return res
         """ % (f, f))
-        assert self.unwrap(space, w_res) == [content, content, ""]
+        assert self.unwrap(space, w_res) == [content + "\n", content + "\n", None]
 
     def test_reopen_with_invalid_arg(self, space):
         with self.raises(space, "TypeError", "can't convert Fixnum into String"):
@@ -343,3 +355,143 @@ class TestIO(BaseTopazTest):
         """)
         out, err = capfd.readouterr()
         assert out == "foo\n"
+
+    def test_write_buffering(self, space, tmpdir):
+        f = tmpdir.join("file.txt")
+        w_res = space.execute("""
+        f = File.new('%s', 'w')
+        f.write("foo")
+        f.puts "bar"
+        before = File.size('%s')
+        f.flush
+        after = File.size('%s')
+        f.write("baz")
+        sync = f.sync
+        f.close
+        return sync, before, after
+        """ % (f, f, f))
+        assert self.unwrap(space, w_res) == [False, 0, 7]
+        assert f.read() == "foobar\nbaz"
+
+    def test_sync(self, space, tmpdir):
+        f = tmpdir.join("file.txt")
+        w_res = space.execute("""
+        f = File.new('%s', 'w')
+        f.write("foo")
+        f.sync = true
+        flushed = File.size('%s')
+        f.write("bar")
+        return f.sync, flushed, File.size('%s'), IO.new(2).sync, IO.new(1).sync
+        """ % (f, f, f))
+        assert self.unwrap(space, w_res) == [True, 3, 6, True, False]
+
+    def test_flush_on_exit(self, space, tmpdir):
+        f = tmpdir.join("file.txt")
+        space.execute("$f = File.new('%s', 'w'); $f.write('foo')" % f)
+        assert f.read() == ""
+        space.run_exit_handlers()
+        assert f.read() == "foo"
+
+    def test_buffered_read_position(self, space, tmpdir):
+        f = tmpdir.join("file.txt")
+        f.write("foo\nbar\nbaz\n")
+        w_res = space.execute("""
+        f = File.new('%s', 'r+')
+        res = [f.getc, f.getc, f.pos]
+        f.seek(2, IO::SEEK_CUR)
+        res << f.read(3)
+        f.write("!")
+        f.rewind
+        res << f.read
+        return res
+        """ % f)
+        assert self.unwrap(space, w_res) == ["f", "o", 2, "bar", "foo\nbar!baz\n"]
+
+    def test_gets(self, space, tmpdir):
+        f = tmpdir.join("file.txt")
+        f.write("foo\nbar\nbaz")
+        w_res = space.execute("""
+        f = File.new('%s')
+        return f.gets, $_, f.gets("a"), f.gets(2), f.gets(0), f.gets(nil), f.gets, $_
+        """ % f)
+        assert self.unwrap(space, w_res) == ["foo\n", "foo\n", "ba", "r\n", "", "baz", None, None]
+
+    def test_each_line_paragraph(self, space, tmpdir):
+        f = tmpdir.join("file.txt")
+        f.write("\n\nfoo\nbar\n\n\n\nbaz\n")
+        w_res = space.execute("""
+        r = []
+        File.new('%s').each_line("") { |l| r << l }
+        return r
+        """ % f)
+        assert self.unwrap(space, w_res) == ["foo\nbar\n\n", "baz\n"]
+
+    def test_each_line_across_buffers(self, space, tmpdir):
+        f = tmpdir.join("file.txt")
+        f.write("x" * 8191 + "ab" + "y" * 20000 + "ab" + "z")
+        w_res = space.execute("""
+        f = File.new('%s')
+        return f.each_line("ab").map(&:size), f.each_line.to_a
+        """ % f)
+        assert self.unwrap(space, w_res) == [[8193, 20002, 1], []]
+
+    def test_read_nonblock(self, space):
+        w_res = space.execute("""
+        r, w = IO.pipe
+        begin
+          r.read_nonblock(5)
+        rescue IO::WaitReadable => e
+        end
+        w.write("abc")
+        data = r.read_nonblock(5)
+        w.close
+        begin
+          r.read_nonblock(5)
+        rescue EOFError
+          eof = true
+        end
+        return [e.class.name, e.is_a?(Errno::EAGAIN), data, eof]
+        """)
+        assert self.unwrap(space, w_res) == ["IO::EAGAINWaitReadable", True, "abc", True]
+
+    def test_read_nonblock_outbuf(self, space):
+        w_res = space.execute("""
+        r, w = IO.pipe
+        w.write("abcdef")
+        buf = "previous contents"
+        res = r.read_nonblock(3, buf)
+        path = Object.new
+        def path.to_str; @s ||= "x"; end
+        r.read_nonblock(3, path)
+        return [res, res.equal?(buf), path.to_str]
+        """)
+        assert self.unwrap(space, w_res) == ["abc", True, "def"]
+        with self.raises(space, "TypeError"):
+            space.execute("r, w = IO.pipe; w.write('a'); r.read_nonblock(5, 3)")
+        with self.raises(space, "RuntimeError", "can't modify frozen String"):
+            space.execute("r, w = IO.pipe; w.write('a'); r.read_nonblock(5, 'abc'.freeze)")
+
+    def test_write_nonblock(self, space):
+        w_res = space.execute("""
+        r, w = IO.pipe
+        written = 0
+        begin
+          loop { written += w.write_nonblock("x" * 4096) }
+        rescue IO::WaitWritable => e
+        end
+        return [written > 0, e.class.name, r.read_nonblock(3)]
+        """)
+        assert self.unwrap(space, w_res) == [True, "IO::EAGAINWaitWritable", "xxx"]
+
+    def test_select(self, space):
+        w_res = space.execute("""
+        r, w = IO.pipe
+        res = [IO.select([r], nil, nil, 0.01)]
+        res << IO.select([r], [w]).map(&:size)
+        w.write("a")
+        res << (IO.select([r])[0][0] == r)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [None, [0, 1, 0], True]
+        with self.raises(space, "ArgumentError", "time interval must be positive"):
+            space.execute("IO.select([], nil, nil, -1)")
@@ -0,0 +1,54 @@
+from ..base import BaseTopazTest
+
+
+class TestMutexObject(BaseTopazTest):
+    def test_lock(self, space):
+        w_res = space.execute("""
+        m = Mutex.new
+        return [m.try_lock, m.try_lock, m.locked?, m.owned?, m.unlock.locked?]
+        """)
+        assert self.unwrap(space, w_res) == [True, False, True, True, False]
+
+    def test_errors(self, space):
+        with self.raises(space, "ThreadError", "deadlock; recursive locking"):
+            space.execute("m = Mutex.new; m.lock; m.lock")
+        with self.raises(space, "ThreadError", "Attempt to unlock a mutex which is not locked"):
+            space.execute("Mutex.new.unlock")
+        with self.raises(space, "ThreadError", "Attempt to unlock a mutex which is locked by another thread"):
+            space.execute("m = Mutex.new; m.lock; Thread.new { m.unlock }.join")
+
+    def test_synchronize(self, space):
+        w_res = space.execute("""
+        m = Mutex.new
+        log = []
+        threads = (1..3).map do |i|
+          Thread.new do
+            m.synchronize do
+              log << i
+              Thread.pass
+              log << i
+            end
+          end
+        end
+        threads.each(&:join)
+        return [log, m.locked?]
+        """)
+        assert self.unwrap(space, w_res) == [[1, 1, 2, 2, 3, 3], False]
+
+    def test_released_by_dead_thread(self, space):
+        w_res = space.execute("""
+        m = Mutex.new
+        Thread.new { m.lock }.join
+        return m.locked?
+        """)
+        assert w_res is space.w_false
+
+    def test_sleep(self, space):
+        w_res = space.execute("""
+        m = Mutex.new
+        m.lock
+        t = Thread.new { m.synchronize { :got_it } }
+        slept = m.sleep(0.01)
+        return [slept, m.owned?, t.value]
+        """)
+        assert self.unwrap(space, w_res) == [0, True, "got_it"]
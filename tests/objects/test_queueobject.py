@@ -0,0 +1,39 @@
+from ..base import BaseTopazTest
+
+
+class TestQueueObject(BaseTopazTest):
+    def test_push_pop(self, space):
+        w_res = space.execute("""
+        q = Queue.new
+        q << 1
+        q.push(2)
+        q.enq(3)
+        return [q.size, q.pop, q.shift, q.deq, q.empty?]
+        """)
+        assert self.unwrap(space, w_res) == [3, 1, 2, 3, True]
+
+    def test_non_block(self, space):
+        with self.raises(space, "ThreadError", "queue empty"):
+            space.execute("Queue.new.pop(true)")
+
+    def test_deadlock(self, space):
+        with self.raises(space, "ThreadError", "No live threads left. Deadlock?"):
+            space.execute("Queue.new.pop")
+
+    def test_producer_consumer(self, space):
+        w_res = space.execute("""
+        q = Queue.new
+        consumer = Thread.new do
+          items = []
+          while (item = q.pop) != :done
+            items << item
+          end
+          items
+        end
+        Thread.pass
+        waiting = q.num_waiting
+        3.times { |i| q << i }
+        q << :done
+        return [waiting, consumer.value]
+        """)
+        assert self.unwrap(space, w_res) == [1, [0, 1, 2]]
@@ -78,6 +78,19 @@ class TestRangeObject(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == ["a", "b", "c", "d", "e"]
 
+    def test_each_fixnum(self, space):
+        w_res = space.execute("""
+        a = []
+        (1..3).each { |x| a << x }
+        (1...3).each { |x| a << x }
+        (3..1).each { |x| a << x }
+        (1..10).each { |x| a << x; break if x == 2 }
+        return a, (1..2.5).to_a, (2 ** 64..2 ** 64 + 1).to_a.size
+        """)
+        assert self.unwrap(space, w_res) == [[1, 2, 3, 1, 2, 1, 2], [1, 2], 2]
+        with self.raises(space, "TypeError", "can't iterate from Float"):
+            space.execute("(1.0..2).each {}")
+
     def test_each_returns_self(self, space):
         w_res = space.execute("""
         r = (1...3)
@@ -240,3 +240,57 @@ class TestRegexpObject(BaseTopazTest):
     def test_ignore_whitespace(self, space):
         w_res = space.execute("return /\d \d/x =~ '12'")
         assert space.int_w(w_res) == 0
+
+    def test_cache_eviction(self, space):
+        w_res = space.execute("""
+        Topaz.regexp_cache_limit = 2
+        Regexp.new("cache_a")
+        Regexp.new("cache_b")
+        Regexp.new("cache_a")
+        Regexp.new("cache_c")
+        stats = Topaz.regexp_cache_stats
+        Regexp.new("cache_a")
+        hits = Topaz.regexp_cache_stats[:hits] - stats[:hits]
+        Topaz.regexp_cache_limit = 256
+        return stats[:limit], stats[:size], stats[:evictions] > 0, hits
+        """)
+        assert self.unwrap(space, w_res) == [2, 2, True, 1]
+
+    def test_cache_lru_order(self, space):
+        w_res = space.execute("""
+        Topaz.regexp_cache_limit = 2
+        Regexp.new("cache_a")
+        Regexp.new("cache_b")
+        Regexp.new("cache_a")
+        Regexp.new("cache_c")
+        before = Topaz.regexp_cache_stats
+        Regexp.new("cache_a")
+        Regexp.new("cache_c")
+        Regexp.new("cache_b")
+        after = Topaz.regexp_cache_stats
+        Topaz.regexp_cache_limit = 256
+        return after[:hits] - before[:hits], after[:misses] - before[:misses]
+        """)
+        assert self.unwrap(space, w_res) == [2, 1]
+
+    def test_cache_disabled(self, space):
+        w_res = space.execute("""
+        Topaz.regexp_cache_limit = 0
+        res = [Regexp.new("zz") =~ "azz", Regexp.new("zz") =~ "zz"]
+        res << Topaz.regexp_cache_stats[:size]
+        Topaz.regexp_cache_limit = 256
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [1, 0, 0]
+
+    def test_cache_stats(self, space):
+        w_res = space.execute("""
+        before = Topaz.regexp_cache_stats
+        Regexp.new("cache_stats_pattern")
+        Regexp.new("cache_stats_pattern")
+        after = Topaz.regexp_cache_stats
+        return after[:misses] - before[:misses], after[:hits] - before[:hits]
+        """)
+        assert self.unwrap(space, w_res) == [1, 1]
+        with self.raises(space, "ArgumentError"):
+            space.execute("Topaz.regexp_cache_limit = -1")
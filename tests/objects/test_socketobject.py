@@ -0,0 +1,160 @@
+from ..base import BaseTopazTest
+
+
+class TestSocket(BaseTopazTest):
+    def test_ancestors(self, space):
+        w_res = space.execute("return TCPServer.ancestors.take(5)")
+        assert self.unwrap(space, w_res) == [
+            space.w_object.constants_w["TCPServer"],
+            space.w_object.constants_w["TCPSocket"],
+            space.w_object.constants_w["IPSocket"],
+            space.w_object.constants_w["BasicSocket"],
+            space.w_io,
+        ]
+
+    def test_constants(self, space):
+        w_res = space.execute("return Socket::TCP_NODELAY, Socket::Constants::SOL_SOCKET")
+        assert self.unwrap(space, w_res) == [1, 1]
+
+    def test_tcp(self, space):
+        w_res = space.execute("""
+        server = TCPServer.new("127.0.0.1", 0)
+        client = TCPSocket.new("127.0.0.1", server.addr[1])
+        conn = server.accept
+        client.write("hello")
+        res = [conn.class, conn.recv(10)]
+        conn.send("world", 0)
+        res << client.recv(10)
+        client.close
+        res << conn.recv(10)
+        conn.close
+        server.close
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [
+            space.w_object.constants_w["TCPSocket"], "hello", "world", ""
+        ]
+
+    def test_addr(self, space):
+        w_res = space.execute("""
+        server = TCPServer.new("127.0.0.1", 0)
+        client = TCPSocket.new("127.0.0.1", server.addr[1])
+        res = [server.addr[0], server.addr[2], client.peeraddr[1] == server.addr[1]]
+        client.close
+        server.close
+        return res
+        """)
+        assert self.unwrap(space, w_res) == ["AF_INET", "127.0.0.1", True]
+
+    def test_connection_refused(self, space):
+        w_res = space.execute("""
+        server = TCPServer.new("127.0.0.1", 0)
+        port = server.addr[1]
+        server.close
+        begin
+          TCPSocket.new("127.0.0.1", port)
+        rescue Errno::ECONNREFUSED
+          return "refused"
+        end
+        """)
+        assert space.str_w(w_res) == "refused"
+
+    def test_accept_nonblock(self, space):
+        w_res = space.execute("""
+        server = TCPServer.new("127.0.0.1", 0)
+        begin
+          server.accept_nonblock
+        rescue IO::WaitReadable => e
+          res = [e.message]
+        end
+        client = TCPSocket.new("127.0.0.1", server.addr[1])
+        IO.select([server])
+        res << server.accept_nonblock.class
+        server.close
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [
+            "Resource temporarily unavailable - accept(2) would block",
+            space.w_object.constants_w["TCPSocket"],
+        ]
+
+    def test_setsockopt(self, space):
+        w_res = space.execute("""
+        server = TCPServer.new("127.0.0.1", 0)
+        client = TCPSocket.new("127.0.0.1", server.addr[1])
+        client.setsockopt(Socket::IPPROTO_TCP, Socket::TCP_NODELAY, 1)
+        res = [client.getsockopt(:TCP, :NODELAY) != 0]
+        client.setsockopt(:SOCKET, :KEEPALIVE, true)
+        res << (client.getsockopt(Socket::SOL_SOCKET, Socket::SO_KEEPALIVE) != 0)
+        client.close
+        server.close
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [True, True]
+
+    def test_recv_outbuf(self, space):
+        w_res = space.execute("""
+        a, b = UNIXSocket.pair
+        buf = "previous contents"
+        a.sendmsg("abc")
+        res = b.recv(10, 0, buf)
+        return [res, res.equal?(buf)]
+        """)
+        assert self.unwrap(space, w_res) == ["abc", True]
+        with self.raises(space, "RuntimeError", "can't modify frozen String"):
+            space.execute("""
+            a, b = UNIXSocket.pair
+            a.sendmsg("abc")
+            b.recv(10, 0, "abc".freeze)
+            """)
+        with self.raises(space, "TypeError"):
+            space.execute("""
+            a, b = UNIXSocket.pair
+            a.sendmsg("abc")
+            b.recv(10, 0, 3)
+            """)
+
+    def test_recv_nonblock(self, space):
+        w_res = space.execute("""
+        a, b = UNIXSocket.pair
+        begin
+          b.recv_nonblock(10)
+        rescue IO::WaitReadable => e
+          return e.message
+        end
+        """)
+        assert space.str_w(w_res) == "Resource temporarily unavailable - recvfrom(2) would block"
+
+    def test_unix(self, space, tmpdir):
+        path = str(tmpdir.join("sock"))
+        w_res = space.execute("""
+        server = UNIXServer.new('%s')
+        client = UNIXSocket.new('%s')
+        conn = server.accept
+        client.puts "ping"
+        res = [conn.gets, server.path, conn.class]
+        client.close
+        conn.close
+        server.close
+        return res
+        """ % (path, path))
+        assert self.unwrap(space, w_res) == [
+            "ping\n", path, space.w_object.constants_w["UNIXSocket"]
+        ]
+
+    def test_thread_server(self, space):
+        w_res = space.execute("""
+        server = TCPServer.new("127.0.0.1", 0)
+        t = Thread.new do
+          conn = server.accept
+          conn.puts conn.gets.upcase
+          conn.close
+        end
+        client = TCPSocket.new("127.0.0.1", server.addr[1])
+        client.puts "hello"
+        res = client.gets
+        t.join
+        server.close
+        return res
+        """)
+        assert space.str_w(w_res) == "HELLO\n"
@@ -1,5 +1,7 @@
 from rpython.rlib.rbigint import rbigint
 
+from topaz.objects.stringobject import MutableStringStrategy, RopeStringStrategy
+
 from ..base import BaseTopazTest
 import pytest
 
@@ -21,6 +23,40 @@ class TestStringObject(BaseTopazTest):
         w_res = space.execute('return "abc" + "def" + "ghi"')
         assert space.str_w(w_res) == "abcdefghi"
 
+    def test_plus_shares_pieces(self, space):
+        w_res = space.execute("""
+        a = "a" + "b"
+        b = a + "c"
+        c = a + "d"
+        b << "e"
+        a << "f"
+        return [a, b, c, b.length, b[1], b.hash == "abce".hash]
+        """)
+        assert self.unwrap(space, w_res) == ["abf", "abce", "abd", 4, "b", True]
+
+    def test_repeated_concat(self, space):
+        w_res = space.execute("""
+        s = ""
+        100.times { |i| s += "#{i}," }
+        t = s.dup
+        s << "end"
+        t.upcase!
+        return [s.length, s[-6..-1], t.length, s.start_with?("0,1,2,")]
+        """)
+        assert self.unwrap(space, w_res) == [293, "99,end", 290, True]
+        w_res = space.execute("""
+        s = "x" * 50 + "x" * 50
+        100.times { |i| s = "#{s}#{i}," }
+        return [s, "#{1}#{s}"]
+        """)
+        w_s, w_t = space.listview(w_res)
+        assert isinstance(w_s.strategy, RopeStringStrategy)
+        assert isinstance(w_t.strategy, MutableStringStrategy)
+        assert space.str_w(w_s) == "x" * 100 + "".join("%d," % i for i in range(100))
+        assert space.str_w(w_t) == "1" + space.str_w(w_s)
+        w_res = space.execute('a = "a"; return "#{a}b#{a}"')
+        assert isinstance(w_res.strategy, MutableStringStrategy)
+
     def test_mul(self, space):
         w_res = space.execute("return 'abc' * 2")
         assert space.str_w(w_res) == "abcabc"
@@ -1,4 +1,7 @@
-class TestThreadObject(object):
+from ..base import BaseTopazTest
+
+
+class TestThreadObject(BaseTopazTest):
     def test_name(self, space):
         space.execute("Thread")
 
@@ -56,3 +59,104 @@ class TestThreadObject(object):
         w_depth, w_symbol = space.listview(w_res)
         assert space.int_w(w_depth) == 5
         assert space.symbol_w(w_symbol) == "a"
+
+    def test_value(self, space):
+        w_res = space.execute("""
+        t = Thread.new(1, 2) { |a, b| a + b }
+        return [t.value, t.alive?, t.status]
+        """)
+        assert self.unwrap(space, w_res) == [3, False, False]
+
+    def test_runs_concurrently(self, space):
+        w_res = space.execute("""
+        order = []
+        t = Thread.new do
+          order << :thread
+          Thread.pass
+          order << :thread
+        end
+        order << :main
+        Thread.pass
+        order << :main
+        t.join
+        return order
+        """)
+        assert self.unwrap(space, w_res) == ["main", "thread", "main", "thread"]
+
+    def test_preemption(self, space):
+        w_res = space.execute("""
+        done = false
+        t = Thread.new { i = 0; i += 1 until done; i }
+        Thread.pass
+        done = true
+        return t.value > 0
+        """)
+        assert w_res is space.w_true
+
+    def test_join_raises(self, space):
+        w_res = space.execute("""
+        t = Thread.new { raise "boom" }
+        begin
+          t.join
+        rescue RuntimeError => e
+        end
+        return [e.message, t.status]
+        """)
+        assert self.unwrap(space, w_res) == ["boom", None]
+
+    def test_join_timeout(self, space):
+        w_res = space.execute("""
+        t = Thread.new { sleep }
+        res = t.join(0.01)
+        status = t.status
+        t.wakeup
+        return [res, status, t.join.equal?(t)]
+        """)
+        assert self.unwrap(space, w_res) == [None, "sleep", True]
+        with self.raises(space, "ThreadError", "Target thread must not be current thread"):
+            space.execute("Thread.current.join")
+
+    def test_new_without_block(self, space):
+        with self.raises(space, "ThreadError", "must be called with a block"):
+            space.execute("Thread.new")
+
+    def test_current_in_thread(self, space):
+        w_res = space.execute("""
+        Thread.current[:a] = 1
+        t = Thread.new { [Thread.current == Thread.main, Thread.current[:a]] }
+        return t.value + [Thread.current == Thread.main]
+        """)
+        assert self.unwrap(space, w_res) == [False, None, True]
+
+    def test_stop_and_run(self, space):
+        w_res = space.execute("""
+        t = Thread.new { Thread.stop; :resumed }
+        Thread.pass
+        status = t.status
+        t.run
+        return [status, t.value]
+        """)
+        assert self.unwrap(space, w_res) == ["sleep", "resumed"]
+        with self.raises(space, "ThreadError"):
+            space.execute("Thread.stop")
+
+    def test_blocking_io(self, space):
+        w_res = space.execute("""
+        r, w = IO.pipe
+        t = Thread.new { r.read(5) }
+        Thread.pass
+        w.write("hello")
+        return t.value
+        """)
+        assert space.str_w(w_res) == "hello"
+
+    def test_fibers(self, space):
+        w_res = space.execute("""
+        f = Fiber.new { Fiber.yield 1; 2 }
+        t = Thread.new do
+          g = Fiber.new { Fiber.yield 3; 4 }
+          [g.resume, g.resume]
+        end
+        return [f.resume, t.value, f.resume]
+        """)
+        assert self.unwrap(space, w_res) == [1, [3, 4], 2]
@@ -0,0 +1,135 @@
+import os
+
+from topaz.codecache import CodeCache, CodeReader, CodeWriter
+from topaz.objects.codeobject import W_CodeObject, W_FoldedValue
+
+from .base import BaseTopazTest
+
+
+class TestCodeCache(BaseTopazTest):
+    def roundtrip(self, space, source):
+        bc = space.compile(source, "t.rb")
+        writer = CodeWriter()
+        writer.write_code(space, bc)
+        return bc, CodeReader(writer.getvalue()).read_code(space, "t.rb")
+
+    def assert_same_code(self, space, bc1, bc2):
+        assert bc1.name == bc2.name
+        assert bc1.code == bc2.code
+        assert bc1.max_stackdepth == bc2.max_stackdepth
+        assert bc1.arg_pos == bc2.arg_pos
+        assert bc1.splat_arg_pos == bc2.splat_arg_pos
+        assert bc1.block_arg_pos == bc2.block_arg_pos
+        assert bc1.cellvars == bc2.cellvars
+        assert bc1.freevars == bc2.freevars
+        assert bc1.lineno_table == bc2.lineno_table
+        assert len(bc1.defaults) == len(bc2.defaults)
+        for d1, d2 in zip(bc1.defaults, bc2.defaults):
+            self.assert_same_code(space, d1, d2)
+        assert len(bc1.consts_w) == len(bc2.consts_w)
+        for w_c1, w_c2 in zip(bc1.consts_w, bc2.consts_w):
+            self.assert_same_const(space, w_c1, w_c2)
+
+    def assert_same_const(self, space, w_c1, w_c2):
+        assert type(w_c1) is type(w_c2)
+        if w_c1 is space.w_object or w_c1 is space.w_nil:
+            assert w_c1 is w_c2
+        elif isinstance(w_c1, W_CodeObject):
+            self.assert_same_code(space, w_c1, w_c2)
+        elif isinstance(w_c1, W_FoldedValue):
+            assert w_c1.name == w_c2.name
+            self.assert_same_const(space, w_c1.w_value, w_c2.w_value)
+            self.assert_same_const(space, w_c1.w_receiver, w_c2.w_receiver)
+            self.assert_same_const(space, w_c1.w_arg, w_c2.w_arg)
+        else:
+            assert space.is_true(space.send(w_c1, "==", [w_c2]))
+
+    def test_roundtrip(self, space):
+        bc, bc2 = self.roundtrip(space, """
+        class X
+          def f(a, b=3, *c, &d)
+            [a, b, c, -1, 2 ** 70, 1.5, :sym, /re/i, nil, true, false, 'ab' * 2]
+          end
+        end
+        x = 3
+        [1, 2].map { |y| x + y }
+        """)
+        self.assert_same_code(space, bc, bc2)
+
+    def test_execute_cached(self, space, tmpdir):
+        cache = CodeCache(str(tmpdir.join("cache")), "test")
+        f = tmpdir.join("t.rb")
+        f.write("$cached = [1, 2 ** 70, 'abc'].map { |x| x.to_s }.join(',')")
+        path = str(f)
+        st = os.stat(path)
+        assert cache.load(space, path, st) is None
+        cache.store(space, path, st, space.compile(f.read(), path))
+        bc = cache.load(space, path, st)
+        assert bc is not None
+        assert bc.filepath == path
+        space.execute_code(bc)
+        assert space.str_w(space.globals.get(space, "$cached")) == "1,1180591620717411303424,abc"
+
+    def test_invalidation(self, space, tmpdir):
+        cache = CodeCache(str(tmpdir), "test")
+        f = tmpdir.join("t.rb")
+        f.write("1")
+        path = str(f)
+        st = os.stat(path)
+        cache.store(space, path, st, space.compile("1", path))
+        assert cache.load(space, path, st) is not None
+        assert CodeCache(str(tmpdir), "other").load(space, path, st) is None
+        f.write("12")
+        assert cache.load(space, path, os.stat(path)) is None
+
+    def test_corrupt_file(self, space, tmpdir):
+        cache = CodeCache(str(tmpdir), "test")
+        f = tmpdir.join("t.rb")
+        f.write("1")
+        path = str(f)
+        st = os.stat(path)
+        cache.store(space, path, st, space.compile("1", path))
+        with open(cache.cache_path(path), "r+b") as cache_file:
+            data = cache_file.read()
+            cache_file.seek(0)
+            cache_file.write(data[:-3])
+            cache_file.truncate()
+        assert cache.load(space, path, st) is None
+
+    def test_require_uses_cache(self, space, tmpdir):
+        space.code_cache.enable(str(tmpdir.join("cache")), "test")
+        f = tmpdir.join("t.rb")
+        f.write("$loads = ($loads || 0) + 1")
+        space.execute("load '%s'" % f)
+        assert len(tmpdir.join("cache").listdir()) == 1
+        w_res = space.execute("load '%s'; return $loads" % f)
+        assert space.int_w(w_res) == 2
+
+    def test_folded_code_redefined(self, space, tmpdir):
+        cache = CodeCache(str(tmpdir), "test")
+        f = tmpdir.join("t.rb")
+        f.write("""
+        def ff; "ab" * 2; end
+        def cc(x)
+          case x
+          when "a" then 1
+          when "b" then 2
+          else 3
+          end
+        end
+        """)
+        path = str(f)
+        st = os.stat(path)
+        cache.store(space, path, st, space.compile(f.read(), path))
+        space.execute_code(cache.load(space, path, st))
+        w_res = space.execute("""
+        res = [ff, cc("b")]
+        class String
+          def *(o); "redefined"; end
+          def ===(o); true; end
+        end
+        return res + [ff, cc("b")]
+        """)
+        assert self.unwrap(space, w_res) == ["abab", 2, "redefined", 1]
+        # Code from the cache can't rely on the original methods anymore.
+        assert cache.load(space, path, st) is None
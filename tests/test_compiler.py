@@ -2,7 +2,8 @@ from topaz import consts
 
 
 class TestCompiler(object):
-    def assert_compiles(self, space, source, expected_bytecode_str):
+    def assert_compiles(self, space, source, expected_bytecode_str, optimize=False):
+        space.optimize_bytecode = optimize
         bc = space.compile(source, None)
         self.assert_compiled(bc, expected_bytecode_str)
         return bc
@@ -2008,3 +2009,119 @@ class TestCompiler(object):
         BUILD_LAMBDA
         RETURN
         """)
+
+    def test_optimize_constant_folding(self, space):
+        bc = self.assert_compiles(space, "1 + 2 * 3", """
+        LOAD_FOLDED 5
+        RETURN
+        """, optimize=True)
+        w_folded = bc.consts_w[5]
+        assert space.int_w(w_folded.w_value) == 7
+        assert space.int_w(w_folded.w_receiver) == 1
+        assert w_folded.name == "+"
+        assert space.int_w(w_folded.w_arg.w_value) == 6
+        bc = self.assert_compiles(space, "'ab' * 2; 1 / 0", """
+        LOAD_FOLDED 6
+        DISCARD_TOP
+        LOAD_CONST 3
+        LOAD_CONST 4
+        SEND 5 1
+        RETURN
+        """, optimize=True)
+        assert space.str_w(bc.consts_w[6].w_value) == "abab"
+
+    def test_optimize_dead_code(self, space):
+        self.assert_compiles(space, "1; x = 2; x; return x; 3", """
+        LOAD_CONST 1
+        STORE_DEREF 0
+        DISCARD_TOP
+        LOAD_DEREF 0
+        DISCARD_TOP
+        LOAD_DEREF 0
+        RETURN
+        """, optimize=True)
+
+    def test_optimize_jumps(self, space):
+        self.assert_compiles(space, "if a then (b if c) end", """
+        LOAD_SELF
+        SEND 0 0
+        JUMP_IF_FALSE 33
+        LOAD_SELF
+        SEND 1 0
+        JUMP_IF_FALSE 27
+        LOAD_SELF
+        SEND 2 0
+        JUMP 36
+        LOAD_CONST 3
+        JUMP 36
+        LOAD_CONST 3
+        RETURN
+        """, optimize=True)
+
+    def test_binary_operators(self, space):
+        self.assert_compiles(space, "a + 1 < b; a - b == 3.0; a.+(1, 2)", """
+        LOAD_SELF
+        SEND 0 0
+        LOAD_CONST 1
+        BINARY_ADD 2
+        LOAD_SELF
+        SEND 3 0
+        BINARY_LT 4
+        DISCARD_TOP
+        LOAD_SELF
+        SEND 0 0
+        LOAD_SELF
+        SEND 3 0
+        BINARY_SUB 5
+        LOAD_CONST 6
+        BINARY_EQ 7
+        DISCARD_TOP
+        LOAD_SELF
+        SEND 0 0
+        LOAD_CONST 8
+        LOAD_CONST 9
+        SEND 2 2
+        RETURN
+        """, optimize=True)
+        self.assert_compiles(space, "x = 1; x *= 2", """
+        LOAD_CONST 0
+        STORE_DEREF 0
+        DISCARD_TOP
+        LOAD_DEREF 0
+        LOAD_CONST 1
+        BINARY_MUL 2
+        STORE_DEREF 0
+        RETURN
+        """, optimize=True)
+
+    def test_optimize_case_jump_table(self, space):
+        bc = self.assert_compiles(space, """
+        case self
+        when :a, :b
+          1
+        else
+          2
+        end
+        """, """
+        LOAD_SELF
+        JUMP_TABLE 42 0
+        DUP_TOP
+        LOAD_CONST 1
+        ROT_TWO
+        SEND 2 1
+        JUMP_IF_TRUE 35
+        DUP_TOP
+        LOAD_CONST 3
+        ROT_TWO
+        SEND 2 1
+        JUMP_IF_TRUE 35
+        JUMP 42
+        DISCARD_TOP
+        LOAD_CONST 4
+        JUMP 46
+        DISCARD_TOP
+        LOAD_CONST 5
+        RETURN
+        """, optimize=True)
+        w_table = bc.consts_w[0]
+        assert w_table.str_targets == {"a": 35, "b": 35}
@@ -418,6 +418,60 @@ class TestInterpreter(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == [2, 4, 6]
 
+    def test_send_cache_invalidation(self, space):
+        w_res = space.execute("""
+        class A; def f; :a; end; end
+        class B < A; end
+        class C; def f; :c; end; end
+        module M; end
+        def call(o); o.f; end
+        res = [call(B.new), call(C.new)]
+        begin
+          call(1.0)
+        rescue NoMethodError
+          res << :none
+        end
+        class A; def f; :a2; end; end
+        res << call(B.new)
+        module M; def f; :m; end; end
+        class B; include M; end
+        res << call(B.new)
+        module M; def f; :m2; end; end
+        res << call(B.new)
+        class B; def f; :b; end; end
+        res << call(B.new)
+        class B; remove_method :f; end
+        res << call(B.new)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == ["a", "c", "none", "a2", "m", "m2", "b", "m2"]
+        bc = space.compile("x = 1; x.to_s", "t.rb")
+        assert bc.send_caches is None
+        space.execute_code(bc)
+        [cache] = [c for c in bc.send_caches if c is not None]
+        assert cache.classes_w == [space.w_fixnum]
+
+    def test_folded_constant_redefined(self, space):
+        w_res = space.execute("""
+        def f
+          [1 + 2, "a" * 2, 2.0 < 3]
+        end
+        res = [f]
+        f[1] << "b"
+        res << f
+        class Fixnum
+          alias old_plus +
+          def +(other)
+            old_plus(other).old_plus(10)
+          end
+        end
+        res << f
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [
+            [3, "aa", True], [3, "aa", True], [13, "aa", True]
+        ]
+
     def test_send_block_with_block_arg(self, space):
         w_res = space.execute("""
         res = []
@@ -863,6 +917,92 @@ class TestInterpreter(BaseTopazTest):
         """)
         assert self.unwrap(space, w_res) == [0, 0, 1, 2]
 
+    def test_binary_operators(self, space):
+        w_res = space.execute("""
+        x = 9223372036854775807
+        return [
+          1 + 2, 2 - 5, 3 * 4, 1.5 + 1, 2 * 1.5, 1 - 0.5,
+          (x + 1).to_s, (-x - 2).to_s, (x * 2).to_s,
+          1 < 2, 2 <= 2, 3 > 4, 3 >= 4, 1 == 1.0, 1.5 == 1, 1 == "1",
+          "a" + "b", [1] - [1],
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            3, -3, 12, 2.5, 3.0, 0.5,
+            "9223372036854775808", "-9223372036854775809", "18446744073709551614",
+            True, True, False, False, True, False, False,
+            "ab", [],
+        ]
+
+    def test_binary_operator_redefined(self, space):
+        w_res = space.execute("""
+        def f(a, b)
+          [a + b, a < b]
+        end
+        res = [f(1, 2)]
+        class Fixnum
+          def <(other)
+            :lt
+          end
+        end
+        res << f(1, 2)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [[3, True], [3, "lt"]]
+
+    def test_case_jump_table(self, space):
+        w_res = space.execute("""
+        def f(x)
+          case x
+          when 1 then :one
+          when 2, 3, 1 then :few
+          end
+        end
+        def g(x)
+          case x
+          when "a" then 1
+          when :a then 2
+          end
+        end
+        def h(x)
+          case x
+          when :a, :b then 1
+          when :c then 2
+          else 3
+          end
+        end
+        return [
+          [f(1), f(3), f(4), f(3.0), f(:a)],
+          [g("a"), g(:a), g("b")],
+          [h(:a), h(:b), h(:c), h(:d), h("a")],
+        ]
+        """)
+        assert self.unwrap(space, w_res) == [
+            ["one", "few", None, "few", None],
+            [1, 2, None],
+            [1, 1, 2, 3, 3],
+        ]
+
+    def test_case_jump_table_redefined(self, space):
+        w_res = space.execute("""
+        def f(x)
+          case x
+          when :a then 1
+          when :b then 2
+          else 3
+          end
+        end
+        res = [f(:b)]
+        class Symbol
+          def ===(other)
+            true
+          end
+        end
+        res << f(:b)
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [2, 1]
+
     def test_dynamic_string(self, space):
         w_res = space.execute("""
         x = 123
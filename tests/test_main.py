@@ -2,7 +2,8 @@ import os
 import platform
 import subprocess
 
-from topaz.main import _entry_point
+import topaz
+from topaz.main import _entry_point, create_entry_point
 
 
 class TestMain(object):
@@ -123,6 +124,20 @@ class TestMain(object):
         assert platform.system().lower() in version
         assert subprocess.check_output(["git", "rev-parse", "--short", "HEAD"]).rstrip() in version
 
+    def test_profile(self, space, tmpdir, capfd):
+        profile = tmpdir.join("out.prof")
+        self.run(space, tmpdir, """
+        i = 0
+        i += 1 while Topaz::Profiler.samples == 0
+        puts Topaz::Profiler.running?
+        """, ruby_args=["--profile=%s" % profile])
+        out, _ = capfd.readouterr()
+        assert out == "true\n"
+        assert profile.read().startswith("<main> (")
+        self.run(space, tmpdir, "puts 1", ruby_args=["--profile"])
+        out, _ = capfd.readouterr()
+        assert out == "1\n"
+
     def test_stop_consuming_args(self, space, tmpdir, capfd):
         self.run(space, tmpdir, ruby_args=["-e", "puts ARGV.join(' ')", "--", "--help", "-e"])
         out, _ = capfd.readouterr()
@@ -318,3 +333,26 @@ class TestMain(object):
         self.run(space, tmpdir, None, ruby_args=[str(tmpdir.join("t.rb"))], status=1)
         out, err = capfd.readouterr()
         assert err == "No such file or directory -- %s (LoadError)\n" % tmpdir.join("t.rb")
+
+    def test_setup_skips_loaded_kernel(self, space, capfd):
+        # What snapshot_kernel() leaves behind.
+        space.kernel_loaded = True
+        space.execute("""
+        class IO
+          def puts(*args)
+            write("patched\\n")
+          end
+        end
+        """)
+        space.setup(topaz.__file__)
+        space.execute("$stdout.puts 1; $stdout.flush")
+        out, err = capfd.readouterr()
+        assert out == "patched\n"
+
+    def test_kernel_snapshot(self, space, capfd, monkeypatch):
+        monkeypatch.setenv("TOPAZ_CACHE_DIR", "")
+        entry_point = create_entry_point(space.config, kernel_snapshot=True)
+        res = entry_point([topaz.__file__, "-e", "puts [1, 2].map { |x| x * 2 }.inspect"])
+        assert res == 0
+        out, err = capfd.readouterr()
+        assert out == "[2, 4]\n"
@@ -0,0 +1,47 @@
+from topaz.profiler import Profiler
+
+from .base import BaseTopazTest
+
+
+class TestProfiler(BaseTopazTest):
+    def test_start_stop(self, space):
+        w_res = space.execute("""
+        res = [Topaz::Profiler.running?, Topaz::Profiler.start(100), Topaz::Profiler.start]
+        res << Topaz::Profiler.running?
+        res << Topaz::Profiler.stop << Topaz::Profiler.stop << Topaz::Profiler.running?
+        return res
+        """)
+        assert self.unwrap(space, w_res) == [False, True, False, True, True, False, False]
+        with self.raises(space, "ArgumentError", "interval must be positive"):
+            space.execute("Topaz::Profiler.start(0)")
+
+    def test_sample(self, space):
+        w_res = space.execute("""
+        def work
+          i = 0
+          while Topaz::Profiler.samples == 0
+            i += 1
+          end
+        end
+        Topaz::Profiler.start(100)
+        work
+        Topaz::Profiler.stop
+        return Topaz::Profiler.report
+        """)
+        lines = space.str_w(w_res).splitlines()
+        assert lines
+        stack, count = lines[0].rsplit(" ", 1)
+        frames = stack.split(";")
+        assert frames[0] == "<main> (-e:9)"
+        assert frames[1].startswith("work (-e:")
+        assert int(count) >= 1
+        space.execute("Topaz::Profiler.reset")
+        assert space.fromcache(Profiler).report() == ""
+
+    def test_report(self, space):
+        profiler = space.fromcache(Profiler)
+        profiler.record("<main> (a.rb:1);f (a.rb:3)")
+        profiler.record("<main> (a.rb:2)")
+        profiler.record("<main> (a.rb:1);f (a.rb:3)")
+        assert profiler.sample_count == 3
+        assert profiler.report() == "<main> (a.rb:1);f (a.rb:3) 2\n<main> (a.rb:2) 1\n"
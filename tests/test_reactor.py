@@ -0,0 +1,48 @@
+import os
+
+from rpython.rlib import rpoll
+
+from topaz.reactor import Reactor
+
+
+class TestReactor(object):
+    def test_poll(self, space):
+        reactor = Reactor(space)
+        r, w = os.pipe()
+        try:
+            reactor.watch(r, rpoll.POLLIN)
+            reactor.watch(w, rpoll.POLLOUT)
+            assert reactor.poll(0) == {w: rpoll.POLLOUT}
+            os.write(w, "x")
+            assert reactor.poll(0) == {r: rpoll.POLLIN, w: rpoll.POLLOUT}
+            reactor.unwatch(w, rpoll.POLLOUT)
+            assert reactor.poll(0) == {r: rpoll.POLLIN}
+            reactor.unwatch(r, rpoll.POLLIN)
+            assert not reactor.has_watches()
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_shared_fd(self, space):
+        reactor = Reactor(space)
+        r, w = os.pipe()
+        try:
+            reactor.watch(r, rpoll.POLLIN)
+            reactor.watch(r, rpoll.POLLIN)
+            reactor.unwatch(r, rpoll.POLLIN)
+            os.write(w, "x")
+            assert reactor.poll(0) == {r: rpoll.POLLIN}
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_regular_file(self, space, tmpdir):
+        reactor = Reactor(space)
+        f = tmpdir.join("f")
+        f.write("data")
+        fd = os.open(str(f), os.O_RDONLY)
+        try:
+            reactor.watch(fd, rpoll.POLLIN)
+            assert fd in reactor.poll(-1)
+        finally:
+            os.close(fd)
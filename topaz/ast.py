@@ -4,6 +4,8 @@ from rpython.rlib.objectmodel import we_are_translated
 
 from topaz import consts
 from topaz.astcompiler import CompilerContext, BlockSymbolTable
+from topaz.objects.codeobject import W_JumpTable
+from topaz.optimizer import ConstantFoldingGuard
 from topaz.utils.regexp import RegexpError
 
 
@@ -369,10 +371,44 @@ class Case(Node):
         self.whens = whens
         self.elsebody = elsebody
 
+    def jump_table_kind(self):
+        kind = -1
+        for when in self.whens:
+            assert isinstance(when, When)
+            for expr in when.conds:
+                if isinstance(expr, ConstantInt):
+                    expr_kind = W_JumpTable.FIXNUM
+                elif isinstance(expr, ConstantSymbol):
+                    expr_kind = W_JumpTable.SYMBOL
+                elif isinstance(expr, ConstantString):
+                    expr_kind = W_JumpTable.STRING
+                else:
+                    return -1
+                if kind != -1 and kind != expr_kind:
+                    return -1
+                kind = expr_kind
+        return kind
+
+    def compile_jump_table(self, ctx, otherwise):
+        if not ctx.space.optimize_bytecode:
+            return None
+        kind = self.jump_table_kind()
+        if kind == -1:
+            return None
+        w_table = W_JumpTable(kind)
+        guard = ctx.space.fromcache(ConstantFoldingGuard)
+        if not guard.guard_methods(ctx.space, w_table.guarded_class(ctx.space), ["===", "=="]):
+            return None
+        return ctx.emit_jump_table(w_table, otherwise)
+
     def compile(self, ctx):
         end = ctx.new_block()
+        otherwise = ctx.new_block()
 
         self.cond.compile(ctx)
+        # When every condition is a literal of the same type, dispatch through
+        # a table, keeping the === chain for other values.
+        jump_table = self.compile_jump_table(ctx, otherwise)
         for when in self.whens:
             assert isinstance(when, When)
             with ctx.set_lineno(when.lineno):
@@ -380,6 +416,13 @@ class Case(Node):
                 when_block = ctx.new_block()
 
                 for expr in when.conds:
+                    if jump_table is not None:
+                        if isinstance(expr, ConstantInt):
+                            jump_table.add_target(expr.intvalue, None, when_block)
+                        elif isinstance(expr, ConstantSymbol):
+                            jump_table.add_target(0, expr.symbol, when_block)
+                        elif isinstance(expr, ConstantString):
+                            jump_table.add_target(0, expr.strvalue, when_block)
                     next_expr = ctx.new_block()
                     ctx.emit(consts.DUP_TOP)
                     expr.compile(ctx)
@@ -393,6 +436,7 @@ class Case(Node):
                 when.block.compile(ctx)
                 ctx.emit_jump(consts.JUMP, end)
                 ctx.use_next_block(next_when)
+        ctx.use_next_block(otherwise)
         ctx.emit(consts.DISCARD_TOP)
         self.elsebody.compile(ctx)
         ctx.use_next_block(end)
@@ -521,7 +565,7 @@ class AugmentedAssignment(Node):
             ctx.emit(consts.DUP_TWO)
         self.target.compile_load(ctx)
         self.value.compile(ctx)
-        ctx.emit(consts.SEND, ctx.create_symbol_const(self.oper), 1)
+        ctx.emit_binary_send(self.oper)
         self.target.compile_store(ctx)
 
     def compile_defined(self, ctx):
@@ -691,6 +735,9 @@ class BaseSend(Node):
             if block is not None:
                 block.compile(ctx)
 
+            if self.is_binary_operator(block):
+                ctx.emit_binary_send(self.method)
+                return
             symbol = self.method_name_const(ctx)
             if self.is_splat() and block is not None:
                 ctx.emit(self.send_block_splat, symbol, len(self.args) + 1)
@@ -707,6 +754,9 @@ class BaseSend(Node):
                 return True
         return False
 
+    def is_binary_operator(self, block):
+        return False
+
     def get_block(self):
         return self.block_arg
 
@@ -739,6 +789,10 @@ class Send(BaseSend):
     def method_name_const(self, ctx):
         return ctx.create_symbol_const(self.method)
 
+    def is_binary_operator(self, block):
+        return (len(self.args) == 1 and block is None and not self.is_splat() and
+            self.method in consts.BINARY_OPERATORS)
+
 
 class Super(BaseSend):
     send_block = consts.SEND_SUPER_BLOCK
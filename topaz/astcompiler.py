@@ -100,6 +100,11 @@ class CompilerContext(object):
         self.frame_blocks = []
 
     def create_bytecode(self, args, defaults, splat_arg, block_arg):
+        from topaz.optimizer import Optimizer
+
+        if self.space.optimize_bytecode:
+            Optimizer(self).optimize(self.first_block)
+
         cellvars = []
         freevars = []
 
@@ -243,6 +248,19 @@ class CompilerContext(object):
         instr.jump = target
         self.current_block.instrs.append(instr)
 
+    def emit_binary_send(self, name):
+        symbol = self.create_symbol_const(name)
+        if self.space.optimize_bytecode and name in consts.BINARY_OPERATORS:
+            self.emit(consts.BINARY_OPERATORS[name], symbol)
+        else:
+            self.emit(consts.SEND, symbol, 1)
+
+    def emit_jump_table(self, w_table, default):
+        instr = JumpTableInstruction(w_table, self.create_const(w_table), self.current_lineno)
+        instr.jump = default
+        self.current_block.instrs.append(instr)
+        return instr
+
     def get_subctx(self, name, node):
         subscope = self.symtable.get_subscope(node)
         return CompilerContext(self.space, name, subscope, self.filepath)
@@ -328,6 +346,29 @@ class Instruction(object):
             self.arg0 = offsets[self.jump]
 
 
+class JumpTableInstruction(Instruction):
+    def __init__(self, w_table, const_idx, lineno):
+        Instruction.__init__(self, consts.JUMP_TABLE, 0, const_idx, lineno)
+        self.w_table = w_table
+        self.int_keys = []
+        self.str_keys = []
+        self.targets = []
+
+    def add_target(self, intkey, strkey, block):
+        self.int_keys.append(intkey)
+        self.str_keys.append(strkey)
+        self.targets.append(block)
+
+    def patch_loc(self, offsets):
+        Instruction.patch_loc(self, offsets)
+        for i in xrange(len(self.targets)):
+            target_pc = offsets[self.targets[i]]
+            if self.w_table.kind == self.w_table.FIXNUM:
+                self.w_table.set_int_target(self.int_keys[i], target_pc)
+            else:
+                self.w_table.set_str_target(self.str_keys[i], target_pc)
+
+
 class SetLinenoConextManager(object):
     def __init__(self, ctx, lineno):
         self.ctx = ctx
@@ -0,0 +1,449 @@
+import os
+
+from rpython.rlib.objectmodel import specialize
+from rpython.rlib.rarithmetic import r_uint, r_ulonglong, intmask
+from rpython.rlib.rbigint import rbigint
+from rpython.rlib.rstruct.ieee import float_pack, float_unpack
+
+from topaz import consts
+from topaz.objects.bignumobject import W_BignumObject
+from topaz.objects.codeobject import W_CodeObject, W_FoldedValue, W_JumpTable
+from topaz.objects.floatobject import W_FloatObject
+from topaz.objects.intobject import W_FixnumObject
+from topaz.objects.regexpobject import W_RegexpObject
+from topaz.objects.stringobject import W_StringObject
+from topaz.objects.symbolobject import W_SymbolObject
+from topaz.optimizer import ConstantFoldingGuard
+from topaz.utils.ll_file import isdir
+
+
+MAGIC = "TOPAZBC"
+# Bump this whenever the serialized format changes.
+FORMAT_VERSION = 4
+
+CONST_NIL = "n"
+CONST_TRUE = "t"
+CONST_FALSE = "f"
+CONST_OBJECT = "O"
+CONST_FIXNUM = "i"
+CONST_BIGNUM = "b"
+CONST_FLOAT = "d"
+CONST_SYMBOL = "s"
+CONST_STRING = "S"
+CONST_REGEXP = "r"
+CONST_CODE = "c"
+CONST_JUMP_TABLE = "j"
+CONST_FOLDED = "F"
+
+
+def fnv_hash(s):
+    h = r_uint(2166136261)
+    for c in s:
+        h = (h ^ r_uint(ord(c))) * r_uint(16777619)
+        h &= r_uint(0xffffffff)
+    return h
+
+
+# The opcode table is part of the format: any change to the bytecodes
+# invalidates existing cache files.
+BYTECODE_FINGERPRINT = intmask(fnv_hash(",".join(consts.BYTECODE_NAMES)))
+
+
+class UncacheableCode(Exception):
+    pass
+
+
+class CorruptCacheFile(Exception):
+    pass
+
+
+class StaleCacheFile(Exception):
+    """
+    The cached code relies on core methods that have been redefined in this
+    process, so it has to be compiled again.
+    """
+
+
+class CodeWriter(object):
+    def __init__(self):
+        self.chunks = []
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+    def write_byte(self, c):
+        self.chunks.append(c)
+
+    def write_int(self, value):
+        # Zig-zag encoded varint, so small negative numbers stay small.
+        n = r_uint(value << 1) ^ r_uint(value >> (r_uint.BITS - 1))
+        while n >= 0x80:
+            self.chunks.append(chr(intmask(n & 0x7f) | 0x80))
+            n >>= 7
+        self.chunks.append(chr(intmask(n)))
+
+    def write_str(self, s):
+        self.write_int(len(s))
+        self.chunks.append(s)
+
+    def write_float(self, f):
+        bits = float_pack(f, 8)
+        for i in xrange(8):
+            self.chunks.append(chr(intmask((bits >> (8 * i)) & 0xff)))
+
+    # Some of a code object's lists are resizable and some aren't, so the list
+    # helpers are specialized per call site to keep their annotations apart.
+    @specialize.call_location()
+    def write_int_list(self, values):
+        self.write_int(len(values))
+        for value in values:
+            self.write_int(value)
+
+    @specialize.call_location()
+    def write_str_list(self, values):
+        self.write_int(len(values))
+        for value in values:
+            self.write_str(value)
+
+    def write_const(self, space, w_const):
+        if w_const is space.w_nil:
+            self.write_byte(CONST_NIL)
+        elif w_const is space.w_true:
+            self.write_byte(CONST_TRUE)
+        elif w_const is space.w_false:
+            self.write_byte(CONST_FALSE)
+        elif w_const is space.w_object:
+            self.write_byte(CONST_OBJECT)
+        elif isinstance(w_const, W_FixnumObject):
+            self.write_byte(CONST_FIXNUM)
+            self.write_int(w_const.intvalue)
+        elif isinstance(w_const, W_BignumObject):
+            self.write_byte(CONST_BIGNUM)
+            self.write_str(w_const.bigint.str())
+        elif isinstance(w_const, W_FloatObject):
+            self.write_byte(CONST_FLOAT)
+            self.write_float(w_const.floatvalue)
+        elif isinstance(w_const, W_SymbolObject):
+            self.write_byte(CONST_SYMBOL)
+            self.write_str(w_const.symbol)
+        elif isinstance(w_const, W_StringObject):
+            self.write_byte(CONST_STRING)
+            self.write_str(space.str_w(w_const))
+        elif isinstance(w_const, W_RegexpObject):
+            self.write_byte(CONST_REGEXP)
+            self.write_str(w_const.source)
+            self.write_int(w_const.flags)
+        elif isinstance(w_const, W_CodeObject):
+            self.write_byte(CONST_CODE)
+            self.write_code(space, w_const)
+        elif isinstance(w_const, W_JumpTable):
+            self.write_byte(CONST_JUMP_TABLE)
+            self.write_int(w_const.kind)
+            self.write_int(len(w_const.int_targets))
+            for key, target_pc in w_const.int_targets.iteritems():
+                self.write_int(key)
+                self.write_int(target_pc)
+            self.write_int(len(w_const.str_targets))
+            for key, target_pc in w_const.str_targets.iteritems():
+                self.write_str(key)
+                self.write_int(target_pc)
+        elif isinstance(w_const, W_FoldedValue):
+            self.write_byte(CONST_FOLDED)
+            self.write_const(space, w_const.w_value)
+            self.write_const(space, w_const.w_receiver)
+            self.write_str(w_const.name)
+            self.write_const(space, w_const.w_arg)
+        else:
+            raise UncacheableCode
+
+    def write_code(self, space, bc):
+        self.write_str(bc.name)
+        self.write_str(bc.code)
+        self.write_int(bc.max_stackdepth)
+        self.write_int(len(bc.consts_w))
+        for w_const in bc.consts_w:
+            self.write_const(space, w_const)
+        self.write_int_list(bc.arg_pos)
+        self.write_int(bc.splat_arg_pos)
+        self.write_int(bc.block_arg_pos)
+        self.write_int(len(bc.defaults))
+        for default in bc.defaults:
+            self.write_code(space, default)
+        self.write_str_list(bc.cellvars)
+        self.write_str_list(bc.freevars)
+        self.write_int_list(bc.lineno_table)
+
+
+class CodeReader(object):
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read_byte(self):
+        if self.pos >= len(self.data):
+            raise CorruptCacheFile
+        c = self.data[self.pos]
+        self.pos += 1
+        return c
+
+    def read_int(self):
+        n = r_uint(0)
+        shift = 0
+        while True:
+            if shift >= r_uint.BITS:
+                raise CorruptCacheFile
+            b = ord(self.read_byte())
+            n |= r_uint(b & 0x7f) << shift
+            shift += 7
+            if b < 0x80:
+                break
+        return intmask(n >> 1) ^ -intmask(n & 1)
+
+    def read_str(self):
+        length = self.read_int()
+        start = self.pos
+        end = start + length
+        if length < 0 or end > len(self.data):
+            raise CorruptCacheFile
+        assert start >= 0
+        assert end >= 0
+        self.pos = end
+        return self.data[start:end]
+
+    def read_float(self):
+        bits = r_ulonglong(0)
+        for i in xrange(8):
+            bits |= r_ulonglong(ord(self.read_byte())) << (8 * i)
+        return float_unpack(bits, 8)
+
+    @specialize.call_location()
+    def read_int_list(self):
+        return [self.read_int() for _ in xrange(self.read_int())]
+
+    @specialize.call_location()
+    def read_str_list(self):
+        return [self.read_str() for _ in xrange(self.read_int())]
+
+    def read_const(self, space, filepath):
+        tag = self.read_byte()
+        if tag == CONST_NIL:
+            return space.w_nil
+        elif tag == CONST_TRUE:
+            return space.w_true
+        elif tag == CONST_FALSE:
+            return space.w_false
+        elif tag == CONST_OBJECT:
+            return space.w_object
+        elif tag == CONST_FIXNUM:
+            return space.newint(self.read_int())
+        elif tag == CONST_BIGNUM:
+            return space.newbigint_fromrbigint(rbigint.fromdecimalstr(self.read_str()))
+        elif tag == CONST_FLOAT:
+            return space.newfloat(self.read_float())
+        elif tag == CONST_SYMBOL:
+            return space.newsymbol(self.read_str())
+        elif tag == CONST_STRING:
+            return space.newstr_fromstr(self.read_str())
+        elif tag == CONST_REGEXP:
+            source = self.read_str()
+            return space.newregexp(source, self.read_int())
+        elif tag == CONST_CODE:
+            return self.read_code(space, filepath)
+        elif tag == CONST_JUMP_TABLE:
+            return self.read_jump_table(space)
+        elif tag == CONST_FOLDED:
+            return self.read_folded(space, filepath)
+        else:
+            raise CorruptCacheFile
+
+    def guard_methods(self, space, w_cls, names):
+        # The compiler registered these methods with the guard in the process
+        # that wrote the cache, so they need to be registered again here.
+        if not space.fromcache(ConstantFoldingGuard).guard_methods(space, w_cls, names):
+            raise StaleCacheFile
+
+    def read_folded(self, space, filepath):
+        w_value = self.read_const(space, filepath)
+        w_receiver = self.read_const(space, filepath)
+        name = self.read_str()
+        w_arg = self.read_const(space, filepath)
+        if isinstance(w_receiver, W_FoldedValue):
+            w_cls = space.getclass(w_receiver.w_value)
+        else:
+            w_cls = space.getclass(w_receiver)
+        self.guard_methods(space, w_cls, [name])
+        return W_FoldedValue(w_value, w_receiver, name, w_arg)
+
+    def read_jump_table(self, space):
+        kind = self.read_int()
+        if kind != W_JumpTable.FIXNUM and kind != W_JumpTable.SYMBOL and kind != W_JumpTable.STRING:
+            raise CorruptCacheFile
+        w_table = W_JumpTable(kind)
+        self.guard_methods(space, w_table.guarded_class(space), ["===", "=="])
+        for _ in xrange(self.read_int()):
+            key = self.read_int()
+            w_table.set_int_target(key, self.read_int())
+        for _ in xrange(self.read_int()):
+            key = self.read_str()
+            w_table.set_str_target(key, self.read_int())
+        return w_table
+
+    def read_code(self, space, filepath):
+        name = self.read_str()
+        code = self.read_str()
+        max_stackdepth = self.read_int()
+        consts_w = [self.read_const(space, filepath) for _ in xrange(self.read_int())]
+        arg_pos = self.read_int_list()
+        splat_arg_pos = self.read_int()
+        block_arg_pos = self.read_int()
+        defaults = [self.read_code(space, filepath) for _ in xrange(self.read_int())]
+        cellvars = self.read_str_list()
+        freevars = self.read_str_list()
+        lineno_table = self.read_int_list()
+        if len(lineno_table) != len(code):
+            raise CorruptCacheFile
+        args = [self._cellvar(cellvars, pos) for pos in arg_pos]
+        splat_arg = None
+        if splat_arg_pos != -1:
+            splat_arg = self._cellvar(cellvars, splat_arg_pos)
+        block_arg = None
+        if block_arg_pos != -1:
+            block_arg = self._cellvar(cellvars, block_arg_pos)
+        return W_CodeObject(
+            name,
+            filepath,
+            code,
+            max_stackdepth,
+            consts_w,
+            args,
+            splat_arg,
+            block_arg,
+            defaults,
+            cellvars,
+            freevars,
+            lineno_table,
+        )
+
+    def _cellvar(self, cellvars, pos):
+        if pos < 0 or pos >= len(cellvars):
+            raise CorruptCacheFile
+        return cellvars[pos]
+
+
+class CodeCache(object):
+    """
+    Caches the compiled bytecode of loaded files in a directory, keyed by
+    the file's path, modification time and size, and the interpreter's
+    version. Stale or unreadable cache files are ignored and rewritten.
+    The space always has one, which stays disabled until enable() is called.
+    """
+
+    def __init__(self, cache_dir=None, version=""):
+        self.cache_dir = cache_dir
+        self.version = version
+
+    def enable(self, cache_dir, version):
+        self.cache_dir = cache_dir
+        self.version = version
+
+    def is_enabled(self):
+        return self.cache_dir is not None
+
+    def cache_path(self, path):
+        start = path.rfind(os.sep) + 1
+        assert start >= 0
+        basename = path[start:]
+        cache_dir = self.cache_dir
+        assert cache_dir is not None
+        return os.path.join(cache_dir, "%s-%x.rbc" % (basename, intmask(fnv_hash(path))))
+
+    def _write_header(self, writer, path, st):
+        writer.write_str(MAGIC)
+        writer.write_int(FORMAT_VERSION)
+        writer.write_int(BYTECODE_FINGERPRINT)
+        writer.write_str(self.version)
+        writer.write_str(path)
+        writer.write_float(st.st_mtime)
+        writer.write_int(intmask(st.st_size))
+
+    def _check_header(self, reader, path, st):
+        return (
+            reader.read_str() == MAGIC and
+            reader.read_int() == FORMAT_VERSION and
+            reader.read_int() == BYTECODE_FINGERPRINT and
+            reader.read_str() == self.version and
+            reader.read_str() == path and
+            reader.read_float() == st.st_mtime and
+            reader.read_int() == intmask(st.st_size)
+        )
+
+    def load(self, space, path, st):
+        try:
+            data = self._read_file(self.cache_path(path))
+        except OSError:
+            return None
+        reader = CodeReader(data)
+        try:
+            if not self._check_header(reader, path, st):
+                return None
+            bc = reader.read_code(space, path)
+        except (CorruptCacheFile, StaleCacheFile):
+            return None
+        if reader.pos != len(data):
+            return None
+        return bc
+
+    def store(self, space, path, st, bc):
+        writer = CodeWriter()
+        self._write_header(writer, path, st)
+        try:
+            writer.write_code(space, bc)
+        except UncacheableCode:
+            return
+        cache_path = self.cache_path(path)
+        tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+        try:
+            self._ensure_cache_dir()
+            self._write_file(tmp_path, writer.getvalue())
+            os.rename(tmp_path, cache_path)
+        except OSError:
+            # The cache is only an optimization, an unwritable cache
+            # directory shouldn't prevent loading the file.
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def _ensure_cache_dir(self):
+        cache_dir = self.cache_dir
+        assert cache_dir is not None
+        if isdir(cache_dir):
+            return
+        end = cache_dir.rfind(os.sep)
+        if end > 0:
+            parent = cache_dir[:end]
+            if not isdir(parent):
+                os.mkdir(parent, 0755)
+        os.mkdir(cache_dir, 0755)
+
+    def _read_file(self, path):
+        fd = os.open(path, os.O_RDONLY, 0)
+        try:
+            chunks = []
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return "".join(chunks)
+        finally:
+            os.close(fd)
+
+    def _write_file(self, path, data):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0644)
+        try:
+            pos = 0
+            while pos < len(data):
+                pos += os.write(fd, data[pos:])
+        finally:
+            os.close(fd)
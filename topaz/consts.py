@@ -15,6 +15,7 @@ BYTECODES = [
     ("LOAD_BLOCK", 0, +1),
     ("LOAD_CODE", 0, +1),
     ("LOAD_CONST", 1, +1),
+    ("LOAD_FOLDED", 1, +1),
 
     ("LOAD_DEREF", 1, +1),
     ("STORE_DEREF", 1, 0),
@@ -69,6 +70,15 @@ BYTECODES = [
     ("SEND_BLOCK_SPLAT", 2, SEND_EFFECT),
     ("DEFINED_METHOD", 1, 0),
 
+    ("BINARY_ADD", 1, -1),
+    ("BINARY_SUB", 1, -1),
+    ("BINARY_MUL", 1, -1),
+    ("BINARY_LT", 1, -1),
+    ("BINARY_LE", 1, -1),
+    ("BINARY_GT", 1, -1),
+    ("BINARY_GE", 1, -1),
+    ("BINARY_EQ", 1, -1),
+
     ("SEND_SUPER_BLOCK", 2, SEND_EFFECT),
     ("SEND_SUPER_BLOCK_SPLAT", 2, SEND_EFFECT),
     ("DEFINED_SUPER", 1, 0),
@@ -82,6 +92,7 @@ BYTECODES = [
     ("JUMP", 1, 0),
     ("JUMP_IF_TRUE", 1, -1),
     ("JUMP_IF_FALSE", 1, -1),
+    ("JUMP_TABLE", 2, 0),
 
     ("DISCARD_TOP", 0, -1),
     ("DUP_TOP", 0, +1),
@@ -112,3 +123,16 @@ for i, (name, num_args, stack_effect) in enumerate(BYTECODES):
     BYTECODE_STACK_EFFECT.append(stack_effect)
 
 UNROLLING_BYTECODES = unrolling_iterable(enumerate(BYTECODE_NAMES))
+
+# Operator sends with a single argument that get their own bytecode, with fast
+# paths for Fixnum and Float operands.
+BINARY_OPERATORS = {
+    "+": BINARY_ADD,
+    "-": BINARY_SUB,
+    "*": BINARY_MUL,
+    "<": BINARY_LT,
+    "<=": BINARY_LE,
+    ">": BINARY_GT,
+    ">=": BINARY_GE,
+    "==": BINARY_EQ,
+}
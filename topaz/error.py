@@ -36,6 +36,12 @@ _errno_for_oserror_map = {
     errno.EISDIR: "EISDIR",
     errno.EINVAL: "EINVAL",
     errno.ENOTEMPTY: "ENOTEMPTY",
+    errno.EAGAIN: "EAGAIN",
+    errno.EPIPE: "EPIPE",
+    errno.EADDRINUSE: "EADDRINUSE",
+    errno.ECONNREFUSED: "ECONNREFUSED",
+    errno.ECONNRESET: "ECONNRESET",
+    errno.ENOTCONN: "ENOTCONN",
 }
 
 
@@ -50,10 +50,10 @@ class Frame(BaseFrame):
             args_w = space.listview(w_arg)
         minargc = len(bytecode.arg_pos) - len(bytecode.defaults)
         if len(args_w) < minargc:
-            args_w.extend([space.w_nil] * (minargc - len(args_w)))
+            args_w = args_w + [space.w_nil] * (minargc - len(args_w))
         if bytecode.splat_arg_pos == -1:
             if len(args_w) > len(bytecode.arg_pos):
-                del args_w[len(bytecode.arg_pos):]
+                args_w = args_w[:len(bytecode.arg_pos)]
         return self.handle_args(space, bytecode, args_w, block)
 
     @jit.unroll_safe
@@ -1,16 +1,25 @@
+import operator
+
 from rpython.rlib import jit, rstackovf
 from rpython.rlib.debug import check_nonneg
 from rpython.rlib.objectmodel import we_are_translated, specialize
+from rpython.rlib.rarithmetic import ovfcheck
+from rpython.rlib.rbigint import rbigint
 
 from topaz import consts
 from topaz.error import RubyError
 from topaz.objects.arrayobject import W_ArrayObject
 from topaz.objects.classobject import W_ClassObject
-from topaz.objects.codeobject import W_CodeObject
+from topaz.objects.codeobject import W_CodeObject, W_FoldedValue, W_JumpTable
+from topaz.objects.floatobject import W_FloatObject
 from topaz.objects.functionobject import W_FunctionObject
+from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.moduleobject import W_ModuleObject
 from topaz.objects.objectobject import W_Root
 from topaz.objects.procobject import W_ProcObject
+from topaz.optimizer import ConstantFoldingGuard
+from topaz.profiler import Profiler
+from topaz.scheduler import Scheduler
 from topaz.scope import StaticScope
 from topaz.utils.regexp import RegexpError
 
@@ -25,6 +34,7 @@ class Interpreter(object):
         reds=["self", "frame"],
         virtualizables=["frame"],
         get_printable_location=get_printable_location,
+        is_recursive=True,
         check_untranslated=False
     )
 
@@ -59,6 +69,12 @@ class Interpreter(object):
         if (space.getexecutioncontext().hastraceproc() and
             bytecode.lineno_table[pc] != bytecode.lineno_table[prev_instr]):
             space.getexecutioncontext().invoke_trace_proc(space, "line", None, None, frame=frame)
+        profiler = space.fromcache(Profiler)
+        if profiler.active and profiler.sample_pending():
+            profiler.take_sample(space)
+        scheduler = space.fromcache(Scheduler)
+        if scheduler.has_threads:
+            scheduler.tick(space)
         try:
             pc = self.handle_bytecode(space, pc, frame, bytecode)
         except RubyError as e:
@@ -175,6 +191,14 @@ class Interpreter(object):
     def LOAD_CONST(self, space, bytecode, frame, pc, idx):
         frame.push(bytecode.consts_w[idx])
 
+    def LOAD_FOLDED(self, space, bytecode, frame, pc, idx):
+        w_folded = bytecode.consts_w[idx]
+        assert isinstance(w_folded, W_FoldedValue)
+        if space.fromcache(ConstantFoldingGuard).invalidated:
+            frame.push(w_folded.evaluate(space))
+        else:
+            frame.push(w_folded.get_value(space))
+
     def LOAD_DEREF(self, space, bytecode, frame, pc, idx):
         frame.push(frame.cells[idx].get(space, frame, idx) or space.w_nil)
 
@@ -462,8 +486,8 @@ class Interpreter(object):
         n_items = len(items_w)
         n_post = n_targets - n_pre - 1
         n_splat = max(n_items - n_pre - n_post, 0)
-        for i in xrange(n_items, n_pre + n_splat + n_post, 1):
-            items_w.append(space.w_nil)
+        if n_items < n_pre + n_splat + n_post:
+            items_w = items_w + [space.w_nil] * (n_pre + n_splat + n_post - n_items)
 
         for i in xrange(n_pre + n_splat + n_post - 1, n_pre + n_splat - 1, -1):
             frame.push(items_w[i])
@@ -519,11 +543,17 @@ class Interpreter(object):
             raise space.error(space.w_TypeError, "can't define singleton")
         frame.push(space.getsingletonclass(w_obj))
 
+    def send(self, space, bytecode, pc, w_receiver, name, args_w, block=None):
+        if jit.we_are_jitted():
+            # Traces already specialize method lookup on the class version.
+            return space.send(w_receiver, name, args_w, block=block)
+        return space.send_cached(bytecode.get_send_cache(pc), w_receiver, name, args_w, block)
+
     def SEND(self, space, bytecode, frame, pc, meth_idx, num_args):
         space.getexecutioncontext().last_instr = pc
         args_w = frame.popitemsreverse(num_args)
         w_receiver = frame.pop()
-        w_res = space.send(w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w)
+        w_res = self.send(space, bytecode, pc, w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w)
         frame.push(w_res)
 
     def SEND_BLOCK(self, space, bytecode, frame, pc, meth_idx, num_args):
@@ -535,7 +565,7 @@ class Interpreter(object):
             w_block = None
         else:
             assert isinstance(w_block, W_ProcObject)
-        w_res = space.send(w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w, block=w_block)
+        w_res = self.send(space, bytecode, pc, w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w, block=w_block)
         frame.push(w_res)
 
     @jit.unroll_safe
@@ -552,7 +582,7 @@ class Interpreter(object):
             args_w[pos:pos + len(array_w)] = array_w
             pos += len(array_w)
         w_receiver = frame.pop()
-        w_res = space.send(w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w)
+        w_res = self.send(space, bytecode, pc, w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w)
         frame.push(w_res)
 
     @jit.unroll_safe
@@ -568,9 +598,77 @@ class Interpreter(object):
             w_block = None
         else:
             assert isinstance(w_block, W_ProcObject)
-        w_res = space.send(w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w, block=w_block)
+        w_res = self.send(space, bytecode, pc, w_receiver, space.symbol_w(bytecode.consts_w[meth_idx]), args_w, block=w_block)
+        frame.push(w_res)
+
+    def binary_send(self, space, bytecode, frame, pc, meth_idx, w_lhs, w_rhs):
+        space.getexecutioncontext().last_instr = pc
+        w_res = self.send(space, bytecode, pc, w_lhs, space.symbol_w(bytecode.consts_w[meth_idx]), [w_rhs])
         frame.push(w_res)
 
+    # The fast paths are only valid as long as nobody redefined the core
+    # operators, which the ConstantFoldingGuard tracks.
+    def new_arith_op(func, bigint_method):
+        def binary_op(self, space, bytecode, frame, pc, meth_idx):
+            w_rhs = frame.pop()
+            w_lhs = frame.pop()
+            if not space.fromcache(ConstantFoldingGuard).invalidated:
+                if isinstance(w_lhs, W_FixnumObject):
+                    if isinstance(w_rhs, W_FixnumObject):
+                        try:
+                            value = ovfcheck(func(w_lhs.intvalue, w_rhs.intvalue))
+                        except OverflowError:
+                            bigint = getattr(rbigint.fromint(w_lhs.intvalue), bigint_method)(
+                                rbigint.fromint(w_rhs.intvalue)
+                            )
+                            frame.push(space.newbigint_fromrbigint(bigint))
+                        else:
+                            frame.push(space.newint(value))
+                        return
+                    elif isinstance(w_rhs, W_FloatObject):
+                        frame.push(space.newfloat(func(float(w_lhs.intvalue), w_rhs.floatvalue)))
+                        return
+                elif isinstance(w_lhs, W_FloatObject):
+                    if isinstance(w_rhs, W_FloatObject):
+                        frame.push(space.newfloat(func(w_lhs.floatvalue, w_rhs.floatvalue)))
+                        return
+                    elif isinstance(w_rhs, W_FixnumObject):
+                        frame.push(space.newfloat(func(w_lhs.floatvalue, float(w_rhs.intvalue))))
+                        return
+            self.binary_send(space, bytecode, frame, pc, meth_idx, w_lhs, w_rhs)
+        return binary_op
+
+    def new_compare_op(func):
+        def binary_op(self, space, bytecode, frame, pc, meth_idx):
+            w_rhs = frame.pop()
+            w_lhs = frame.pop()
+            if not space.fromcache(ConstantFoldingGuard).invalidated:
+                if isinstance(w_lhs, W_FixnumObject):
+                    if isinstance(w_rhs, W_FixnumObject):
+                        frame.push(space.newbool(func(w_lhs.intvalue, w_rhs.intvalue)))
+                        return
+                    elif isinstance(w_rhs, W_FloatObject):
+                        frame.push(space.newbool(func(float(w_lhs.intvalue), w_rhs.floatvalue)))
+                        return
+                elif isinstance(w_lhs, W_FloatObject):
+                    if isinstance(w_rhs, W_FloatObject):
+                        frame.push(space.newbool(func(w_lhs.floatvalue, w_rhs.floatvalue)))
+                        return
+                    elif isinstance(w_rhs, W_FixnumObject):
+                        frame.push(space.newbool(func(w_lhs.floatvalue, float(w_rhs.intvalue))))
+                        return
+            self.binary_send(space, bytecode, frame, pc, meth_idx, w_lhs, w_rhs)
+        return binary_op
+
+    BINARY_ADD = new_arith_op(operator.add, "add")
+    BINARY_SUB = new_arith_op(operator.sub, "sub")
+    BINARY_MUL = new_arith_op(operator.mul, "mul")
+    BINARY_LT = new_compare_op(operator.lt)
+    BINARY_LE = new_compare_op(operator.le)
+    BINARY_GT = new_compare_op(operator.gt)
+    BINARY_GE = new_compare_op(operator.ge)
+    BINARY_EQ = new_compare_op(operator.eq)
+
     def DEFINED_METHOD(self, space, bytecode, frame, pc, meth_idx):
         space.getexecutioncontext().last_instr = pc
         w_obj = frame.pop()
@@ -655,6 +753,13 @@ class Interpreter(object):
         else:
             return self.jump(space, bytecode, frame, pc, target_pc)
 
+    def JUMP_TABLE(self, space, bytecode, frame, pc, target_pc, idx):
+        if space.fromcache(ConstantFoldingGuard).invalidated:
+            return pc
+        w_table = bytecode.consts_w[idx]
+        assert isinstance(w_table, W_JumpTable)
+        return w_table.lookup(space, frame.peek(), pc, target_pc)
+
     def DISCARD_TOP(self, space, bytecode, frame, pc):
         frame.pop()
 
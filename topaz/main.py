@@ -10,6 +10,8 @@ from rpython.rlib.streamio import open_file_as_stream, fdopen_as_stream
 from topaz.error import RubyError, print_traceback
 from topaz.objects.exceptionobject import W_SystemExit
 from topaz.objspace import ObjectSpace
+from topaz.profiler import Profiler
+from topaz.reactor import Reactor
 from topaz.system import IS_WINDOWS, IS_64BIT
 
 
@@ -37,6 +39,7 @@ USAGE = "\n".join([
     """  -W[level=2]     set warning level; 0=silence, 1=medium, 2=verbose""",
     # """  -x[directory]   strip off text before #!ruby line and perhaps cd to directory""",
     """  --copyright     print the copyright""",
+    """  --profile[=file] sample the program and write collapsed stacks to file (default: stderr)""",
     """  --version       print the version""",
     ""
 ])
@@ -59,9 +62,31 @@ def get_topaz_config_options():
     }
 
 
-def create_entry_point(config):
+def get_code_cache_dir():
+    cache_dir = os.environ.get("TOPAZ_CACHE_DIR")
+    if cache_dir is None:
+        home = os.environ.get("HOME")
+        if not home:
+            return None
+        cache_dir = os.path.join(os.path.join(home, ".cache"), "topaz")
+    return cache_dir
+
+
+def create_entry_point(config, kernel_snapshot=False):
+    if kernel_snapshot:
+        snapshot_space = ObjectSpace(config)
+        snapshot_space.snapshot_kernel()
+    else:
+        snapshot_space = None
+
     def entry_point(argv):
-        space = getspace(config)
+        if kernel_snapshot:
+            space = snapshot_space
+        else:
+            space = getspace(config)
+        cache_dir = get_code_cache_dir()
+        if cache_dir:
+            space.code_cache.enable(cache_dir, RUBY_REVISION)
         space.setup(argv[0])
         return _entry_point(space, argv)
     return entry_point
@@ -98,6 +123,7 @@ def _parse_argv(space, argv):
     exprs = []
     reqs = []
     load_path_entries = []
+    profile_path = None
     argv_w = []
     idx = 1
     while idx < len(argv):
@@ -143,6 +169,10 @@ def _parse_argv(space, argv):
             reqs.append(arg[2:])
         elif arg.startswith("-W"):
             warning_level = arg[2:]
+        elif arg == "--profile":
+            profile_path = "-"
+        elif arg.startswith("--profile="):
+            profile_path = arg[len("--profile="):]
         elif arg == "-S":
             search_path = True
         elif arg == "-s":
@@ -189,10 +219,27 @@ def _parse_argv(space, argv):
         exprs,
         reqs,
         load_path_entries,
+        profile_path,
         argv_w
     )
 
 
+def _write_profile(space, profile_path):
+    report = space.fromcache(Profiler).report()
+    if profile_path == "-":
+        os.write(2, report)
+        return
+    try:
+        f = open_file_as_stream(profile_path, "w", buffering=0)
+    except OSError as e:
+        os.write(2, "%s -- %s (profile)\n" % (os.strerror(e.errno), profile_path))
+        return
+    try:
+        f.write(report)
+    finally:
+        f.close()
+
+
 def _entry_point(space, argv):
     if IS_WINDOWS:
         system = "Windows"
@@ -221,6 +268,7 @@ def _entry_point(space, argv):
             exprs,
             reqs,
             load_path_entries,
+            profile_path,
             argv_w
         ) = _parse_argv(space, argv)
     except ShortCircuitError as e:
@@ -296,6 +344,8 @@ def _entry_point(space, argv):
     w_exit_error = None
     explicit_status = False
     jit.set_param(None, "trace_limit", 10000)
+    if profile_path is not None:
+        space.fromcache(Profiler).start(Profiler.DEFAULT_INTERVAL)
     try:
         if do_loop:
             print_after = space.is_true(flag_globals_w["$-p"])
@@ -311,6 +361,8 @@ def _entry_point(space, argv):
                         space.send(space.w_kernel, "print", [w_res])
         else:
             space.execute(source, filepath=path)
+        # Scheduled fibers still waiting on IO get to finish.
+        space.fromcache(Reactor).run(space)
     except RubyError as e:
         explicit_status = True
         w_exc = e.w_value
@@ -322,6 +374,9 @@ def _entry_point(space, argv):
     exit_handler_status = space.run_exit_handlers()
     if not explicit_status and exit_handler_status != -1:
         status = exit_handler_status
+    if profile_path is not None:
+        space.fromcache(Profiler).stop()
+        _write_profile(space, profile_path)
     if w_exit_error is not None:
         print_traceback(space, w_exit_error, path)
 
@@ -1,7 +1,152 @@
 from __future__ import absolute_import
 
+from rpython.rlib import jit
+
+from topaz.coerce import Coerce
 from topaz.module import ModuleDef
+from topaz.objects.procobject import block_jitdriver
 
 
 class Enumerable(object):
     moduledef = ModuleDef("Enumerable")
+
+
+class ItemIterator(object):
+    """
+    Walks over the values a builtin collection's #each yields, for the
+    native versions of the Enumerable methods below. next() returns None
+    once it's exhausted.
+    """
+
+    def next(self, space):
+        raise NotImplementedError
+
+
+map_driver = block_jitdriver("Enumerable#map")
+select_driver = block_jitdriver("Enumerable#select")
+reject_driver = block_jitdriver("Enumerable#reject")
+inject_driver = block_jitdriver("Enumerable#inject")
+each_with_index_driver = block_jitdriver("Enumerable#each_with_index")
+each_slice_driver = block_jitdriver("Enumerable#each_slice")
+
+
+def get_printable_location(op):
+    return "Enumerable#inject(:%s)" % op
+
+inject_op_driver = jit.JitDriver(
+    name="Enumerable#inject(op)",
+    greens=["op"],
+    reds="auto",
+    get_printable_location=get_printable_location,
+    check_untranslated=False
+)
+
+
+def iter_map(space, it, block):
+    result_w = []
+    while True:
+        map_driver.jit_merge_point(block_bytecode=block.bytecode)
+        w_item = it.next(space)
+        if w_item is None:
+            break
+        result_w.append(space.invoke_block(block, [w_item]))
+    return space.newarray(result_w)
+
+
+def iter_select(space, it, block):
+    result_w = []
+    while True:
+        select_driver.jit_merge_point(block_bytecode=block.bytecode)
+        w_item = it.next(space)
+        if w_item is None:
+            break
+        if space.is_true(space.invoke_block(block, [w_item])):
+            result_w.append(w_item)
+    return space.newarray(result_w)
+
+
+def iter_reject(space, it, block):
+    result_w = []
+    while True:
+        reject_driver.jit_merge_point(block_bytecode=block.bytecode)
+        w_item = it.next(space)
+        if w_item is None:
+            break
+        if not space.is_true(space.invoke_block(block, [w_item])):
+            result_w.append(w_item)
+    return space.newarray(result_w)
+
+
+def iter_inject(space, it, args_w, block):
+    """
+    Returns None if the arguments need the generic implementation.
+    """
+    w_memo = None
+    op = None
+    if len(args_w) == 1:
+        if block is None:
+            op = Coerce.symbol(space, args_w[0])
+        else:
+            w_memo = args_w[0]
+    elif len(args_w) == 2:
+        w_memo = args_w[0]
+        op = Coerce.symbol(space, args_w[1])
+    elif len(args_w) > 2:
+        raise space.error(space.w_ArgumentError,
+            "wrong number of arguments (%d for 0..2)" % len(args_w)
+        )
+    if op is None and block is None:
+        return None
+    if w_memo is None:
+        w_memo = it.next(space)
+        if w_memo is None:
+            return space.w_nil
+    if op is not None:
+        return _inject_op(space, it, w_memo, op)
+    while True:
+        inject_driver.jit_merge_point(block_bytecode=block.bytecode)
+        w_item = it.next(space)
+        if w_item is None:
+            break
+        w_memo = space.invoke_block(block, [w_memo, w_item])
+    return w_memo
+
+
+def _inject_op(space, it, w_memo, op):
+    while True:
+        inject_op_driver.jit_merge_point(op=op)
+        w_item = it.next(space)
+        if w_item is None:
+            break
+        w_memo = space.send(w_memo, op, [w_item])
+    return w_memo
+
+
+def iter_each_with_index(space, it, block):
+    i = 0
+    while True:
+        each_with_index_driver.jit_merge_point(block_bytecode=block.bytecode)
+        w_item = it.next(space)
+        if w_item is None:
+            break
+        space.invoke_block(block, [w_item, space.newint(i)])
+        i += 1
+
+
+def iter_each_slice(space, it, w_num, block):
+    num = Coerce.int(space, w_num)
+    if num <= 0:
+        raise space.error(space.w_ArgumentError, "invalid slice size")
+    slice_w = []
+    while True:
+        each_slice_driver.jit_merge_point(block_bytecode=block.bytecode)
+        w_item = it.next(space)
+        if w_item is None:
+            break
+        slice_w.append(w_item)
+        if len(slice_w) == num:
+            space.invoke_block(block, [space.newarray(slice_w)])
+            slice_w = []
+    if slice_w:
+        space.invoke_block(block, [space.newarray(slice_w)])
+    return space.w_nil
@@ -19,6 +19,90 @@ from topaz.objects.moduleobject import W_ModuleObject
 from topaz.objects.procobject import W_ProcObject
 from topaz.objects.randomobject import W_RandomObject
 from topaz.objects.stringobject import W_StringObject
+from topaz.scheduler import Scheduler
+
+
+class LoadedFeaturesIndex(object):
+    # A set of the paths in $", so require doesn't have to scan it. Ruby code
+    # can modify $" too, but it almost always only appends to it, so the index
+    # remembers how many entries it has seen and the last of them. While that
+    # entry is still in place only the entries after it are added, anything
+    # else rebuilds the index.
+    def __init__(self, space):
+        self.count = 0
+        self.w_last = None
+        self.paths = {}
+
+    def _sync(self, space):
+        w_features = space.w_loaded_features
+        length = w_features.length()
+        start = self.count
+        if start > length or (start > 0 and
+            w_features.getitem(space, start - 1) is not self.w_last):
+
+            start = 0
+            self.paths.clear()
+        for i in xrange(start, length):
+            w_feature = w_features.getitem(space, i)
+            if isinstance(w_feature, W_StringObject):
+                self.paths[space.str_w(w_feature)] = None
+        self.count = length
+        self.w_last = w_features.getitem(space, length - 1) if length else None
+
+    def contains(self, space, path):
+        self._sync(space)
+        return path in self.paths
+
+    def add(self, space, path):
+        self._sync(space)
+        w_path = space.newstr_fromstr(path)
+        space.send(w_path, "freeze")
+        space.w_loaded_features.append(space, w_path)
+        self.count += 1
+        self.w_last = w_path
+        self.paths[path] = None
+
+
+class FeatureResolutionCache(object):
+    # Maps features to the absolute paths they were found at on $LOAD_PATH.
+    # The coerced $LOAD_PATH is kept until one of its entries is replaced,
+    # which also empties the cache.
+    def __init__(self, space):
+        self.load_path_w = []
+        self.load_path = []
+        self.resolved = {}
+
+    def _same_load_path(self, space, w_load_path):
+        if w_load_path.length() != len(self.load_path_w):
+            return False
+        for i, w_base in enumerate(self.load_path_w):
+            if w_load_path.getitem(space, i) is not w_base:
+                return False
+        return True
+
+    def get_load_path(self, space):
+        w_load_path = space.w_load_path
+        if not self._same_load_path(space, w_load_path):
+            load_path_w = [
+                w_load_path.getitem(space, i)
+                for i in xrange(w_load_path.length())
+            ]
+            self.load_path = [Coerce.path(space, w_base) for w_base in load_path_w]
+            self.load_path_w = load_path_w
+            self.resolved.clear()
+        return self.load_path
+
+    def get(self, path):
+        return self.resolved.get(path, None)
+
+    def set(self, path, full_path):
+        self.resolved[path] = full_path
+
+    def invalidate(self, path):
+        try:
+            del self.resolved[path]
+        except KeyError:
+            pass
 
 
 class Kernel(object):
@@ -94,12 +178,20 @@ class Kernel(object):
             path += ".rb"
 
         if not (path.startswith("/") or path.startswith("./") or path.startswith("../")):
-            w_load_path = space.globals.get(space, "$LOAD_PATH")
-            for w_base in space.listview(w_load_path):
-                base = Coerce.path(space, w_base)
+            cache = space.fromcache(FeatureResolutionCache)
+            load_path = cache.get_load_path(space)
+            full = cache.get(path)
+            if full is not None:
+                if os.path.isfile(full):
+                    return full
+                cache.invalidate(path)
+            for base in load_path:
                 full = os.path.join(base, path)
                 if os.path.isfile(full):
-                    path = os.path.join(base, path)
+                    # Relative entries depend on the working directory.
+                    if os.path.isabs(full):
+                        cache.set(path, full)
+                    path = full
                     break
         return path
 
@@ -108,6 +200,22 @@ class Kernel(object):
         if not os.path.exists(path):
             raise space.error(space.w_LoadError, orig_path)
 
+        code_cache = space.code_cache
+        if not code_cache.is_enabled():
+            bc = Kernel.compile_feature(space, path)
+        else:
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                raise error_for_oserror(space, e)
+            bc = code_cache.load(space, path, st)
+            if bc is None:
+                bc = Kernel.compile_feature(space, path)
+                code_cache.store(space, path, st, bc)
+        space.execute_code(bc)
+
+    @staticmethod
+    def compile_feature(space, path):
         try:
             f = open_file_as_stream(path, buffering=0)
             try:
@@ -116,8 +224,7 @@ class Kernel(object):
                 f.close()
         except OSError as e:
             raise error_for_oserror(space, e)
-
-        space.execute(contents, filepath=path)
+        return space.compile(contents, path)
 
     @moduledef.function("require", path="path")
     def function_require(self, space, path):
@@ -125,15 +232,12 @@ class Kernel(object):
         orig_path = path
         path = Kernel.find_feature(space, path)
 
-        w_loaded_features = space.globals.get(space, '$"')
-        w_already_loaded = space.send(
-            w_loaded_features, "include?", [space.newstr_fromstr(path)]
-        )
-        if space.is_true(w_already_loaded):
+        loaded_features = space.fromcache(LoadedFeaturesIndex)
+        if loaded_features.contains(space, path):
             return space.w_false
 
         Kernel.load_feature(space, path, orig_path)
-        w_loaded_features.method_lshift(space, space.newstr_fromstr(path))
+        loaded_features.add(space, path)
         return space.w_true
 
     @moduledef.function("load", path="path")
@@ -219,6 +323,8 @@ class Kernel(object):
         if len(args_w) > 1 and space.respond_to(args_w[-1], "to_hash"):
             raise space.error(space.w_NotImplementedError, "exec with options")
 
+        space.flush_io_buffers()
+
         if space.respond_to(args_w[0], "to_ary"):
             w_cmd = space.convert_type(args_w[0], space.w_array, "to_ary")
             cmd_w = space.listview(w_cmd)
@@ -339,10 +445,15 @@ class Kernel(object):
 
     @moduledef.method("sleep")
     def method_sleep(self, space, w_duration=None):
+        scheduler = space.fromcache(Scheduler)
         if w_duration is None:
-            raise space.error(space.w_NotImplementedError)
+            if not scheduler.has_threads:
+                raise space.error(space.w_NotImplementedError)
+            duration = -1.0
+        else:
+            duration = space.float_w(w_duration)
         start = time.time()
-        time.sleep(space.float_w(w_duration))
+        scheduler.sleep(space, duration)
         return space.newint(int(round_double(time.time() - start, 0)))
 
     @moduledef.method("initialize_clone")
@@ -1,17 +1,27 @@
 from __future__ import absolute_import
+
+from rpython.rlib.rarithmetic import string_to_int
+from rpython.rlib.longlong2float import float2longlong
+from rpython.rlib.rbigint import rbigint
+from rpython.rlib.rfloat import (INFINITY, NAN, copysign, formatd, isinf, isnan,
+    string_to_float)
+from rpython.rlib.rstring import StringBuilder
+
 from topaz.module import ModuleDef
 from topaz.objects.arrayobject import W_ArrayObject
-from topaz.objects.boolobject import W_TrueObject, W_FalseObject
-from topaz.objects.intobject import W_FixnumObject
+from topaz.objects.bignumobject import W_BignumObject
+from topaz.objects.exceptionobject import W_ExceptionObject
+from topaz.objects.floatobject import W_FloatObject
 from topaz.objects.hashobject import W_HashObject
-from topaz.objects.nilobject import W_NilObject
+from topaz.objects.intobject import W_FixnumObject
+from topaz.objects.ioobject import W_IOObject
+from topaz.objects.moduleobject import W_ModuleObject
+from topaz.objects.classobject import W_ClassObject
+from topaz.objects.objectobject import W_Object
+from topaz.objects.rangeobject import W_RangeObject
+from topaz.objects.regexpobject import W_RegexpObject
 from topaz.objects.stringobject import W_StringObject
 from topaz.objects.symbolobject import W_SymbolObject
-from topaz.objects.ioobject import W_IOObject
-from topaz.objects.floatobject import W_FloatObject
-
-import os
-import math
 
 
 class Marshal(object):
@@ -20,272 +30,669 @@ class Marshal(object):
     MAJOR_VERSION = 4
     MINOR_VERSION = 8
 
-    NIL = 0x30
-    TRUE = 0x54
-    FALSE = 0x46
-    FIXNUM = 0x69
-    ARRAY = 0x5b
-    SYMBOL = 0x3a
-    IVAR = 0x49
-    STRING = 0x22
-    HASH = 0x7b
-    FLOAT = 0x66
+    NIL = "0"
+    TRUE = "T"
+    FALSE = "F"
+    FIXNUM = "i"
+    BIGNUM = "l"
+    FLOAT = "f"
+    SYMBOL = ":"
+    SYMLINK = ";"
+    LINK = "@"
+    IVAR = "I"
+    STRING = "\""
+    REGEXP = "/"
+    ARRAY = "["
+    HASH = "{"
+    HASH_DEFAULT = "}"
+    OBJECT = "o"
+    STRUCT = "S"
+    CLASS = "c"
+    MODULE = "m"
+    USERDEF = "u"
+    USRMARSHAL = "U"
+    UCLASS = "C"
+    EXTENDED = "e"
+
+    # Marshal's own limits for Fixnums, a Bignum is written beyond these.
+    FIXNUM_MIN = -(2 ** 30)
+    FIXNUM_MAX = 2 ** 30 - 1
 
     @moduledef.setup_module
     def setup_module(space, w_mod):
         space.set_const(w_mod, "MAJOR_VERSION", space.newint(Marshal.MAJOR_VERSION))
         space.set_const(w_mod, "MINOR_VERSION", space.newint(Marshal.MINOR_VERSION))
 
-    @staticmethod
-    def dump(space, w_obj):
-        bytes = []
-        if isinstance(w_obj, W_NilObject):
-            bytes.append(Marshal.NIL)
-        elif isinstance(w_obj, W_TrueObject):
-            bytes.append(Marshal.TRUE)
-        elif isinstance(w_obj, W_FalseObject):
-            bytes.append(Marshal.FALSE)
-        elif isinstance(w_obj, W_FixnumObject):
-            bytes.append(Marshal.FIXNUM)
-            bytes += Marshal.integer2bytes(space.int_w(w_obj))
-        elif isinstance(w_obj, W_FloatObject):
-            bytes.append(Marshal.FLOAT)
-            raw_value = space.float_w(w_obj)
-            int_value = int(raw_value)
-            float_value = raw_value
-            string = ""  # None
-
-            if raw_value == int_value:
-                float_value = int_value
-                # repr would be more accurate here, but it weirdly does not translate
-                if str(raw_value) == "-0.0":  # slowing things down
-                    string = "-0"
-                else:
-                    string = str(float_value)
-            else:  # encode float
-                string = str(float_value)
-
-            length = len(string)
-            bytes += Marshal.integer2bytes(length)
-            for c in string:
-                bytes.append(ord(c))
-        elif isinstance(w_obj, W_ArrayObject):
-            array = space.listview(w_obj)
-            bytes.append(Marshal.ARRAY)
-            bytes += Marshal.integer2bytes(len(array))
-            for item in array:
-                bytes += Marshal.dump(space, item)
-        elif isinstance(w_obj, W_SymbolObject):
-            bytes.append(Marshal.SYMBOL)
-            symbol = space.symbol_w(w_obj)
-            bytes += Marshal.integer2bytes(len(symbol))
-            for char in symbol:
-                bytes.append(ord(char))
-        elif isinstance(w_obj, W_StringObject):
-            string = space.str_w(w_obj)
-            bytes.append(Marshal.IVAR)
-            bytes.append(Marshal.STRING)
-            bytes += Marshal.integer2bytes(len(string))
-            for char in string:
-                bytes.append(ord(char))
-            bytes.append(0x06)
-            # TODO: respect encoding
-            bytes += Marshal.dump(space, space.newsymbol("E"))
-            bytes += Marshal.dump(space, space.w_true)
-        elif isinstance(w_obj, W_HashObject):
-            bytes.append(Marshal.HASH)
-            hash_len = w_obj.strategy.len(w_obj.dict_storage)
-            hash_keys_w = w_obj.strategy.keys(w_obj.dict_storage)
-            bytes += Marshal.integer2bytes(hash_len)
-            for w_key in hash_keys_w:
-                bytes += Marshal.dump(space, w_key)
-                w_value = w_obj.strategy.getitem(w_obj.dict_storage, w_key)
-                bytes += Marshal.dump(space, w_value)
+    @moduledef.function("dump")
+    def method_dump(self, space, w_obj, w_io=None, w_limit=None):
+        limit = -1
+        if w_limit is not None:
+            limit = space.int_w(w_limit)
+        elif isinstance(w_io, W_FixnumObject):
+            limit = space.int_w(w_io)
+            w_io = None
+        if (w_io is not None and not isinstance(w_io, W_IOObject) and
+            not space.respond_to(w_io, "write")):
+            raise space.error(space.w_TypeError, "instance of IO needed")
+        dumper = Dumper(space, w_io)
+        dumper.write_header()
+        dumper.dump(w_obj, limit)
+        return dumper.finish()
+
+    @moduledef.function("load")
+    @moduledef.function("restore")
+    def method_load(self, space, w_source):
+        if isinstance(w_source, W_StringObject):
+            loader = Loader(space, space.str_w(w_source), None)
+        elif isinstance(w_source, W_IOObject) or space.respond_to(w_source, "read"):
+            loader = Loader(space, "", w_source)
         else:
-            raise NotImplementedError(type(w_obj))
-
-        return bytes
-
-    @staticmethod
-    def load(space, bytes, offset=0):
-        byte = bytes[offset]
-        if byte == Marshal.NIL:
-            return space.w_nil, 1
-        elif byte == Marshal.TRUE:
-            return space.w_true, 1
-        elif byte == Marshal.FALSE:
-            return space.w_false, 1
-        elif byte == Marshal.FIXNUM:
-            value, length = Marshal.bytes2integer(bytes, offset + 1)
-            return space.newint(value), length
-        elif byte == Marshal.FLOAT:
-            count, length = Marshal.bytes2integer(bytes, offset + 1)
+            raise space.error(space.w_TypeError, "instance of IO needed")
+        loader.read_header()
+        return loader.load()
+
+
+def class_name(space, w_cls):
+    if isinstance(w_cls, W_ClassObject) and w_cls.is_singleton:
+        raise space.error(space.w_TypeError, "singleton class can't be dumped")
+    if w_cls.name is None:
+        raise space.error(space.w_TypeError,
+            "can't dump anonymous class %s" % space.str_w(space.send(w_cls, "inspect"))
+        )
+    return w_cls.name
+
+
+def format_float(value):
+    # The shortest digits that read back as the same value, formatted the
+    # way MRI does.
+    if isnan(value):
+        return "nan"
+    if isinf(value):
+        return "inf" if value > 0 else "-inf"
+    if value == 0.0:
+        return "-0" if copysign(1.0, value) < 0 else "0"
+    s = formatd(value, "r", 0)
+    sign = ""
+    if s[0] == "-":
+        sign = "-"
+        s = s[1:]
+    exponent = 0
+    e = s.find("e")
+    if e >= 0:
+        exponent = string_to_int(s[e + 1:])
+        s = s[:e]
+    dot = s.find(".")
+    if dot >= 0:
+        digits = s[:dot] + s[dot + 1:]
+        decpt = dot + exponent
+    else:
+        digits = s
+        decpt = len(s) + exponent
+    start = 0
+    while start < len(digits) - 1 and digits[start] == "0":
+        start += 1
+        decpt -= 1
+    end = len(digits)
+    while end > start + 1 and digits[end - 1] == "0":
+        end -= 1
+    assert start >= 0
+    assert end >= start
+    digits = digits[start:end]
+    ndigits = len(digits)
+    if decpt < -3 or decpt > ndigits:
+        res = digits[0]
+        if ndigits > 1:
+            res += "." + digits[1:]
+        return "%s%se%d" % (sign, res, decpt - 1)
+    elif decpt > 0:
+        if ndigits > decpt:
+            return "%s%s.%s" % (sign, digits[:decpt], digits[decpt:])
+        return sign + digits
+    else:
+        return "%s0.%s%s" % (sign, "0" * -decpt, digits)
 
-            chars = []
-            for i in range(length, length + count):
-                chars.append(chr(bytes[offset + i]))
 
-            return space.newfloat(float("".join(chars))), length
-        elif byte == Marshal.ARRAY:
-            count, skip = Marshal.bytes2integer(bytes, offset + 1)
+class Dumper(object):
+    """
+    Writes the Marshal format into a buffer, which is handed to the IO in
+    chunks when dumping to one.
+    """
 
-            array = []
-            for i in range(0, count):
-                assert skip > 0
-                element, l = Marshal.load(space, bytes, offset + skip)
-                skip += l
-                array.append(element)
+    CHUNK_SIZE = 64 * 1024
 
-            return space.newarray(array), skip
-        elif byte == Marshal.SYMBOL:
-            count, length = Marshal.bytes2integer(bytes, offset + 1)
+    def __init__(self, space, w_io):
+        self.space = space
+        self.w_io = w_io
+        self.buffer = StringBuilder()
+        self.symbols = {}
+        self.objects = {}
+        # Floats are unboxed in some places, so an identical one isn't
+        # necessarily the same object.
+        self.floats = {}
 
+    def write_header(self):
+        self.buffer.append(chr(Marshal.MAJOR_VERSION))
+        self.buffer.append(chr(Marshal.MINOR_VERSION))
+
+    def finish(self):
+        if self.w_io is None:
+            return self.space.newstr_fromstr(self.buffer.build())
+        self.flush()
+        return self.w_io
+
+    def flush(self):
+        space = self.space
+        data = self.buffer.build()
+        self.buffer = StringBuilder()
+        w_io = self.w_io
+        if isinstance(w_io, W_IOObject):
+            w_io.ensure_not_closed(space)
+            w_io.write_str(space, data)
+        else:
+            space.send(w_io, "write", [space.newstr_fromstr(data)])
+
+    def write_byte(self, c):
+        self.buffer.append(c)
+
+    def write_long(self, value):
+        if value == 0:
+            self.buffer.append(chr(0))
+        elif value > 0 and value < 123:
+            self.buffer.append(chr(value + 5))
+        elif value > -124 and value < 0:
+            self.buffer.append(chr((value - 5) & 0xff))
+        else:
             chars = []
-            for i in range(length, length + count):
-                chars.append(chr(bytes[offset + i]))
-
-            return space.newsymbol("".join(chars)), length + count
-        elif byte == Marshal.IVAR:
-            # TODO: fully interpret IVARS
-            if bytes[offset + 1] == Marshal.STRING:
-                count, length = Marshal.bytes2integer(bytes, offset + 2)
-                encoding = 6
-                chars = []
-                # TODO: take encoding into consideration
-                for i in range(length + 1, length + count + 1):
-                    chars.append(chr(bytes[offset + i]))
-                return space.newstr_fromstr("".join(chars)), count + length + encoding
-            else:
-                raise NotImplementedError(bytes[offset + 1])
-        elif byte == Marshal.HASH:
-            count, skip = Marshal.bytes2integer(bytes, offset + 1)
-            w_hash = space.newhash()
-            for i in range(0, count):
-                assert skip > 0
-                k, s = Marshal.load(space, bytes, offset + skip)
-                skip += s
-                assert skip > 0
-                v, s = Marshal.load(space, bytes, offset + skip)
-                skip += s
-                w_hash.method_subscript_assign(space, k, v)
-            return w_hash, skip
+            while True:
+                chars.append(chr(value & 0xff))
+                value >>= 8
+                if value == 0:
+                    self.buffer.append(chr(len(chars)))
+                    break
+                if value == -1:
+                    self.buffer.append(chr(256 - len(chars)))
+                    break
+            for c in chars:
+                self.buffer.append(c)
+
+    def write_bytes(self, s):
+        self.write_long(len(s))
+        self.buffer.append(s)
+
+    def write_symbol(self, symbol):
+        index = self.symbols.get(symbol, -1)
+        if index >= 0:
+            self.write_byte(Marshal.SYMLINK)
+            self.write_long(index)
         else:
-            raise NotImplementedError(byte)
+            self.symbols[symbol] = len(self.symbols)
+            self.write_byte(Marshal.SYMBOL)
+            self.write_bytes(symbol)
 
-    @moduledef.function("dump")
-    def method_dump(self, space, w_obj, w_io=None):
-        bytes = [4, 8]
-        bytes += Marshal.dump(space, w_obj)
-        string = "".join([chr(byte) for byte in bytes])
+    def write_encoding(self, ascii):
+        # TODO: respect encoding
+        self.write_long(1)
+        self.write_symbol("E")
+        self.write_byte(Marshal.FALSE if ascii else Marshal.TRUE)
 
-        if w_io is not None:
-            assert isinstance(w_io, W_IOObject)
-            w_io.ensure_not_closed(space)
-            os.write(w_io.fd, string)
-            return w_io
+    def write_uclass(self, w_obj, w_base):
+        w_cls = self.space.getnonsingletonclass(w_obj)
+        if w_cls is not w_base:
+            self.write_byte(Marshal.UCLASS)
+            self.write_symbol(class_name(self.space, w_cls))
+
+    def write_bignum(self, value):
+        self.write_byte(Marshal.BIGNUM)
+        self.write_byte("-" if value.sign < 0 else "+")
+        value = value.abs()
+        nbytes = (value.bit_length() + 15) // 16 * 2
+        self.write_long(nbytes // 2)
+        self.buffer.append(value.tobytes(nbytes, "little", False))
+
+    def register(self, w_obj):
+        self.objects[w_obj] = len(self.objects)
+
+    def dump(self, w_obj, limit):
+        space = self.space
+        if limit == 0:
+            raise space.error(space.w_ArgumentError, "exceed depth limit")
+        limit -= 1
+        if self.w_io is not None and self.buffer.getlength() >= self.CHUNK_SIZE:
+            self.flush()
+
+        if w_obj is space.w_nil:
+            self.write_byte(Marshal.NIL)
+            return
+        elif w_obj is space.w_true:
+            self.write_byte(Marshal.TRUE)
+            return
+        elif w_obj is space.w_false:
+            self.write_byte(Marshal.FALSE)
+            return
+        elif isinstance(w_obj, W_FixnumObject):
+            value = space.int_w(w_obj)
+            if value >= Marshal.FIXNUM_MIN and value <= Marshal.FIXNUM_MAX:
+                self.write_byte(Marshal.FIXNUM)
+                self.write_long(value)
+                return
+        elif isinstance(w_obj, W_SymbolObject):
+            self.write_symbol(space.symbol_w(w_obj))
+            return
+
+        if isinstance(w_obj, W_FloatObject):
+            bits = float2longlong(space.float_w(w_obj))
+            index = self.floats.get(bits, -1)
+            if index < 0:
+                self.floats[bits] = len(self.objects)
         else:
-            return space.newstr_fromstr(string)
+            index = self.objects.get(w_obj, -1)
+        if index >= 0:
+            self.write_byte(Marshal.LINK)
+            self.write_long(index)
+            return
 
-    @moduledef.function("load")
-    @moduledef.function("restore")
-    def method_load(self, space, w_obj):
-        string = ""
+        if space.respond_to(w_obj, "marshal_dump"):
+            self.register(w_obj)
+            w_data = space.send(w_obj, "marshal_dump")
+            self.write_byte(Marshal.USRMARSHAL)
+            self.write_symbol(class_name(space, space.getnonsingletonclass(w_obj)))
+            self.dump(w_data, limit)
+            return
+        if space.respond_to(w_obj, "_dump"):
+            w_data = space.send(w_obj, "_dump", [space.newint(limit)])
+            if not isinstance(w_data, W_StringObject):
+                raise space.error(space.w_TypeError, "_dump() must return string")
+            self.write_byte(Marshal.IVAR)
+            self.write_byte(Marshal.USERDEF)
+            self.write_symbol(class_name(space, space.getnonsingletonclass(w_obj)))
+            self.write_bytes(space.str_w(w_data))
+            self.write_encoding(False)
+            self.register(w_obj)
+            return
 
-        if isinstance(w_obj, W_IOObject):
-            w_obj.ensure_not_closed(space)
-            string = os.read(w_obj.fd, int(os.fstat(w_obj.fd).st_size))
+        self.register(w_obj)
+        if isinstance(w_obj, W_FixnumObject):
+            self.write_bignum(rbigint.fromint(space.int_w(w_obj)))
+        elif isinstance(w_obj, W_BignumObject):
+            self.write_bignum(space.bigint_w(w_obj))
+        elif isinstance(w_obj, W_FloatObject):
+            self.write_byte(Marshal.FLOAT)
+            self.write_bytes(format_float(space.float_w(w_obj)))
         elif isinstance(w_obj, W_StringObject):
-            string = space.str_w(w_obj)
+            self.write_byte(Marshal.IVAR)
+            self.write_uclass(w_obj, space.w_string)
+            self.write_byte(Marshal.STRING)
+            self.write_bytes(space.str_w(w_obj))
+            self.write_encoding(False)
+        elif isinstance(w_obj, W_RegexpObject):
+            self.write_byte(Marshal.IVAR)
+            self.write_uclass(w_obj, space.w_regexp)
+            self.write_byte(Marshal.REGEXP)
+            self.write_bytes(w_obj.source)
+            self.write_byte(chr(w_obj.flags & 7))
+            self.write_encoding(True)
+        elif isinstance(w_obj, W_ArrayObject):
+            self.write_uclass(w_obj, space.w_array)
+            items_w = w_obj.listview(space)
+            self.write_byte(Marshal.ARRAY)
+            self.write_long(len(items_w))
+            for w_item in items_w:
+                self.dump(w_item, limit)
+        elif isinstance(w_obj, W_HashObject):
+            if w_obj.default_proc is not None:
+                raise space.error(space.w_TypeError, "can't dump hash with default proc")
+            self.write_uclass(w_obj, space.w_hash)
+            has_default = w_obj.w_default is not space.w_nil
+            self.write_byte(Marshal.HASH_DEFAULT if has_default else Marshal.HASH)
+            self.write_long(w_obj.strategy.len(w_obj.dict_storage))
+            iter = w_obj.strategy.iteritems(w_obj.dict_storage)
+            while True:
+                try:
+                    w_key, w_value = w_obj.strategy.iternext(space, iter)
+                except StopIteration:
+                    break
+                self.dump(w_key, limit)
+                self.dump(w_value, limit)
+            if has_default:
+                self.dump(w_obj.w_default, limit)
+        elif isinstance(w_obj, W_ClassObject):
+            self.write_byte(Marshal.CLASS)
+            self.write_bytes(class_name(space, w_obj))
+        elif isinstance(w_obj, W_ModuleObject):
+            self.write_byte(Marshal.MODULE)
+            self.write_bytes(class_name(space, w_obj))
+        elif isinstance(w_obj, W_RangeObject):
+            self.write_byte(Marshal.OBJECT)
+            self.write_symbol(class_name(space, space.getnonsingletonclass(w_obj)))
+            self.write_long(3)
+            self.write_symbol("excl")
+            self.dump(space.newbool(w_obj.exclusive), limit)
+            self.write_symbol("begin")
+            self.dump(w_obj.w_start, limit)
+            self.write_symbol("end")
+            self.dump(w_obj.w_end, limit)
+        elif isinstance(w_obj, W_ExceptionObject):
+            names = w_obj.instance_variable_names()
+            self.write_byte(Marshal.OBJECT)
+            self.write_symbol(class_name(space, space.getnonsingletonclass(w_obj)))
+            self.write_long(len(names) + 2)
+            self.write_symbol("mesg")
+            self.dump(space.send(w_obj, "message"), limit)
+            self.write_symbol("bt")
+            self.dump(space.send(w_obj, "backtrace"), limit)
+            self.dump_ivars(w_obj, names, limit)
+        elif type(w_obj) is W_Object:
+            w_cls = space.getnonsingletonclass(w_obj)
+            w_struct = space.w_object.find_const(space, "Struct")
+            if w_struct is not None and space.is_kind_of(w_obj, w_struct):
+                members_w = space.listview(space.find_const(w_cls, "STRUCT_ATTRS"))
+                self.write_byte(Marshal.STRUCT)
+                self.write_symbol(class_name(space, w_cls))
+                self.write_long(len(members_w))
+                for w_member in members_w:
+                    member = space.symbol_w(w_member)
+                    self.write_symbol(member)
+                    w_value = w_obj.find_instance_var(space, "@" + member)
+                    self.dump(w_value or space.w_nil, limit)
+            else:
+                names = w_obj.instance_variable_names()
+                self.write_byte(Marshal.OBJECT)
+                self.write_symbol(class_name(space, w_cls))
+                self.write_long(len(names))
+                self.dump_ivars(w_obj, names, limit)
         else:
-            raise space.error(space.w_TypeError, "instance of IO needed")
+            raise space.error(space.w_TypeError,
+                "no _dump_data is defined for class %s" % space.getnonsingletonclass(w_obj).name
+            )
 
-        if len(string) < 2:
-            raise space.error(space.w_ArgumentError, "marshal data too short")
+    def dump_ivars(self, w_obj, names, limit):
+        for name in names:
+            self.write_symbol(name)
+            self.dump(w_obj.find_instance_var(self.space, name), limit)
 
-        bytes = [ord(string[i]) for i in range(0, len(string))]
-        if int(bytes[0]) != Marshal.MAJOR_VERSION or int(bytes[1]) != Marshal.MINOR_VERSION:
+
+class Loader(object):
+    """
+    Reads the Marshal format from a string, or straight from an IO, in which
+    case nothing after the loaded object is consumed.
+    """
+
+    def __init__(self, space, data, w_io):
+        self.space = space
+        self.data = data
+        self.pos = 0
+        self.w_io = w_io
+        self.symbols = []
+        self.objects_w = []
+
+    def too_short(self):
+        return self.space.error(self.space.w_ArgumentError, "marshal data too short")
+
+    def read(self, n):
+        space = self.space
+        if n < 0:
+            raise self.too_short()
+        if self.w_io is not None:
+            w_io = self.w_io
+            if isinstance(w_io, W_IOObject):
+                w_io.ensure_not_closed(space)
+                data = w_io.read_str(space, n)
+            else:
+                w_data = space.send(w_io, "read", [space.newint(n)])
+                data = "" if w_data is space.w_nil else space.str_w(w_data)
+            if len(data) < n:
+                raise self.too_short()
+            return data
+        start = self.pos
+        end = start + n
+        if end > len(self.data):
+            raise self.too_short()
+        assert start >= 0
+        assert end >= 0
+        self.pos = end
+        return self.data[start:end]
+
+    def read_byte(self):
+        return self.read(1)[0]
+
+    def read_long(self):
+        c = ord(self.read_byte())
+        if c > 127:
+            c -= 256
+        if c == 0:
+            return 0
+        elif c > 0:
+            if c > 4:
+                return c - 5
+            data = self.read(c)
+            value = 0
+            for i in range(c):
+                value |= ord(data[i]) << (8 * i)
+            return value
+        else:
+            if c < -4:
+                return c + 5
+            c = -c
+            data = self.read(c)
+            value = -1
+            for i in range(c):
+                value &= ~(0xff << (8 * i))
+                value |= ord(data[i]) << (8 * i)
+            return value
+
+    def read_bytes(self):
+        return self.read(self.read_long())
+
+    def read_symbol(self):
+        type = self.read_byte()
+        ivars = False
+        if type == Marshal.IVAR:
+            ivars = True
+            type = self.read_byte()
+        if type == Marshal.SYMLINK:
+            index = self.read_long()
+            if index < 0 or index >= len(self.symbols):
+                raise self.space.error(self.space.w_ArgumentError, "bad symbol")
+            return self.symbols[index]
+        elif type == Marshal.SYMBOL:
+            symbol = self.read_bytes()
+            self.symbols.append(symbol)
+            if ivars:
+                # Only the encoding.
+                for i in range(self.read_long()):
+                    self.read_symbol()
+                    self.load()
+            return symbol
+        raise self.space.error(self.space.w_ArgumentError,
+            "dump format error for symbol(0x%x)" % ord(type)
+        )
+
+    def read_header(self):
+        space = self.space
+        if self.w_io is None and len(self.data) < 2:
+            raise self.too_short()
+        header = self.read(2)
+        major = ord(header[0])
+        minor = ord(header[1])
+        if major != Marshal.MAJOR_VERSION or minor != Marshal.MINOR_VERSION:
             raise space.error(
                 space.w_TypeError,
                 "incompatible marshal file format (can't be read)\n"
-                "format version %s.%s required; %s.%s given"
-                % (Marshal.MAJOR_VERSION, Marshal.MINOR_VERSION, bytes[0], bytes[1])
+                "format version %d.%d required; %d.%d given"
+                % (Marshal.MAJOR_VERSION, Marshal.MINOR_VERSION, major, minor)
             )
 
-        return Marshal.load(space, bytes, 2)[0]
-
-    # extract integer from marshalled byte array
-    # least significant byte first
-    @staticmethod
-    def bytes2integer(bytes, offset):
-        if bytes[offset] >= 252:
-            value = 256 - bytes[offset + 1]
-            for i in range(2, 256 - bytes[offset] + 1):
-                value += (255 - bytes[offset + i]) * int(math.pow(256, i - 1))
-            return -value, 256 - bytes[offset] + 2
-        elif bytes[offset] > 0 and bytes[offset] < 6:
-            value = bytes[offset + 1]
-            for i in range(2, bytes[offset] + 1):
-                value += bytes[offset + i] * int(math.pow(256, i - 1))
-            return value, bytes[offset] + 2
-        else:
-            value = bytes[offset]
-            if value == 0:
-                return 0, 2
-            elif value > 127:
-                return value - 251, 2
+    def register(self, w_obj):
+        self.objects_w.append(w_obj)
+        return w_obj
+
+    def path_to_class(self, path):
+        space = self.space
+        w_mod = space.w_object
+        for name in path.split("::"):
+            w_const = w_mod.find_const(space, name)
+            if not isinstance(w_const, W_ModuleObject):
+                raise space.error(space.w_ArgumentError, "undefined class/module %s" % path)
+            w_mod = w_const
+        return w_mod
+
+    def read_class(self):
+        return self.path_to_class(self.read_symbol())
+
+    def load(self):
+        return self.load_type(self.read_byte(), False)
+
+    def load_type(self, type, ivars):
+        space = self.space
+        if type == Marshal.NIL:
+            return space.w_nil
+        elif type == Marshal.TRUE:
+            return space.w_true
+        elif type == Marshal.FALSE:
+            return space.w_false
+        elif type == Marshal.FIXNUM:
+            return space.newint(self.read_long())
+        elif type == Marshal.SYMLINK:
+            index = self.read_long()
+            if index < 0 or index >= len(self.symbols):
+                raise space.error(space.w_ArgumentError, "bad symbol")
+            return space.newsymbol(self.symbols[index])
+        elif type == Marshal.SYMBOL:
+            symbol = self.read_bytes()
+            self.symbols.append(symbol)
+            w_res = space.newsymbol(symbol)
+        elif type == Marshal.LINK:
+            index = self.read_long()
+            if index < 0 or index >= len(self.objects_w):
+                raise space.error(space.w_ArgumentError, "dump format error (unlinked)")
+            return self.objects_w[index]
+        elif type == Marshal.IVAR:
+            return self.load_type(self.read_byte(), True)
+        elif type == Marshal.BIGNUM:
+            sign = self.read_byte()
+            data = self.read(self.read_long() * 2)
+            value = rbigint.frombytes(data, "little", False)
+            if sign == "-":
+                value = value.neg()
+            try:
+                w_res = space.newint(value.toint())
+            except OverflowError:
+                w_res = space.newbigint_fromrbigint(value)
+            self.register(w_res)
+        elif type == Marshal.FLOAT:
+            s = self.read_bytes()
+            if s == "nan":
+                value = NAN
+            elif s == "inf":
+                value = INFINITY
+            elif s == "-inf":
+                value = -INFINITY
             else:
-                return value - 5, 2
-
-    # least significant byte first
-    @staticmethod
-    def integer2bytes(value):
-        bytes = []
-
-        if value > 2 ** 30 - 1:
-            raise NotImplementedError("Bignum")
-
-        if value > 2 ** 24 - 1:
-            bytes.append(4)
-            bytes.append(value % 256)
-            bytes.append((value >> 8) % 256)
-            bytes.append((value >> 16) % 256)
-            bytes.append((value >> 24) % 256)
-        elif value > 2 ** 16 - 1:
-            bytes.append(3)
-            bytes.append(value % 256)
-            bytes.append((value >> 8) % 256)
-            bytes.append((value >> 16) % 256)
-        elif value > 255:
-            bytes.append(2)
-            bytes.append(value % 256)
-            bytes.append((value >> 8) % 256)
-        elif value > 122:
-            bytes.append(1)
-            bytes.append(value)
-        elif value > 0:
-            bytes.append(value + 5)
-        elif value == 0:
-            bytes.append(0)
-        elif value > -124:
-            bytes.append(251 + value)
-        elif value > -257:
-            bytes.append(0xff)
-            bytes.append(256 + value)
-        elif value > -(2 ** 16 + 1):
-            bytes.append(0xfe)
-            bytes.append(value % 256)
-            bytes.append((value >> 8) % 256)
-        elif value > -(2 ** 24 + 1):
-            bytes.append(0xfd)
-            bytes.append(value % 256)
-            bytes.append((value >> 8) % 256)
-            bytes.append((value >> 16) % 256)
-        elif value > -(2 ** 30 + 1):
-            bytes.append(0xfc)
-            bytes.append(value % 256)
-            bytes.append((value >> 8) % 256)
-            bytes.append((value >> 16) % 256)
-            bytes.append((value >> 24) % 256)
+                try:
+                    value = string_to_float(s)
+                except ValueError:
+                    raise space.error(space.w_ArgumentError, "dump format error (float)")
+            w_res = self.register(space.newfloat(value))
+        elif type == Marshal.STRING:
+            w_res = self.register(space.newstr_fromstr(self.read_bytes()))
+        elif type == Marshal.REGEXP:
+            source = self.read_bytes()
+            flags = ord(self.read_byte())
+            w_res = self.register(space.newregexp(source, flags))
+        elif type == Marshal.ARRAY:
+            count = self.read_long()
+            w_res = space.newarray([])
+            self.register(w_res)
+            for i in range(count):
+                w_res.append(space, self.load())
+        elif type == Marshal.HASH or type == Marshal.HASH_DEFAULT:
+            count = self.read_long()
+            w_res = space.newhash()
+            self.register(w_res)
+            for i in range(count):
+                w_key = self.load()
+                w_res.setitem(space, w_key, self.load())
+            if type == Marshal.HASH_DEFAULT:
+                w_res.w_default = self.load()
+        elif type == Marshal.CLASS or type == Marshal.MODULE:
+            path = self.read_bytes()
+            w_res = self.path_to_class(path)
+            if (type == Marshal.CLASS) != isinstance(w_res, W_ClassObject):
+                raise space.error(space.w_ArgumentError,
+                    "%s does not refer to %s" % (path, "class" if type == Marshal.CLASS else "module")
+                )
+            self.register(w_res)
+        elif type == Marshal.OBJECT:
+            w_cls = self.read_class()
+            w_res = space.send(w_cls, "allocate")
+            self.register(w_res)
+            self.load_ivars(w_res)
+        elif type == Marshal.STRUCT:
+            w_cls = self.read_class()
+            w_res = space.send(w_cls, "allocate")
+            self.register(w_res)
+            for i in range(self.read_long()):
+                member = self.read_symbol()
+                space.set_instance_var(w_res, "@" + member, self.load())
+        elif type == Marshal.USERDEF:
+            w_cls = self.read_class()
+            w_data = space.newstr_fromstr(self.read_bytes())
+            if ivars:
+                self.load_ivars(w_data)
+                ivars = False
+            if not space.respond_to(w_cls, "_load"):
+                raise space.error(space.w_TypeError,
+                    "class %s needs to have method `_load'" % w_cls.name
+                )
+            w_res = self.register(space.send(w_cls, "_load", [w_data]))
+        elif type == Marshal.USRMARSHAL:
+            w_cls = self.read_class()
+            w_res = space.send(w_cls, "allocate")
+            self.register(w_res)
+            w_data = self.load()
+            if not space.respond_to(w_res, "marshal_load"):
+                raise space.error(space.w_TypeError,
+                    "instance of %s needs to have method `marshal_load'" % w_cls.name
+                )
+            space.send(w_res, "marshal_load", [w_data])
+        elif type == Marshal.UCLASS:
+            w_cls = self.read_class()
+            index = len(self.objects_w)
+            w_obj = self.load()
+            if isinstance(w_obj, W_RegexpObject):
+                w_res = space.send(w_cls, "new", [w_obj])
+            else:
+                w_res = space.send(w_cls, "allocate")
+                space.send(w_res, "replace", [w_obj])
+            if index < len(self.objects_w):
+                self.objects_w[index] = w_res
+        elif type == Marshal.EXTENDED:
+            w_mod = self.read_class()
+            w_res = self.load()
+            space.send(w_res, "extend", [w_mod])
         else:
-            raise NotImplementedError("number too small")
-        return bytes
+            raise space.error(space.w_ArgumentError, "dump format error(0x%x)" % ord(type))
+        if ivars:
+            self.load_ivars(w_res)
+        return w_res
+
+    def load_ivars(self, w_obj):
+        space = self.space
+        for i in range(self.read_long()):
+            name = self.read_symbol()
+            w_value = self.load()
+            if isinstance(w_obj, W_RangeObject):
+                if name == "excl":
+                    w_obj.exclusive = space.is_true(w_value)
+                elif name == "begin":
+                    w_obj.w_start = w_value
+                elif name == "end":
+                    w_obj.w_end = w_value
+            elif isinstance(w_obj, W_ExceptionObject) and name == "mesg":
+                if w_value is not space.w_nil:
+                    w_obj.msg = space.str_w(w_value)
+            elif isinstance(w_obj, W_ExceptionObject) and name == "bt":
+                if w_value is not space.w_nil:
+                    space.send(w_obj, "set_backtrace", [w_value])
+            elif name.startswith("@") and isinstance(w_obj, W_Object):
+                w_obj.set_instance_var(space, name, w_value)
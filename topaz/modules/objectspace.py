@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+import time
+
 from rpython.rlib import rgc, jit
 
 from topaz.module import ModuleDef
@@ -18,6 +20,23 @@ def clear_gcflag_extra(pending):
             pending.extend(rgc.get_rpy_referents(gcref))
 
 
+class GCStats(object):
+    """
+    The GC doesn't report its own collections, so this only covers the ones
+    explicitly requested through ObjectSpace.garbage_collect.
+    """
+
+    def __init__(self, space):
+        self.collections = 0
+        self.collection_time = 0.0
+
+    def collect(self):
+        start = time.time()
+        rgc.collect()
+        self.collection_time += time.time() - start
+        self.collections += 1
+
+
 class ObjectSpace(object):
     moduledef = ModuleDef("ObjectSpace")
 
@@ -43,5 +62,5 @@ class ObjectSpace(object):
 
     @moduledef.function("garbage_collect")
     @jit.dont_look_inside
-    def method_garbage_collect(self):
-        rgc.collect()
+    def method_garbage_collect(self, space):
+        space.fromcache(GCStats).collect()
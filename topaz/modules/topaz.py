@@ -1,10 +1,73 @@
 from __future__ import absolute_import
+import os
 import sys
 
+from rpython.rlib import jit, jit_hooks
+from rpython.rlib.jit import Counters
+from rpython.rlib.objectmodel import we_are_translated
 from rpython.rlib.rarithmetic import intmask
 
 from topaz.module import ModuleDef
+from topaz.modules.objectspace import GCStats
 from topaz.objects.classobject import W_ClassObject
+from topaz.objects.hashobject import W_HashObject
+from topaz.objects.regexpobject import RegexpCache
+from topaz.profiler import Profiler
+
+
+JIT_COUNTERS = [
+    ("loops", Counters.TOTAL_COMPILED_LOOPS),
+    ("bridges", Counters.TOTAL_COMPILED_BRIDGES),
+    ("freed_loops", Counters.TOTAL_FREED_LOOPS),
+    ("freed_bridges", Counters.TOTAL_FREED_BRIDGES),
+    ("traced_ops", Counters.RECORDED_OPS),
+]
+JIT_ABORTS = [
+    ("trace_too_long", Counters.ABORT_TOO_LONG),
+    ("bridge", Counters.ABORT_BRIDGE),
+    ("bad_loop", Counters.ABORT_BAD_LOOP),
+    ("escape", Counters.ABORT_ESCAPE),
+    ("force_quasiimmut", Counters.ABORT_FORCE_QUASIIMMUT),
+]
+JIT_TIMES = [
+    ("tracing_time", Counters.TRACING),
+    ("backend_time", Counters.BACKEND),
+]
+
+
+def jit_counter(no):
+    # The JIT's counters only exist in a translated interpreter.
+    if not we_are_translated():
+        return 0
+    return jit_hooks.stats_get_counter_value(None, no)
+
+
+def jit_time(no):
+    if not we_are_translated():
+        return 0.0
+    return jit_hooks.stats_get_times_value(None, no)
+
+
+def read_proc_field(path, field):
+    # Returns the value of a "kB" field of a /proc file in bytes, or -1.
+    try:
+        fd = os.open(path, os.O_RDONLY, 0644)
+        try:
+            data = os.read(fd, 8192)
+        finally:
+            os.close(fd)
+    except OSError:
+        return -1
+    for line in data.split("\n"):
+        if line.startswith(field + ":"):
+            value = line[len(field) + 1:].strip()
+            if value.endswith(" kB"):
+                end = len(value) - 3
+                assert end >= 0
+                value = value[:end].strip()
+            if value.isdigit():
+                return int(value) * 1024
+    return -1
 
 
 class Topaz(object):
@@ -13,6 +76,7 @@ class Topaz(object):
     @moduledef.setup_module
     def setup_module(space, w_mod):
         space.set_const(w_mod, "FIXNUM_MAX", space.newint(sys.maxint))
+        space.set_const(w_mod, "Profiler", space.getmoduleobject(TopazProfiler.moduledef))
 
     @moduledef.function("intmask")
     def method_intmask(self, space, w_int):
@@ -42,3 +106,105 @@ class Topaz(object):
     def method_infect(self, space, w_dest, w_src, taint=True, untrust=True, freeze=False):
         space.infect(w_dest, w_src, taint=taint, untrust=untrust, freeze=freeze)
         return self
+
+    @moduledef.function("regexp_cache_stats")
+    def method_regexp_cache_stats(self, space):
+        cache = space.fromcache(RegexpCache)
+        w_stats = space.newhash()
+        for name, value in [
+            ("limit", cache.limit),
+            ("size", cache.size()),
+            ("hits", cache.hits),
+            ("misses", cache.misses),
+            ("evictions", cache.evictions),
+        ]:
+            space.send(w_stats, "[]=", [space.newsymbol(name), space.newint(value)])
+        return w_stats
+
+    @moduledef.function("regexp_cache_limit=", limit="int")
+    def method_set_regexp_cache_limit(self, space, limit):
+        if limit < 0:
+            raise space.error(space.w_ArgumentError, "negative regexp cache limit")
+        space.fromcache(RegexpCache).set_limit(limit)
+        return space.newint(limit)
+
+    @moduledef.function("jit_stats")
+    def method_jit_stats(self, space):
+        w_stats = space.newhash()
+        for name, no in JIT_COUNTERS:
+            space.send(w_stats, "[]=", [space.newsymbol(name), space.newint(jit_counter(no))])
+        w_aborts = space.newhash()
+        for name, no in JIT_ABORTS:
+            space.send(w_aborts, "[]=", [space.newsymbol(name), space.newint(jit_counter(no))])
+        space.send(w_stats, "[]=", [space.newsymbol("aborts"), w_aborts])
+        for name, no in JIT_TIMES:
+            space.send(w_stats, "[]=", [space.newsymbol(name), space.newfloat(jit_time(no))])
+        return w_stats
+
+    @moduledef.function("jit_set_param")
+    def method_jit_set_param(self, space, w_params):
+        if isinstance(w_params, W_HashObject):
+            params = []
+            for w_key, w_value in w_params.strategy.items(space, w_params.dict_storage):
+                params.append("%s=%s" % (
+                    space.str_w(space.send(w_key, "to_s")),
+                    space.str_w(space.send(w_value, "to_s")),
+                ))
+            text = ",".join(params)
+        else:
+            text = space.str_w(space.convert_type(w_params, space.w_string, "to_str"))
+        try:
+            jit.set_user_param(None, text)
+        except ValueError:
+            raise space.error(space.w_ArgumentError, "invalid JIT parameters: %s" % text)
+        except jit.TraceLimitTooHigh:
+            raise space.error(space.w_ArgumentError, "trace_limit is too high")
+        return space.w_nil
+
+    @moduledef.function("gc_stats")
+    def method_gc_stats(self, space):
+        gc_stats = space.fromcache(GCStats)
+        w_stats = space.newhash()
+        for name, value in [
+            ("total_memory", read_proc_field("/proc/meminfo", "MemTotal")),
+            ("rss", read_proc_field("/proc/self/status", "VmRSS")),
+            ("peak_rss", read_proc_field("/proc/self/status", "VmHWM")),
+            ("collections", gc_stats.collections),
+        ]:
+            w_value = space.newint(value) if value >= 0 else space.w_nil
+            space.send(w_stats, "[]=", [space.newsymbol(name), w_value])
+        space.send(w_stats, "[]=", [
+            space.newsymbol("collection_time"), space.newfloat(gc_stats.collection_time)
+        ])
+        return w_stats
+
+
+class TopazProfiler(object):
+    moduledef = ModuleDef("Topaz::Profiler")
+
+    @moduledef.function("start", interval="int")
+    def method_start(self, space, interval=Profiler.DEFAULT_INTERVAL):
+        if interval <= 0:
+            raise space.error(space.w_ArgumentError, "interval must be positive")
+        return space.newbool(space.fromcache(Profiler).start(interval))
+
+    @moduledef.function("stop")
+    def method_stop(self, space):
+        return space.newbool(space.fromcache(Profiler).stop())
+
+    @moduledef.function("running?")
+    def method_runningp(self, space):
+        return space.newbool(space.fromcache(Profiler).active)
+
+    @moduledef.function("samples")
+    def method_samples(self, space):
+        return space.newint(space.fromcache(Profiler).sample_count)
+
+    @moduledef.function("report")
+    def method_report(self, space):
+        return space.newstr_fromstr(space.fromcache(Profiler).report())
+
+    @moduledef.function("reset")
+    def method_reset(self, space):
+        space.fromcache(Profiler).reset()
+        return space.w_nil
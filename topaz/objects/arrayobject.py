@@ -2,17 +2,51 @@ import copy
 
 from rpython.rlib import jit
 from rpython.rlib.listsort import make_timsort_class
-from rpython.rlib.rbigint import rbigint
+from rpython.rlib.objectmodel import newlist_hint
+from rpython.rlib.rarithmetic import intmask
+from rpython.rlib.rerased import new_static_erasing_pair
 
 from topaz.coerce import Coerce
 from topaz.module import ClassDef, check_frozen
+from topaz.modules import enumerable
 from topaz.modules.enumerable import Enumerable
+from topaz.objects.floatobject import W_FloatObject
+from topaz.objects.functionobject import W_BuiltinFunction
+from topaz.objects.hashobject import W_HashObject, hash_for_key
+from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.objectobject import W_Object
+from topaz.objects.rangeobject import W_RangeObject
+from topaz.objects.stringobject import W_StringObject
 from topaz.utils.packing.pack import RPacker
 
 
 BaseRubySorter = make_timsort_class()
 BaseRubySortBy = make_timsort_class()
+FixnumSorter = make_timsort_class()
+FloatSorter = make_timsort_class()
+
+
+def fixnum_key_lt(a, b):
+    return a[0] < b[0]
+
+
+def float_key_lt(a, b):
+    return a[0] < b[0]
+
+
+def str_key_lt(a, b):
+    return a[0] < b[0]
+
+FixnumKeySorter = make_timsort_class(lt=fixnum_key_lt)
+FloatKeySorter = make_timsort_class(lt=float_key_lt)
+StrKeySorter = make_timsort_class(lt=str_key_lt)
+
+
+def compare_result(space, w_cmp_res):
+    if space.is_kind_of(w_cmp_res, space.w_bignum):
+        return space.bigint_w(w_cmp_res).sign
+    else:
+        return space.int_w(w_cmp_res)
 
 
 class RubySorter(BaseRubySorter):
@@ -22,56 +56,493 @@ class RubySorter(BaseRubySorter):
         self.sortblock = sortblock
 
     def lt(self, w_a, w_b):
-        w_cmp_res = self.space.compare(w_a, w_b, self.sortblock)
-        if self.space.is_kind_of(w_cmp_res, self.space.w_bignum):
-            return self.space.bigint_w(w_cmp_res).lt(rbigint.fromint(0))
-        else:
-            return self.space.int_w(w_cmp_res) < 0
+        return compare_result(self.space, self.space.compare(w_a, w_b, self.sortblock)) < 0
 
 
 class RubySortBy(BaseRubySortBy):
-    def __init__(self, space, list, listlength=None, sortblock=None):
+    """
+    Sorts (key, item) pairs by their keys, so sort_by only has to call its
+    block once per item.
+    """
+
+    def __init__(self, space, list, listlength=None):
         BaseRubySortBy.__init__(self, list, listlength=listlength)
         self.space = space
-        self.sortblock = sortblock
 
-    def lt(self, w_a, w_b):
-        w_cmp_res = self.space.compare(
-            self.space.invoke_block(self.sortblock, [w_a]),
-            self.space.invoke_block(self.sortblock, [w_b])
-        )
-        return self.space.int_w(w_cmp_res) < 0
+    def lt(self, a, b):
+        return compare_result(self.space, self.space.compare(a[0], b[0])) < 0
+
+
+SORT_GENERIC = 0
+SORT_FIXNUM = 1
+SORT_FLOAT = 2
+SORT_STRING = 3
+
+
+def has_builtin_comparison(space, w_cls):
+    return isinstance(w_cls.find_method(space, "<=>"), W_BuiltinFunction)
+
+
+def comparison_kind(space, items_w):
+    """
+    Whether items_w are all Fixnums, all Floats or all plain Strings whose
+    <=> hasn't been redefined, so they can be compared unboxed.
+    """
+    if not items_w:
+        return SORT_GENERIC
+    kind = SORT_GENERIC
+    for i, w_item in enumerate(items_w):
+        if isinstance(w_item, W_FixnumObject):
+            item_kind = SORT_FIXNUM
+        elif isinstance(w_item, W_FloatObject):
+            item_kind = SORT_FLOAT
+        elif isinstance(w_item, W_StringObject) and space.getclass(w_item) is space.w_string:
+            item_kind = SORT_STRING
+        else:
+            return SORT_GENERIC
+        if i == 0:
+            kind = item_kind
+        elif item_kind != kind:
+            return SORT_GENERIC
+    if not has_builtin_comparison(space, space.getclass(items_w[0])):
+        return SORT_GENERIC
+    return kind
+
+
+class Comparator(object):
+    def __init__(self, space):
+        self.space = space
+
+    def compare(self, w_a, w_b):
+        raise NotImplementedError
+
+
+class RubyComparator(Comparator):
+    def __init__(self, space, block=None):
+        Comparator.__init__(self, space)
+        self.block = block
+
+    def compare(self, w_a, w_b):
+        return compare_result(self.space, self.space.compare(w_a, w_b, self.block))
+
+
+class FixnumComparator(Comparator):
+    def compare(self, w_a, w_b):
+        a = self.space.int_w(w_a)
+        b = self.space.int_w(w_b)
+        if a < b:
+            return -1
+        elif a == b:
+            return 0
+        return 1
+
+
+class FloatComparator(Comparator):
+    def compare(self, w_a, w_b):
+        # Same as Float#<=>, which treats NaN as greater.
+        a = self.space.float_w(w_a)
+        b = self.space.float_w(w_b)
+        if a < b:
+            return -1
+        elif a == b:
+            return 0
+        return 1
+
+
+class StringComparator(Comparator):
+    def compare(self, w_a, w_b):
+        a = self.space.str_w(w_a)
+        b = self.space.str_w(w_b)
+        if a < b:
+            return -1
+        elif a == b:
+            return 0
+        return 1
+
+
+def comparator_for(space, items_w, block=None):
+    if block is not None:
+        return RubyComparator(space, block)
+    kind = comparison_kind(space, items_w)
+    if kind == SORT_FIXNUM:
+        return space.fromcache(FixnumComparator)
+    elif kind == SORT_FLOAT:
+        return space.fromcache(FloatComparator)
+    elif kind == SORT_STRING:
+        return space.fromcache(StringComparator)
+    else:
+        return RubyComparator(space)
+
+
+class ArrayStrategy(object):
+    def __init__(self, space):
+        pass
+
+    def __deepcopy__(self, memo):
+        memo[id(self)] = result = object.__new__(self.__class__)
+        return result
+
+
+class EmptyArrayStrategy(ArrayStrategy):
+    erase, unerase = new_static_erasing_pair("EmptyArrayStrategy")
+
+    def get_empty_storage(self, space):
+        return self.erase(None)
+
+    def store(self, space, items_w):
+        assert not items_w
+        return self.erase(None)
+
+    def can_store(self, space, w_obj):
+        return False
+
+    def can_store_all(self, space, items_w):
+        return not items_w
+
+    def generalize_for(self, space, w_obj):
+        return strategy_for_obj(space, w_obj)
+
+    def generalize_for_list(self, space, items_w):
+        return strategy_for_list(space, items_w)
+
+    def length(self, storage):
+        return 0
+
+    def listview(self, space, storage):
+        return []
+
+    def getitem(self, space, storage, idx):
+        raise IndexError
+
+    def getslice(self, space, storage, start, end):
+        return storage
+
+    def setslice(self, space, storage, start, end, items_w):
+        assert not items_w
+
+    def delslice(self, space, storage, start, end):
+        pass
+
+    def extend(self, space, storage, items_w):
+        assert not items_w
+
+    def extend_from_storage(self, storage, other_storage):
+        pass
+
+    def copy(self, storage):
+        return storage
+
+    def mul(self, storage, times):
+        return storage
+
+    def clear(self, storage):
+        pass
+
+    def reverse(self, storage):
+        pass
+
+
+class TypedArrayStrategyMixin(object):
+    _mixin_ = True
+
+    def get_empty_storage(self, space):
+        return self.erase([])
+
+    def store(self, space, items_w):
+        return self.erase([self.unwrap(space, w_item) for w_item in items_w])
+
+    def store_repeated(self, space, w_obj, times):
+        return self.erase([self.unwrap(space, w_obj)] * times)
+
+    def can_store_all(self, space, items_w):
+        for w_item in items_w:
+            if not self.can_store(space, w_item):
+                return False
+        return True
+
+    def generalize_for(self, space, w_obj):
+        return space.fromcache(ObjectArrayStrategy)
+
+    def generalize_for_list(self, space, items_w):
+        return space.fromcache(ObjectArrayStrategy)
+
+    def length(self, storage):
+        return len(self.unerase(storage))
+
+    def listview(self, space, storage):
+        return [self.wrap(space, item) for item in self.unerase(storage)]
+
+    def getitem(self, space, storage, idx):
+        return self.wrap(space, self.unerase(storage)[idx])
+
+    def setitem(self, space, storage, idx, w_obj):
+        self.unerase(storage)[idx] = self.unwrap(space, w_obj)
+
+    def getslice(self, space, storage, start, end):
+        return self.erase(self.unerase(storage)[start:end])
+
+    def setslice(self, space, storage, start, end, items_w):
+        assert end >= 0
+        storage = self.unerase(storage)
+        delta = (end - start) - len(items_w)
+        if delta < 0:
+            storage += [self.padding] * -delta
+            lim = start + len(items_w)
+            i = len(storage) - 1
+            while i >= lim:
+                storage[i] = storage[i + delta]
+                i -= 1
+        elif delta > 0:
+            del storage[start:start + delta]
+        storage[start:start + len(items_w)] = [self.unwrap(space, w_item) for w_item in items_w]
+
+    def delslice(self, space, storage, start, end):
+        del self.unerase(storage)[start:end]
+
+    def append(self, space, storage, w_obj):
+        self.unerase(storage).append(self.unwrap(space, w_obj))
+
+    def extend(self, space, storage, items_w):
+        storage = self.unerase(storage)
+        for w_item in items_w:
+            storage.append(self.unwrap(space, w_item))
+
+    def extend_from_storage(self, storage, other_storage):
+        self.unerase(storage).extend(self.unerase(other_storage))
+
+    def insert(self, space, storage, idx, w_obj):
+        self.unerase(storage).insert(idx, self.unwrap(space, w_obj))
+
+    def pop(self, space, storage, idx):
+        return self.wrap(space, self.unerase(storage).pop(idx))
+
+    def copy(self, storage):
+        return self.erase(self.unerase(storage)[:])
+
+    def mul(self, storage, times):
+        return self.erase(self.unerase(storage) * times)
+
+    def fill(self, space, storage, w_obj, start, end):
+        storage = self.unerase(storage)
+        value = self.unwrap(space, w_obj)
+        length = len(storage)
+        if end > length:
+            storage.extend([value] * (end - length))
+            end = length
+        for i in xrange(start, end):
+            storage[i] = value
+
+    def clear(self, storage):
+        del self.unerase(storage)[:]
+
+    def reverse(self, storage):
+        self.unerase(storage).reverse()
+
+
+class ObjectArrayStrategy(ArrayStrategy, TypedArrayStrategyMixin):
+    erase, unerase = new_static_erasing_pair("ObjectArrayStrategy")
+    padding = None
+
+    def store(self, space, items_w):
+        return self.erase(items_w)
+
+    def can_store(self, space, w_obj):
+        return True
+
+    def can_store_all(self, space, items_w):
+        return True
+
+    def listview(self, space, storage):
+        # This is the array's own list, callers must not modify it.
+        return self.unerase(storage)
+
+    def wrap(self, space, w_obj):
+        return w_obj
+
+    def unwrap(self, space, w_obj):
+        return w_obj
+
+
+class FixnumArrayStrategy(ArrayStrategy, TypedArrayStrategyMixin):
+    erase, unerase = new_static_erasing_pair("FixnumArrayStrategy")
+    padding = 0
+
+    def can_store(self, space, w_obj):
+        return isinstance(w_obj, W_FixnumObject)
+
+    def wrap(self, space, intvalue):
+        return space.newint(intvalue)
+
+    def unwrap(self, space, w_obj):
+        return space.int_w(w_obj)
+
+
+class FloatArrayStrategy(ArrayStrategy, TypedArrayStrategyMixin):
+    erase, unerase = new_static_erasing_pair("FloatArrayStrategy")
+    padding = 0.0
+
+    def can_store(self, space, w_obj):
+        return isinstance(w_obj, W_FloatObject)
+
+    def wrap(self, space, floatvalue):
+        return space.newfloat(floatvalue)
+
+    def unwrap(self, space, w_obj):
+        return space.float_w(w_obj)
+
+
+def strategy_for_obj(space, w_obj):
+    if isinstance(w_obj, W_FixnumObject):
+        return space.fromcache(FixnumArrayStrategy)
+    elif isinstance(w_obj, W_FloatObject):
+        return space.fromcache(FloatArrayStrategy)
+    else:
+        return space.fromcache(ObjectArrayStrategy)
+
+
+@jit.look_inside_iff(lambda space, items_w: jit.isconstant(len(items_w)))
+def strategy_for_list(space, items_w):
+    if not items_w:
+        return space.fromcache(EmptyArrayStrategy)
+    strategy = strategy_for_obj(space, items_w[0])
+    for w_item in items_w:
+        if not strategy.can_store(space, w_item):
+            return space.fromcache(ObjectArrayStrategy)
+    return strategy
+
+
+class ArrayItemIterator(enumerable.ItemIterator):
+    def __init__(self, w_array):
+        self.w_array = w_array
+        self.index = 0
+
+    def next(self, space):
+        # The block may change the array, so this rechecks the length each
+        # time like Array#each does.
+        if self.index >= self.w_array.length():
+            return None
+        w_item = self.w_array.getitem(space, self.index)
+        self.index += 1
+        return w_item
 
 
 class W_ArrayObject(W_Object):
     classdef = ClassDef("Array", W_Object.classdef)
     classdef.include_module(Enumerable)
 
-    def __init__(self, space, items_w, klass=None):
+    def __init__(self, space, storage, strategy, klass=None):
         W_Object.__init__(self, space, klass)
-        self.items_w = items_w
+        self.array_storage = storage
+        self.strategy = strategy
 
     def __deepcopy__(self, memo):
         obj = super(W_ArrayObject, self).__deepcopy__(memo)
-        obj.items_w = copy.deepcopy(self.items_w, memo)
+        obj.array_storage = copy.deepcopy(self.array_storage, memo)
+        obj.strategy = copy.deepcopy(self.strategy, memo)
         return obj
 
+    @staticmethod
+    def newarray(space, items_w, klass=None):
+        strategy = strategy_for_list(space, items_w)
+        storage = strategy.store(space, items_w)
+        return W_ArrayObject(space, storage, strategy, klass)
+
     def listview(self, space):
-        return self.items_w
+        return self.strategy.listview(space, self.array_storage)
 
     def length(self):
-        return len(self.items_w)
+        return self.strategy.length(self.array_storage)
+
+    def getitem(self, space, idx):
+        return self.strategy.getitem(space, self.array_storage, idx)
+
+    def getslice(self, space, start, end, klass=None):
+        storage = self.strategy.getslice(space, self.array_storage, start, end)
+        return W_ArrayObject(space, storage, self.strategy, klass)
+
+    def setitem(self, space, idx, w_obj):
+        self.generalize_for(space, w_obj)
+        self.strategy.setitem(space, self.array_storage, idx, w_obj)
+
+    def append(self, space, w_obj):
+        self.generalize_for(space, w_obj)
+        self.strategy.append(space, self.array_storage, w_obj)
+
+    def extend(self, space, items_w):
+        self.generalize_for_list(space, items_w)
+        self.strategy.extend(space, self.array_storage, items_w)
+
+    def concat(self, space, w_other):
+        if self.length() == 0:
+            self.strategy = w_other.strategy
+            self.array_storage = w_other.strategy.copy(w_other.array_storage)
+        elif self.strategy is w_other.strategy:
+            self.strategy.extend_from_storage(self.array_storage, w_other.array_storage)
+        else:
+            self.extend(space, w_other.listview(space))
+
+    def replace(self, space, items_w):
+        self.strategy = strategy_for_list(space, items_w)
+        self.array_storage = self.strategy.store(space, items_w)
+
+    def generalize_for(self, space, w_obj):
+        if not self.strategy.can_store(space, w_obj):
+            self.switch_strategy(space, self.strategy.generalize_for(space, w_obj))
+
+    def generalize_for_list(self, space, items_w):
+        if not self.strategy.can_store_all(space, items_w):
+            self.switch_strategy(space, self.strategy.generalize_for_list(space, items_w))
+
+    def switch_strategy(self, space, strategy):
+        items_w = self.strategy.listview(space, self.array_storage)
+        self.array_storage = strategy.store(space, items_w)
+        self.strategy = strategy
 
     @classdef.singleton_method("allocate")
     def singleton_method_allocate(self, space):
-        return W_ArrayObject(space, [], self)
+        strategy = space.fromcache(EmptyArrayStrategy)
+        return W_ArrayObject(space, strategy.get_empty_storage(space), strategy, self)
 
-    @classdef.method("initialize_copy", other_w="array")
-    @classdef.method("replace", other_w="array")
+    @classdef.singleton_method("[]")
+    def singleton_method_subscript(self, space, args_w):
+        return W_ArrayObject.newarray(space, args_w[:], self)
+
+    @classdef.method("initialize")
     @check_frozen()
-    def method_replace(self, space, other_w):
-        del self.items_w[:]
-        self.items_w.extend(other_w)
+    def method_initialize(self, space, w_size_or_arr=None, w_obj=None, block=None):
+        if w_size_or_arr is None:
+            self.replace(space, [])
+            return self
+        if w_obj is None or w_obj is space.w_nil:
+            w_ary = space.convert_type(w_size_or_arr, space.w_array, "to_ary", raise_error=False)
+            if w_ary is not space.w_nil:
+                return space.send(self, "replace", [w_ary])
+        length = Coerce.int(space, w_size_or_arr)
+        if length < 0:
+            raise space.error(space.w_ArgumentError, "negative array size")
+        if block is not None:
+            # TODO: Emit "block supersedes default value argument" warning
+            items_w = newlist_hint(length)
+            for i in xrange(length):
+                items_w.append(space.invoke_block(block, [space.newint(i)]))
+            self.replace(space, items_w)
+        elif length == 0:
+            self.replace(space, [])
+        else:
+            if w_obj is None:
+                w_obj = space.w_nil
+            self.strategy = strategy_for_obj(space, w_obj)
+            self.array_storage = self.strategy.store_repeated(space, w_obj, length)
+        return self
+
+    @classdef.method("initialize_copy")
+    @classdef.method("replace")
+    @check_frozen()
+    def method_replace(self, space, w_other):
+        w_other = space.convert_type(w_other, space.w_array, "to_ary")
+        assert isinstance(w_other, W_ArrayObject)
+        self.strategy = w_other.strategy
+        self.array_storage = w_other.strategy.copy(w_other.array_storage)
         return self
 
     @classdef.method("[]")
@@ -83,9 +554,9 @@ class W_ArrayObject(W_Object):
         elif as_range:
             assert start >= 0
             assert end >= 0
-            return W_ArrayObject(space, self.items_w[start:end], space.getnonsingletonclass(self))
+            return self.getslice(space, start, end, space.getnonsingletonclass(self))
         else:
-            return self.items_w[start]
+            return self.getitem(space, start)
 
     @classdef.method("[]=")
     @check_frozen()
@@ -116,25 +587,15 @@ class W_ArrayObject(W_Object):
                 rep_w = space.listview(w_converted)
             self._subscript_assign_range(space, start, end, rep_w)
         elif start >= self.length():
-            self.items_w += [space.w_nil] * (start - self.length() + 1)
-            self.items_w[start] = w_obj
+            self._append_nils(space, start - self.length())
+            self.append(space, w_obj)
         else:
-            self.items_w[start] = w_obj
+            self.setitem(space, start, w_obj)
         return w_obj
 
     def _subscript_assign_range(self, space, start, end, rep_w):
-        assert end >= 0
-        delta = (end - start) - len(rep_w)
-        if delta < 0:
-            self.items_w += [None] * -delta
-            lim = start + len(rep_w)
-            i = self.length() - 1
-            while i >= lim:
-                self.items_w[i] = self.items_w[i + delta]
-                i -= 1
-        elif delta > 0:
-            del self.items_w[start:start + delta]
-        self.items_w[start:start + len(rep_w)] = rep_w
+        self.generalize_for_list(space, rep_w)
+        self.strategy.setslice(space, self.array_storage, start, end, rep_w)
 
     @classdef.method("slice!")
     @check_frozen()
@@ -148,13 +609,11 @@ class W_ArrayObject(W_Object):
             end = min(max(end, 0), self.length())
             delta = (end - start)
             assert delta >= 0
-            w_items = self.items_w[start:start + delta]
-            del self.items_w[start:start + delta]
-            return space.newarray(w_items)
+            w_items = self.getslice(space, start, start + delta)
+            self.strategy.delslice(space, self.array_storage, start, start + delta)
+            return w_items
         else:
-            w_item = self.items_w[start]
-            del self.items_w[start]
-            return w_item
+            return self.strategy.pop(space, self.array_storage, start)
 
     @classdef.method("size")
     @classdef.method("length")
@@ -165,20 +624,26 @@ class W_ArrayObject(W_Object):
     def method_emptyp(self, space):
         return space.newbool(self.length() == 0)
 
-    @classdef.method("+", other="array")
-    def method_add(self, space, other):
-        return space.newarray(self.items_w + other)
+    @classdef.method("+")
+    def method_add(self, space, w_other):
+        w_other = space.convert_type(w_other, space.w_array, "to_ary")
+        assert isinstance(w_other, W_ArrayObject)
+        w_res = W_ArrayObject(space, self.strategy.copy(self.array_storage), self.strategy)
+        w_res.concat(space, w_other)
+        return w_res
 
     @classdef.method("<<")
     @check_frozen()
     def method_lshift(self, space, w_obj):
-        self.items_w.append(w_obj)
+        self.append(space, w_obj)
         return self
 
-    @classdef.method("concat", other="array")
+    @classdef.method("concat")
     @check_frozen()
-    def method_concat(self, space, other):
-        self.items_w += other
+    def method_concat(self, space, w_other):
+        w_other = space.convert_type(w_other, space.w_array, "to_ary")
+        assert isinstance(w_other, W_ArrayObject)
+        self.concat(space, w_other)
         return self
 
     @classdef.method("*")
@@ -188,41 +653,158 @@ class W_ArrayObject(W_Object):
         n = space.int_w(space.convert_type(w_other, space.w_fixnum, "to_int"))
         if n < 0:
             raise space.error(space.w_ArgumentError, "Count cannot be negative")
-        w_res = W_ArrayObject(space, self.items_w * n, space.getnonsingletonclass(self))
+        storage = self.strategy.mul(self.array_storage, n)
+        w_res = W_ArrayObject(space, storage, self.strategy, space.getnonsingletonclass(self))
         space.infect(w_res, self, freeze=False)
         return w_res
 
+    def _newset(self, space, items_w):
+        w_set = W_HashObject(space)
+        for w_item in items_w:
+            w_set.setitem(space, w_item, space.w_true)
+        return w_set
+
+    @classdef.method("&")
+    def method_and(self, space, w_other):
+        w_other = space.convert_type(w_other, space.w_array, "to_ary")
+        assert isinstance(w_other, W_ArrayObject)
+        w_set = self._newset(space, w_other.listview(space))
+        items_w = []
+        for w_item in self.listview(space):
+            if w_set.delete(space, w_item) is not None:
+                items_w.append(w_item)
+        return space.newarray(items_w)
+
+    @classdef.method("|")
+    def method_or(self, space, w_other):
+        w_other = space.convert_type(w_other, space.w_array, "to_ary")
+        assert isinstance(w_other, W_ArrayObject)
+        w_set = W_HashObject(space)
+        items_w = []
+        for w_item in self.listview(space) + w_other.listview(space):
+            if not w_set.contains(space, w_item):
+                w_set.setitem(space, w_item, space.w_true)
+                items_w.append(w_item)
+        return space.newarray(items_w)
+
+    @classdef.method("-")
+    def method_sub(self, space, w_other):
+        w_other = space.convert_type(w_other, space.w_array, "to_ary")
+        assert isinstance(w_other, W_ArrayObject)
+        w_set = self._newset(space, w_other.listview(space))
+        items_w = []
+        for w_item in self.listview(space):
+            if not w_set.contains(space, w_item):
+                items_w.append(w_item)
+        return space.newarray(items_w)
+
+    @classdef.method("uniq!")
+    @check_frozen()
+    def method_uniq_i(self, space, block):
+        w_set = W_HashObject(space)
+        items_w = []
+        for w_item in self.listview(space):
+            w_key = w_item
+            if block is not None:
+                w_key = space.invoke_block(block, [w_item])
+            if not w_set.contains(space, w_key):
+                w_set.setitem(space, w_key, space.w_true)
+                items_w.append(w_item)
+        if len(items_w) == self.length():
+            return space.w_nil
+        self.replace(space, items_w)
+        return self
+
+    @classdef.method("uniq")
+    def method_uniq(self, space, block):
+        w_res = space.send(self, "dup")
+        space.send(w_res, "uniq!", block=block)
+        return w_res
+
+    @classdef.method("hash")
+    def method_hash(self, space):
+        res = 0x345678
+        with space.getexecutioncontext().recursion_guard("array_hash", self) as in_recursion:
+            if not in_recursion:
+                for w_item in self.listview(space):
+                    # We want to keep this within a fixnum range.
+                    res = intmask((1000003 * res) ^ hash_for_key(space, w_item))
+        return space.newint(res)
+
+    def _equal(self, space, w_other, name, eql):
+        if self.length() != w_other.length():
+            return False
+        if self.strategy is w_other.strategy and self.strategy is space.fromcache(FixnumArrayStrategy):
+            strategy = space.fromcache(FixnumArrayStrategy)
+            return strategy.unerase(self.array_storage) == strategy.unerase(w_other.array_storage)
+        with space.getexecutioncontext().recursion_guard(name, self) as in_recursion:
+            if in_recursion:
+                return True
+            items_w = self.listview(space)
+            other_w = w_other.listview(space)
+            for i in xrange(len(items_w)):
+                w_item = items_w[i]
+                w_other_item = other_w[i]
+                if isinstance(w_item, W_FixnumObject) and isinstance(w_other_item, W_FixnumObject):
+                    equal = space.int_w(w_item) == space.int_w(w_other_item)
+                elif eql:
+                    equal = space.eq_w(w_other_item, w_item)
+                else:
+                    equal = space.is_true(space.send(w_item, "==", [w_other_item]))
+                if not equal:
+                    return False
+        return True
+
+    @classdef.method("==")
+    def method_eq(self, space, w_other):
+        if self is w_other:
+            return space.w_true
+        if not isinstance(w_other, W_ArrayObject):
+            if space.respond_to(w_other, "to_ary"):
+                return space.newbool(space.is_true(space.send(w_other, "==", [self])))
+            return space.w_false
+        return space.newbool(self._equal(space, w_other, "array_equals", False))
+
+    @classdef.method("eql?")
+    def method_eqlp(self, space, w_other):
+        if self is w_other:
+            return space.w_true
+        if not isinstance(w_other, W_ArrayObject):
+            return space.w_false
+        return space.newbool(self._equal(space, w_other, "array_eqlp", True))
+
     @classdef.method("push")
     @check_frozen()
     def method_push(self, space, args_w):
-        self.items_w.extend(args_w)
+        self.extend(space, args_w)
         return self
 
     @classdef.method("shift")
     @check_frozen()
     def method_shift(self, space, w_n=None):
         if w_n is None:
-            if self.items_w:
-                return self.items_w.pop(0)
+            if self.length() > 0:
+                return self.strategy.pop(space, self.array_storage, 0)
             else:
                 return space.w_nil
         n = space.int_w(space.convert_type(w_n, space.w_fixnum, "to_int"))
         if n < 0:
             raise space.error(space.w_ArgumentError, "negative array size")
-        items_w = self.items_w[:n]
-        del self.items_w[:n]
-        return space.newarray(items_w)
+        w_items = self.getslice(space, 0, n)
+        self.strategy.delslice(space, self.array_storage, 0, n)
+        return w_items
 
     @classdef.method("unshift")
     @check_frozen()
     def method_unshift(self, space, args_w):
+        self.generalize_for_list(space, args_w)
         for w_obj in reversed(args_w):
-            self.items_w.insert(0, w_obj)
+            self.strategy.insert(space, self.array_storage, 0, w_obj)
         return self
 
     @classdef.method("join")
     def method_join(self, space, w_sep=None):
-        if not self.items_w:
+        if self.length() == 0:
             return space.newstr_fromstr("")
         if w_sep is None:
             separator = ""
@@ -234,15 +816,16 @@ class W_ArrayObject(W_Object):
             )
         return space.newstr_fromstr(separator.join([
             space.str_w(space.send(w_o, "to_s"))
-            for w_o in self.items_w
+            for w_o in self.listview(space)
         ]))
 
     @classdef.method("pop")
     @check_frozen()
     def method_pop(self, space, w_num=None):
         if w_num is None:
-            if self.items_w:
-                return self.items_w.pop()
+            length = self.length()
+            if length > 0:
+                return self.strategy.pop(space, self.array_storage, length - 1)
             else:
                 return space.w_nil
         else:
@@ -253,9 +836,9 @@ class W_ArrayObject(W_Object):
                 raise space.error(space.w_ArgumentError, "negative array size")
             else:
                 pop_size = max(0, self.length() - num)
-                res_w = self.items_w[pop_size:]
-                del self.items_w[pop_size:]
-                return space.newarray(res_w)
+                w_res = self.getslice(space, pop_size, self.length())
+                self.strategy.delslice(space, self.array_storage, pop_size, self.length())
+                return w_res
 
     @classdef.method("delete_at", idx="int")
     @check_frozen()
@@ -265,7 +848,7 @@ class W_ArrayObject(W_Object):
         if idx < 0 or idx >= self.length():
             return space.w_nil
         else:
-            return self.items_w.pop(idx)
+            return self.strategy.pop(space, self.array_storage, idx)
 
     @classdef.method("last")
     def method_last(self, space, w_count=None):
@@ -276,12 +859,12 @@ class W_ArrayObject(W_Object):
             start = self.length() - count
             if start < 0:
                 start = 0
-            return space.newarray(self.items_w[start:])
+            return self.getslice(space, start, self.length())
 
         if self.length() == 0:
             return space.w_nil
         else:
-            return self.items_w[self.length() - 1]
+            return self.getitem(space, self.length() - 1)
 
     @classdef.method("pack")
     def method_pack(self, space, w_template):
@@ -298,13 +881,33 @@ class W_ArrayObject(W_Object):
     @classdef.method("clear")
     @check_frozen()
     def method_clear(self, space):
-        del self.items_w[:]
+        self.strategy = space.fromcache(EmptyArrayStrategy)
+        self.array_storage = self.strategy.get_empty_storage(space)
         return self
 
     @classdef.method("sort!")
     @check_frozen()
     def method_sort_i(self, space, block):
-        RubySorter(space, self.items_w, sortblock=block).sort()
+        if block is None:
+            strategy = self.strategy
+            if strategy is space.fromcache(FixnumArrayStrategy):
+                if has_builtin_comparison(space, space.w_fixnum):
+                    FixnumSorter(strategy.unerase(self.array_storage)).sort()
+                    return self
+            elif strategy is space.fromcache(FloatArrayStrategy):
+                if has_builtin_comparison(space, space.w_float):
+                    FloatSorter(strategy.unerase(self.array_storage)).sort()
+                    return self
+            else:
+                items_w = self.listview(space)
+                if comparison_kind(space, items_w) == SORT_STRING:
+                    pairs = [(space.str_w(w_item), w_item) for w_item in items_w]
+                    StrKeySorter(pairs).sort()
+                    self.replace(space, [w_item for _, w_item in pairs])
+                    return self
+        items_w = self.listview(space)
+        RubySorter(space, items_w, sortblock=block).sort()
+        self.replace(space, items_w)
         return self
 
     @classdef.method("sort_by!")
@@ -312,13 +915,109 @@ class W_ArrayObject(W_Object):
     def method_sort_by_i(self, space, block):
         if block is None:
             return space.send(self, "enum_for", [space.newsymbol("sort_by!")])
-        RubySortBy(space, self.items_w, sortblock=block).sort()
+        items_w = self.listview(space)[:]
+        keys_w = [space.invoke_block(block, [w_item]) for w_item in items_w]
+        kind = comparison_kind(space, keys_w)
+        if kind == SORT_FIXNUM:
+            int_pairs = [(space.int_w(keys_w[i]), items_w[i]) for i in xrange(len(items_w))]
+            FixnumKeySorter(int_pairs).sort()
+            items_w = [w_item for _, w_item in int_pairs]
+        elif kind == SORT_FLOAT:
+            float_pairs = [(space.float_w(keys_w[i]), items_w[i]) for i in xrange(len(items_w))]
+            FloatKeySorter(float_pairs).sort()
+            items_w = [w_item for _, w_item in float_pairs]
+        elif kind == SORT_STRING:
+            str_pairs = [(space.str_w(keys_w[i]), items_w[i]) for i in xrange(len(items_w))]
+            StrKeySorter(str_pairs).sort()
+            items_w = [w_item for _, w_item in str_pairs]
+        else:
+            pairs = [(keys_w[i], items_w[i]) for i in xrange(len(items_w))]
+            RubySortBy(space, pairs).sort()
+            items_w = [w_item for _, w_item in pairs]
+        self.replace(space, items_w)
         return self
 
+    def _select(self, space, w_n, keys_w, items_w, comparator, sign):
+        """
+        The item with the smallest key (sign=1) or biggest key (sign=-1),
+        or an array of the n first ones in order if w_n is given. Only the
+        n best items are kept sorted while scanning, instead of sorting
+        everything.
+        """
+        if w_n is None or w_n is space.w_nil:
+            if not items_w:
+                return space.w_nil
+            best = 0
+            for i in xrange(1, len(items_w)):
+                if comparator.compare(keys_w[i], keys_w[best]) * sign < 0:
+                    best = i
+            return items_w[best]
+        n = Coerce.int(space, w_n)
+        if n < 0:
+            raise space.error(space.w_ArgumentError, "negative size (%d)" % n)
+        best_keys_w = []
+        best_w = []
+        for i in xrange(len(items_w)):
+            w_key = keys_w[i]
+            if len(best_w) == n:
+                if n == 0 or comparator.compare(w_key, best_keys_w[n - 1]) * sign >= 0:
+                    continue
+                best_keys_w.pop()
+                best_w.pop()
+            lo = 0
+            hi = len(best_w)
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if comparator.compare(w_key, best_keys_w[mid]) * sign < 0:
+                    hi = mid
+                else:
+                    lo = mid + 1
+            best_keys_w.insert(lo, w_key)
+            best_w.insert(lo, items_w[i])
+        return space.newarray(best_w)
+
+    def _keys(self, space, items_w, block):
+        return [space.invoke_block(block, [w_item]) for w_item in items_w]
+
+    @classdef.method("min")
+    def method_min(self, space, w_n=None, block=None):
+        items_w = self.listview(space)[:]
+        return self._select(space, w_n, items_w, items_w, comparator_for(space, items_w, block), 1)
+
+    @classdef.method("max")
+    def method_max(self, space, w_n=None, block=None):
+        items_w = self.listview(space)[:]
+        return self._select(space, w_n, items_w, items_w, comparator_for(space, items_w, block), -1)
+
+    @classdef.method("min_by")
+    def method_min_by(self, space, w_n=None, block=None):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("min_by")])
+        items_w = self.listview(space)[:]
+        keys_w = self._keys(space, items_w, block)
+        return self._select(space, w_n, keys_w, items_w, comparator_for(space, keys_w), 1)
+
+    @classdef.method("max_by")
+    def method_max_by(self, space, w_n=None, block=None):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("max_by")])
+        items_w = self.listview(space)[:]
+        keys_w = self._keys(space, items_w, block)
+        return self._select(space, w_n, keys_w, items_w, comparator_for(space, keys_w), -1)
+
+    @classdef.method("minmax")
+    def method_minmax(self, space, block):
+        items_w = self.listview(space)[:]
+        comparator = comparator_for(space, items_w, block)
+        return space.newarray([
+            self._select(space, None, items_w, items_w, comparator, 1),
+            self._select(space, None, items_w, items_w, comparator, -1),
+        ])
+
     @classdef.method("reverse!")
     @check_frozen()
     def method_reverse_i(self, space):
-        self.items_w.reverse()
+        self.strategy.reverse(self.array_storage)
         return self
 
     @classdef.method("rotate!", n="int")
@@ -334,8 +1033,9 @@ class W_ArrayObject(W_Object):
         if n == 0:
             return self
         assert n >= 0
-        self.items_w.extend(self.items_w[:n])
-        del self.items_w[:n]
+        storage = self.strategy.getslice(space, self.array_storage, 0, n)
+        self.strategy.extend_from_storage(self.array_storage, storage)
+        self.strategy.delslice(space, self.array_storage, 0, n)
         return self
 
     @classdef.method("insert", i="int")
@@ -347,7 +1047,7 @@ class W_ArrayObject(W_Object):
         length = self.length()
         if i > length:
             self._append_nils(space, i - length)
-            self.items_w.extend(args_w)
+            self.extend(space, args_w)
             return self
         if i < 0:
             if i < -length - 1:
@@ -356,11 +1056,121 @@ class W_ArrayObject(W_Object):
                 )
             i += length + 1
         assert i >= 0
+        self.generalize_for_list(space, args_w)
         for w_e in args_w:
-            self.items_w.insert(i, w_e)
+            self.strategy.insert(space, self.array_storage, i, w_e)
             i += 1
         return self
 
+    @classdef.method("fill")
+    @check_frozen()
+    def method_fill(self, space, args_w, block):
+        if block is not None:
+            if len(args_w) > 2:
+                raise space.error(space.w_ArgumentError,
+                    "wrong number of arguments (%d for 0..2)" % len(args_w)
+                )
+            w_obj = None
+            w_one = args_w[0] if len(args_w) > 0 else space.w_nil
+            w_two = args_w[1] if len(args_w) > 1 else space.w_nil
+        else:
+            if len(args_w) < 1 or len(args_w) > 3:
+                raise space.error(space.w_ArgumentError,
+                    "wrong number of arguments (%d for 1..3)" % len(args_w)
+                )
+            w_obj = args_w[0]
+            w_one = args_w[1] if len(args_w) > 1 else space.w_nil
+            w_two = args_w[2] if len(args_w) > 2 else space.w_nil
+
+        length = self.length()
+        if isinstance(w_one, W_RangeObject):
+            if w_two is not space.w_nil:
+                raise space.error(space.w_TypeError, "no implicit conversion of Range into Integer")
+            left = Coerce.int(space, w_one.w_start)
+            if left < 0:
+                left += length
+            if left < 0:
+                raise space.error(space.w_RangeError,
+                    "%s out of range" % space.str_w(space.send(w_one, "to_s"))
+                )
+            right = Coerce.int(space, w_one.w_end)
+            if right < 0:
+                right += length
+            if not w_one.exclusive:
+                right += 1
+        elif w_one is not space.w_nil:
+            left = Coerce.int(space, w_one)
+            if left < 0:
+                left += length
+            if left < 0:
+                left = 0
+            if w_two is not space.w_nil:
+                right = left + Coerce.int(space, w_two)
+            else:
+                right = length
+        else:
+            left = 0
+            right = length
+        if right <= left:
+            return self
+
+        self._append_nils(space, left - self.length())
+        if block is None:
+            self.generalize_for(space, w_obj)
+            self.strategy.fill(space, self.array_storage, w_obj, left, right)
+        else:
+            for i in xrange(left, right):
+                w_res = space.invoke_block(block, [space.newint(i)])
+                if i < self.length():
+                    self.setitem(space, i, w_res)
+                else:
+                    self.append(space, w_res)
+        return self
+
+    @classdef.method("map")
+    @classdef.method("collect")
+    def method_map(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("map")])
+        return enumerable.iter_map(space, ArrayItemIterator(self), block)
+
+    @classdef.method("select")
+    @classdef.method("find_all")
+    def method_select(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("select")])
+        return enumerable.iter_select(space, ArrayItemIterator(self), block)
+
+    @classdef.method("reject")
+    def method_reject(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("reject")])
+        return enumerable.iter_reject(space, ArrayItemIterator(self), block)
+
+    @classdef.method("inject")
+    @classdef.method("reduce")
+    def method_inject(self, space, args_w, block):
+        w_res = enumerable.iter_inject(space, ArrayItemIterator(self), args_w, block)
+        if w_res is None:
+            return space.send_super(space.getclassfor(W_ArrayObject), self, "inject", args_w, block)
+        return w_res
+
+    @classdef.method("each_with_index")
+    def method_each_with_index(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_with_index")])
+        enumerable.iter_each_with_index(space, ArrayItemIterator(self), block)
+        return self
+
+    @classdef.method("each_slice")
+    def method_each_slice(self, space, w_num, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_slice"), w_num])
+        return enumerable.iter_each_slice(space, ArrayItemIterator(self), w_num, block)
+
     def _append_nils(self, space, num):
+        if num <= 0:
+            return
+        self.generalize_for(space, space.w_nil)
         for _ in xrange(num):
-            self.items_w.append(space.w_nil)
+            self.strategy.append(space, self.array_storage, space.w_nil)
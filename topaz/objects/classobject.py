@@ -150,6 +150,7 @@ class W_ClassObject(W_ModuleObject):
         else:
             w_superclass = space.w_object
         self.superclass = w_superclass
+        self.methods_mutated()
         self.superclass.inherited(space, self)
         self.getsingletonclass(space)
         space.send_super(space.getclassfor(W_ClassObject), self, "initialize", [], block=block)
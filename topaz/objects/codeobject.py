@@ -1,7 +1,40 @@
 import copy
 
+from rpython.rlib import jit
+
 from topaz.module import ClassDef
+from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.objectobject import W_BaseObject
+from topaz.objects.stringobject import W_StringObject
+from topaz.objects.symbolobject import W_SymbolObject
+
+
+class SendCache(object):
+    """
+    Inline cache for a single call site. Remembers the method found for the
+    last few receiver classes, each entry guarded by the class's version.
+    """
+
+    MAX_ENTRIES = 4
+
+    def __init__(self):
+        self.classes_w = []
+        self.versions = []
+        self.methods = []
+
+    def find_method(self, space, w_cls, name):
+        for i in xrange(len(self.classes_w)):
+            if self.classes_w[i] is w_cls:
+                if self.versions[i] is not w_cls.version:
+                    self.versions[i] = w_cls.version
+                    self.methods[i] = w_cls.find_method(space, name)
+                return self.methods[i]
+        method = w_cls.find_method(space, name)
+        if len(self.classes_w) < self.MAX_ENTRIES:
+            self.classes_w.append(w_cls)
+            self.versions.append(w_cls.version)
+            self.methods.append(method)
+        return method
 
 
 class W_CodeObject(W_BaseObject):
@@ -41,6 +74,7 @@ class W_CodeObject(W_BaseObject):
         if splat_arg is not None:
             splat_arg_pos = cellvars.index(splat_arg)
         self.splat_arg_pos = splat_arg_pos
+        self.send_caches = None
 
     def __deepcopy__(self, memo):
         obj = super(W_CodeObject, self).__deepcopy__(memo)
@@ -56,8 +90,17 @@ class W_CodeObject(W_BaseObject):
         obj.arg_pos = self.arg_pos
         obj.block_arg_pos = self.block_arg_pos
         obj.splat_arg_pos = self.splat_arg_pos
+        obj.send_caches = None
         return obj
 
+    def get_send_cache(self, pc):
+        if self.send_caches is None:
+            self.send_caches = [None] * len(self.code)
+        cache = self.send_caches[pc]
+        if cache is None:
+            cache = self.send_caches[pc] = SendCache()
+        return cache
+
     def arity(self, negative_defaults=False):
         args_count = len(self.arg_pos) - len(self.defaults)
         if self.splat_arg_pos != -1 or (negative_defaults and len(self.defaults) > 0):
@@ -67,3 +110,107 @@ class W_CodeObject(W_BaseObject):
     @classdef.method("filepath")
     def method_filepath(self, space):
         return space.newstr_fromstr(self.filepath)
+
+
+class W_JumpTable(W_BaseObject):
+    """
+    Maps the literals of a case statement's when clauses to the pc of the
+    matching body.
+    """
+
+    _immutable_fields_ = ["kind"]
+
+    FIXNUM = 0
+    SYMBOL = 1
+    STRING = 2
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.int_targets = {}
+        self.str_targets = {}
+
+    def __deepcopy__(self, memo):
+        obj = super(W_JumpTable, self).__deepcopy__(memo)
+        obj.kind = self.kind
+        obj.int_targets = self.int_targets
+        obj.str_targets = self.str_targets
+        return obj
+
+    def set_int_target(self, key, target_pc):
+        if key not in self.int_targets:
+            self.int_targets[key] = target_pc
+
+    def set_str_target(self, key, target_pc):
+        if key not in self.str_targets:
+            self.str_targets[key] = target_pc
+
+    def guarded_class(self, space):
+        # The class whose === and == the table stands in for.
+        if self.kind == self.FIXNUM:
+            return space.w_fixnum
+        elif self.kind == self.SYMBOL:
+            return space.w_symbol
+        else:
+            return space.w_string
+
+    @jit.elidable
+    def _lookup_int(self, key, default_pc):
+        return self.int_targets.get(key, default_pc)
+
+    @jit.elidable
+    def _lookup_str(self, key, default_pc):
+        return self.str_targets.get(key, default_pc)
+
+    def lookup(self, space, w_value, fallback_pc, default_pc):
+        # Values of another type may still match through ===, e.g. 1 === 1.0,
+        # so those take the fallback path.
+        if self.kind == self.FIXNUM and isinstance(w_value, W_FixnumObject):
+            return self._lookup_int(w_value.intvalue, default_pc)
+        elif self.kind == self.SYMBOL and isinstance(w_value, W_SymbolObject):
+            return self._lookup_str(w_value.symbol, default_pc)
+        elif self.kind == self.STRING and isinstance(w_value, W_StringObject):
+            return self._lookup_str(space.str_w(w_value), default_pc)
+        return fallback_pc
+
+
+class W_FoldedValue(W_BaseObject):
+    """
+    The result of a binary operator applied to literals at compile time. It
+    remembers the operation, so it can be computed again once one of the
+    core methods it used is redefined.
+    """
+
+    _immutable_fields_ = ["w_value", "w_receiver", "name", "w_arg"]
+
+    def __init__(self, w_value, w_receiver, name, w_arg):
+        self.w_value = w_value
+        self.w_receiver = w_receiver
+        self.name = name
+        self.w_arg = w_arg
+
+    def __deepcopy__(self, memo):
+        obj = super(W_FoldedValue, self).__deepcopy__(memo)
+        obj.w_value = copy.deepcopy(self.w_value, memo)
+        obj.w_receiver = copy.deepcopy(self.w_receiver, memo)
+        obj.name = self.name
+        obj.w_arg = copy.deepcopy(self.w_arg, memo)
+        return obj
+
+    def get_value(self, space):
+        # Every evaluation of a string literal creates a new string.
+        w_value = self.w_value
+        if isinstance(w_value, W_StringObject):
+            return w_value.copy(space)
+        return w_value
+
+    def evaluate(self, space):
+        w_receiver = self._evaluate_operand(space, self.w_receiver)
+        w_arg = self._evaluate_operand(space, self.w_arg)
+        return space.send(w_receiver, self.name, [w_arg])
+
+    def _evaluate_operand(self, space, w_operand):
+        if isinstance(w_operand, W_FoldedValue):
+            return w_operand.evaluate(space)
+        elif isinstance(w_operand, W_StringObject):
+            return w_operand.copy(space)
+        return w_operand
@@ -0,0 +1,48 @@
+import copy
+
+from topaz.module import ClassDef
+from topaz.objects.objectobject import W_Object
+from topaz.scheduler import Scheduler
+
+
+class W_ConditionVariableObject(W_Object):
+    classdef = ClassDef("ConditionVariable", W_Object.classdef)
+
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass)
+        self.waiting_w = []
+
+    def __deepcopy__(self, memo):
+        obj = super(W_ConditionVariableObject, self).__deepcopy__(memo)
+        obj.waiting_w = copy.deepcopy(self.waiting_w, memo)
+        return obj
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_ConditionVariableObject(space, self)
+
+    @classdef.method("wait")
+    def method_wait(self, space, w_mutex, w_timeout=None):
+        w_current = space.fromcache(Scheduler).get_current(space)
+        self.waiting_w.append(w_current)
+        try:
+            space.send(w_mutex, "sleep", [w_timeout or space.w_nil])
+        finally:
+            if w_current in self.waiting_w:
+                self.waiting_w.remove(w_current)
+        return self
+
+    @classdef.method("signal")
+    def method_signal(self, space):
+        if self.waiting_w:
+            space.fromcache(Scheduler).wake(space, self.waiting_w.pop(0))
+        return self
+
+    @classdef.method("broadcast")
+    def method_broadcast(self, space):
+        scheduler = space.fromcache(Scheduler)
+        waiting_w = self.waiting_w
+        self.waiting_w = []
+        for w_thread in waiting_w:
+            scheduler.wake(space, w_thread)
+        return self
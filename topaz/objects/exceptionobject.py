@@ -262,3 +262,8 @@ class W_ThreadError(W_StandardError):
 class W_FiberError(W_StandardError):
     classdef = ClassDef("FiberError", W_StandardError.classdef)
     method_allocate = new_exception_allocate(classdef)
+
+
+class W_SocketError(W_StandardError):
+    classdef = ClassDef("SocketError", W_StandardError.classdef)
+    method_allocate = new_exception_allocate(classdef)
@@ -6,6 +6,7 @@ from rpython.rlib.rstacklet import StackletThread
 from topaz.interpreter import RaiseReturn, RaiseBreak
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_Object
+from topaz.reactor import Reactor
 
 
 class State(object):
@@ -33,12 +34,14 @@ class W_FiberObject(W_Object):
         self.w_block = None
         self.sthread = None
         self.parent_fiber = None
+        self.scheduled = False
 
     def __deepcopy__(self, memo):
         obj = super(W_FiberObject, self).__deepcopy__(memo)
         obj.w_block = copy.deepcopy(self.w_block, memo)
         obj.sthread = copy.deepcopy(self.sthread, memo)
         obj.parent_fiber = copy.deepcopy(self.parent_fiber, memo)
+        obj.scheduled = self.scheduled
         return obj
 
     @staticmethod
@@ -58,6 +61,23 @@ class W_FiberObject(W_Object):
     def singleton_method_allocate(self, space):
         return W_FiberObject(space, self)
 
+    @classdef.singleton_method("schedule")
+    def singleton_method_schedule(self, space, args_w, block):
+        """
+        Starts a fiber that is parked in the reactor instead of blocking on
+        IO or sleep, giving control back to whoever resumed it.
+        """
+        w_fiber = space.send(self, "new", [], block)
+        assert isinstance(w_fiber, W_FiberObject)
+        w_fiber.scheduled = True
+        space.send(w_fiber, "resume", args_w)
+        return w_fiber
+
+    @classdef.singleton_method("run_scheduled")
+    def singleton_method_run_scheduled(self, space):
+        space.fromcache(Reactor).run(space)
+        return space.w_nil
+
     @classdef.singleton_method("yield")
     def singleton_method_yield(self, space, args_w):
         current = space.fromcache(State).get_current(space)
@@ -156,7 +176,7 @@ def new_stacklet_callback(h, arg):
     origin.h = h
     global_state.clear()
 
-    with self.sthread.ec.visit_frame(self.bottomframe):
+    with space.getexecutioncontext().visit_frame(self.bottomframe):
         try:
             try:
                 global_state.w_result = space.execute_frame(self.bottomframe, self.w_block.bytecode)
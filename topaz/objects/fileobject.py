@@ -94,7 +94,7 @@ class W_FileObject(W_IOObject):
         if w_perm_or_opt is not space.w_nil or w_opt is not space.w_nil:
             raise space.error(space.w_NotImplementedError, "options hash or permissions for File.new")
         try:
-            self.fd = os.open(filename, mode, perm)
+            self.set_fd(os.open(filename, mode, perm))
         except OSError as e:
             raise error_for_oserror(space, e)
         self.filename = filename
@@ -262,6 +262,7 @@ class W_FileObject(W_IOObject):
     @classdef.method("truncate", length="int")
     def method_truncate(self, space, length):
         self.ensure_not_closed(space)
+        self.flush_buffer(space)
         try:
             ftruncate(self.fd, length)
         except OSError as e:
@@ -1,29 +1,114 @@
 import copy
+from rpython.rlib.objectmodel import compute_identity_hash
 from rpython.rlib.rerased import new_static_erasing_pair
 
 from topaz.module import ClassDef, check_frozen
+from topaz.modules import enumerable
 from topaz.modules.enumerable import Enumerable
+from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.objectobject import W_Object
+from topaz.objects.stringobject import W_StringObject
+from topaz.objects.symbolobject import W_SymbolObject
 from topaz.utils.ordereddict import OrderedDict
 from topaz.objects.procobject import W_ProcObject
 
 
+def string_key_eq(w_key1, w_key2):
+    assert isinstance(w_key1, W_StringObject)
+    assert isinstance(w_key2, W_StringObject)
+    if w_key1.length() != w_key2.length():
+        return False
+    return (w_key1.strategy.str_w(w_key1.str_storage) ==
+        w_key2.strategy.str_w(w_key2.str_storage))
+
+
+def string_key_hash(w_key):
+    assert isinstance(w_key, W_StringObject)
+    return w_key.strategy.hash(w_key.str_storage)
+
+
 class BaseDictStrategy(object):
     def __init__(self, space):
         pass
 
+    def __deepcopy__(self, memo):
+        memo[id(self)] = result = object.__new__(self.__class__)
+        return result
+
+
+class EmptyDictStrategy(BaseDictStrategy):
+    erase, unerase = new_static_erasing_pair("EmptyDictStrategy")
+    iter_erase, iter_unerase = new_static_erasing_pair("EmptyDictStrategyIterator")
+
+    def get_empty_storage(self, space):
+        return self.erase(None)
+
+    def can_store(self, space, w_key):
+        return False
+
+    def can_lookup(self, space, w_key):
+        return True
+
+    def generalize_for(self, space, w_key):
+        return strategy_for_key(space, w_key)
+
+    def getitem(self, space, storage, w_key):
+        raise KeyError(w_key)
+
+    def contains(self, space, storage, w_key):
+        return False
+
+    def copy(self, storage):
+        return storage
+
+    def clear(self, storage):
+        pass
+
+    def len(self, storage):
+        return 0
+
+    def bool(self, storage):
+        return False
+
+    def pop(self, space, storage, w_key, default):
+        return default
+
+    def popitem(self, space, storage):
+        raise KeyError
+
+    def keys(self, space, storage):
+        return []
+
+    def values(self, storage):
+        return []
+
+    def items(self, space, storage):
+        return []
+
+    def iteritems(self, storage):
+        return self.iter_erase(None)
+
+    def iternext(self, space, iter):
+        raise StopIteration
+
 
 class TypedDictStrategyMixin(object):
     _mixin_ = True
 
-    def getitem(self, storage, w_key):
-        return self.wrap(self.unerase(storage)[w_key])
+    def can_lookup(self, space, w_key):
+        return self.can_store(space, w_key)
 
-    def setitem(self, storage, w_key, w_value):
-        self.unerase(storage)[self.unwrap(w_key)] = w_value
+    def generalize_for(self, space, w_key):
+        return space.fromcache(ObjectDictStrategy)
 
-    def contains(self, storage, w_key):
-        return self.unwrap(w_key) in self.unerase(storage)
+    def getitem(self, space, storage, w_key):
+        return self.unerase(storage)[self.unwrap(space, w_key)]
+
+    def setitem(self, space, storage, w_key, w_value):
+        self.unerase(storage)[self.unwrap(space, w_key)] = w_value
+
+    def contains(self, space, storage, w_key):
+        return self.unwrap(space, w_key) in self.unerase(storage)
 
     def copy(self, storage):
         return self.erase(self.unerase(storage).copy())
@@ -37,25 +122,28 @@ class TypedDictStrategyMixin(object):
     def bool(self, storage):
         return bool(self.unerase(storage))
 
-    def pop(self, storage, w_key, default):
-        return self.unerase(storage).pop(self.unwrap(w_key), default)
+    def pop(self, space, storage, w_key, default):
+        return self.unerase(storage).pop(self.unwrap(space, w_key), default)
 
-    def popitem(self, storage):
+    def popitem(self, space, storage):
         key, value = self.unerase(storage).popitem()
-        return self.wrap(key), value
+        return self.wrap(space, key), value
 
-    def keys(self, storage):
-        return [self.wrap(k) for k in self.unerase(storage).keys()]
+    def keys(self, space, storage):
+        return [self.wrap(space, k) for k in self.unerase(storage).keys()]
 
     def values(self, storage):
         return self.unerase(storage).values()
 
+    def items(self, space, storage):
+        return [(self.wrap(space, k), v) for k, v in self.unerase(storage).iteritems()]
+
     def iteritems(self, storage):
         return self.iter_erase(self.unerase(storage).iteritems())
 
-    def iternext(self, storage):
-        key, value = self.iter_unerase(storage).next()
-        return self.wrap(key), value
+    def iternext(self, space, iter):
+        key, value = self.iter_unerase(iter).next()
+        return self.wrap(space, key), value
 
 
 class ObjectDictStrategy(BaseDictStrategy, TypedDictStrategyMixin):
@@ -65,10 +153,13 @@ class ObjectDictStrategy(BaseDictStrategy, TypedDictStrategyMixin):
     def get_empty_storage(self, space):
         return self.erase(OrderedDict(space.eq_w, space.hash_w))
 
-    def wrap(self, w_key):
+    def can_store(self, space, w_key):
+        return True
+
+    def wrap(self, space, w_key):
         return w_key
 
-    def unwrap(self, w_key):
+    def unwrap(self, space, w_key):
         return w_key
 
 
@@ -79,32 +170,172 @@ class IdentityDictStrategy(BaseDictStrategy, TypedDictStrategyMixin):
     def get_empty_storage(self, space):
         return self.erase(OrderedDict())
 
-    def wrap(self, w_key):
+    def can_store(self, space, w_key):
+        return True
+
+    def wrap(self, space, w_key):
+        return w_key
+
+    def unwrap(self, space, w_key):
+        return w_key
+
+
+class FixnumDictStrategy(BaseDictStrategy, TypedDictStrategyMixin):
+    erase, unerase = new_static_erasing_pair("FixnumDictStrategy")
+    iter_erase, iter_unerase = new_static_erasing_pair("FixnumDictStrategyIterator")
+
+    def get_empty_storage(self, space):
+        return self.erase(OrderedDict())
+
+    def can_store(self, space, w_key):
+        return isinstance(w_key, W_FixnumObject)
+
+    def wrap(self, space, key):
+        return space.newint(key)
+
+    def unwrap(self, space, w_key):
+        return space.int_w(w_key)
+
+
+class SymbolDictStrategy(BaseDictStrategy, TypedDictStrategyMixin):
+    erase, unerase = new_static_erasing_pair("SymbolDictStrategy")
+    iter_erase, iter_unerase = new_static_erasing_pair("SymbolDictStrategyIterator")
+
+    def get_empty_storage(self, space):
+        # Symbols are interned, so they can be compared by identity.
+        return self.erase(OrderedDict())
+
+    def can_store(self, space, w_key):
+        return isinstance(w_key, W_SymbolObject)
+
+    def wrap(self, space, w_key):
+        return w_key
+
+    def unwrap(self, space, w_key):
+        return w_key
+
+
+class StringDictStrategy(BaseDictStrategy, TypedDictStrategyMixin):
+    erase, unerase = new_static_erasing_pair("StringDictStrategy")
+    iter_erase, iter_unerase = new_static_erasing_pair("StringDictStrategyIterator")
+
+    def get_empty_storage(self, space):
+        return self.erase(OrderedDict(string_key_eq, string_key_hash))
+
+    def can_store(self, space, w_key):
+        return (isinstance(w_key, W_StringObject) and
+            space.getclass(w_key) is space.w_string)
+
+    def wrap(self, space, w_key):
         return w_key
 
-    def unwrap(self, w_key):
+    def unwrap(self, space, w_key):
         return w_key
 
 
+def strategy_for_key(space, w_key):
+    if space.fromcache(FixnumDictStrategy).can_store(space, w_key):
+        return space.fromcache(FixnumDictStrategy)
+    elif space.fromcache(SymbolDictStrategy).can_store(space, w_key):
+        return space.fromcache(SymbolDictStrategy)
+    elif space.fromcache(StringDictStrategy).can_store(space, w_key):
+        return space.fromcache(StringDictStrategy)
+    else:
+        return space.fromcache(ObjectDictStrategy)
+
+
+class HashItemIterator(enumerable.ItemIterator):
+    def __init__(self, items):
+        self.items = items
+        self.index = 0
+
+    def next(self, space):
+        if self.index >= len(self.items):
+            return None
+        w_key, w_value = self.items[self.index]
+        self.index += 1
+        return space.newarray([w_key, w_value])
+
+
+def hash_for_key(space, w_key):
+    """
+    The hash of w_key, without calling #hash for the keys the specialized
+    strategies store directly.
+    """
+    if isinstance(w_key, W_FixnumObject):
+        return space.int_w(w_key)
+    elif isinstance(w_key, W_SymbolObject):
+        return compute_identity_hash(w_key)
+    elif space.fromcache(StringDictStrategy).can_store(space, w_key):
+        return string_key_hash(w_key)
+    else:
+        return space.hash_w(w_key)
+
+
 class W_HashObject(W_Object):
     classdef = ClassDef("Hash", W_Object.classdef)
     classdef.include_module(Enumerable)
 
     def __init__(self, space, klass=None):
         W_Object.__init__(self, space, klass)
-        self.strategy = space.fromcache(ObjectDictStrategy)
+        self.strategy = space.fromcache(EmptyDictStrategy)
         self.dict_storage = self.strategy.get_empty_storage(space)
         self.w_default = space.w_nil
         self.default_proc = None
 
     def __deepcopy__(self, memo):
         obj = super(W_HashObject, self).__deepcopy__(memo)
-        obj.strategy = copy.deepcopy(self.strategy)
+        obj.strategy = copy.deepcopy(self.strategy, memo)
         obj.dict_storage = self.strategy.copy(self.dict_storage)
         obj.w_default = self.w_default
         obj.default_proc = copy.deepcopy(self.default_proc)
         return obj
 
+    def generalize_for(self, space, w_key):
+        if not self.strategy.can_store(space, w_key):
+            self.switch_strategy(space, self.strategy.generalize_for(space, w_key))
+
+    def switch_strategy(self, space, strategy):
+        storage = strategy.get_empty_storage(space)
+        iter = self.strategy.iteritems(self.dict_storage)
+        while True:
+            try:
+                w_key, w_value = self.strategy.iternext(space, iter)
+            except StopIteration:
+                break
+            strategy.setitem(space, storage, w_key, w_value)
+        self.strategy = strategy
+        self.dict_storage = storage
+
+    def frozen_key(self, space, w_key):
+        if (space.is_kind_of(w_key, space.w_string) and
+            not space.is_true(space.send(w_key, "frozen?"))):
+
+            w_key = space.send(w_key, "dup")
+            w_key = space.send(w_key, "freeze")
+        return w_key
+
+    def getitem(self, space, w_key):
+        # A key the strategy can't store can't be in the hash; only writes
+        # generalize the strategy.
+        if not self.strategy.can_lookup(space, w_key):
+            raise KeyError(w_key)
+        return self.strategy.getitem(space, self.dict_storage, w_key)
+
+    def setitem(self, space, w_key, w_value):
+        self.generalize_for(space, w_key)
+        self.strategy.setitem(space, self.dict_storage, w_key, w_value)
+
+    def contains(self, space, w_key):
+        if not self.strategy.can_lookup(space, w_key):
+            return False
+        return self.strategy.contains(space, self.dict_storage, w_key)
+
+    def delete(self, space, w_key):
+        if not self.strategy.can_lookup(space, w_key):
+            return None
+        return self.strategy.pop(space, self.dict_storage, w_key, None)
+
     @classdef.singleton_method("allocate")
     def method_allocate(self, space):
         return W_HashObject(space, self)
@@ -153,18 +384,7 @@ class W_HashObject(W_Object):
     @classdef.method("compare_by_identity")
     @check_frozen()
     def method_compare_by_identity(self, space):
-        strategy = space.fromcache(IdentityDictStrategy)
-        storage = strategy.get_empty_storage(space)
-
-        iter = self.strategy.iteritems(self.dict_storage)
-        while True:
-            try:
-                w_key, w_value = self.strategy.iternext(iter)
-            except StopIteration:
-                break
-            strategy.setitem(storage, w_key, w_value)
-        self.strategy = strategy
-        self.dict_storage = storage
+        self.switch_strategy(space, space.fromcache(IdentityDictStrategy))
         return self
 
     @classdef.method("compare_by_identity?")
@@ -174,29 +394,20 @@ class W_HashObject(W_Object):
     @classdef.method("rehash")
     @check_frozen()
     def method_rehash(self, space):
-        storage = self.strategy.get_empty_storage(space)
-
-        iter = self.strategy.iteritems(self.dict_storage)
-        while True:
-            try:
-                w_key, w_value = self.strategy.iternext(iter)
-            except StopIteration:
-                break
-            self.strategy.setitem(storage, w_key, w_value)
-        self.dict_storage = storage
+        self.switch_strategy(space, self.strategy)
         return self
 
     @classdef.method("[]")
     def method_subscript(self, space, w_key):
         try:
-            return self.strategy.getitem(self.dict_storage, w_key)
+            return self.getitem(space, w_key)
         except KeyError:
             return space.send(self, "default", [w_key])
 
     @classdef.method("fetch")
     def method_fetch(self, space, w_key, w_value=None, block=None):
         try:
-            return self.strategy.getitem(self.dict_storage, w_key)
+            return self.getitem(space, w_key)
         except KeyError:
             if block is not None:
                 return space.invoke_block(block, [w_key])
@@ -209,12 +420,7 @@ class W_HashObject(W_Object):
     @classdef.method("[]=")
     @check_frozen()
     def method_subscript_assign(self, space, w_key, w_value):
-        if (space.is_kind_of(w_key, space.w_string) and
-            not space.is_true(space.send(w_key, "frozen?"))):
-
-            w_key = space.send(w_key, "dup")
-            w_key = space.send(w_key, "freeze")
-        self.strategy.setitem(self.dict_storage, w_key, w_value)
+        self.setitem(space, self.frozen_key(space, w_key), w_value)
         return w_value
 
     @classdef.method("length")
@@ -229,7 +435,7 @@ class W_HashObject(W_Object):
     @classdef.method("delete")
     @check_frozen()
     def method_delete(self, space, w_key, block):
-        w_res = self.strategy.pop(self.dict_storage, w_key, None)
+        w_res = self.delete(space, w_key)
         if w_res is None:
             if block:
                 return space.invoke_block(block, [w_key])
@@ -247,7 +453,7 @@ class W_HashObject(W_Object):
     def method_shift(self, space):
         if not self.strategy.bool(self.dict_storage):
             return space.send(self, "default", [space.w_nil])
-        w_key, w_value = self.strategy.popitem(self.dict_storage)
+        w_key, w_value = self.strategy.popitem(space, self.dict_storage)
         return space.newarray([w_key, w_value])
 
     @classdef.method("initialize_copy")
@@ -264,7 +470,7 @@ class W_HashObject(W_Object):
 
     @classdef.method("keys")
     def method_keys(self, space):
-        return space.newarray(self.strategy.keys(self.dict_storage))
+        return space.newarray(self.strategy.keys(space, self.dict_storage))
 
     @classdef.method("values")
     def method_values(self, space):
@@ -279,30 +485,157 @@ class W_HashObject(W_Object):
     @classdef.method("member?")
     @classdef.method("include?")
     def method_includep(self, space, w_key):
-        return space.newbool(self.strategy.contains(self.dict_storage, w_key))
+        return space.newbool(self.contains(space, w_key))
+
+    @classdef.method("each")
+    @classdef.method("each_pair")
+    def method_each(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each")])
+        for w_key, w_value in self.strategy.items(space, self.dict_storage):
+            space.invoke_block(block, [space.newarray([w_key, w_value])])
+        return self
 
+    def _item_iterator(self, space):
+        # The generic Enumerable methods go through #each, which subclasses
+        # may override.
+        if space.getclass(self) is not space.w_hash:
+            return None
+        return HashItemIterator(self.strategy.items(space, self.dict_storage))
+
+    @classdef.method("map")
+    @classdef.method("collect")
+    def method_map(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("map")])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.w_hash, self, "map", [], block)
+        return enumerable.iter_map(space, it, block)
+
+    @classdef.method("inject")
+    @classdef.method("reduce")
+    def method_inject(self, space, args_w, block):
+        it = self._item_iterator(space)
+        w_res = None
+        if it is not None:
+            w_res = enumerable.iter_inject(space, it, args_w, block)
+        if w_res is None:
+            return space.send_super(space.w_hash, self, "inject", args_w, block)
+        return w_res
 
-class W_HashIterator(W_Object):
-    classdef = ClassDef("HashIterator", W_Object.classdef)
+    @classdef.method("each_with_index")
+    def method_each_with_index(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_with_index")])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.w_hash, self, "each_with_index", [], block)
+        enumerable.iter_each_with_index(space, it, block)
+        return self
 
-    def __init__(self, space):
-        W_Object.__init__(self, space)
+    @classdef.method("each_slice")
+    def method_each_slice(self, space, w_num, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_slice"), w_num])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.w_hash, self, "each_slice", [w_num], block)
+        return enumerable.iter_each_slice(space, it, w_num, block)
+
+    @classdef.method("each_key")
+    def method_each_key(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_key")])
+        for w_key in self.strategy.keys(space, self.dict_storage):
+            space.invoke_block(block, [w_key])
+        return self
 
-    @classdef.singleton_method("allocate")
-    def method_allocate(self, space):
-        return W_HashIterator(space)
+    @classdef.method("each_value")
+    def method_each_value(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_value")])
+        for w_value in self.strategy.values(self.dict_storage):
+            space.invoke_block(block, [w_value])
+        return self
 
-    @classdef.method("initialize")
-    def method_initialize(self, w_obj):
-        assert isinstance(w_obj, W_HashObject)
-        self.strategy = w_obj.strategy
-        self.iterator = self.strategy.iteritems(w_obj.dict_storage)
+    @classdef.method("to_a")
+    def method_to_a(self, space):
+        return space.newarray([
+            space.newarray([w_key, w_value])
+            for w_key, w_value in self.strategy.items(space, self.dict_storage)
+        ])
+
+    def _filter(self, space, block, keep):
+        w_res = space.send(self, "dup")
+        assert isinstance(w_res, W_HashObject)
+        for w_key, w_value in self.strategy.items(space, self.dict_storage):
+            if space.is_true(space.invoke_block(block, [w_key, w_value])) != keep:
+                w_res.delete(space, w_key)
+        return w_res
+
+    @classdef.method("select")
+    def method_select(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("select")])
+        return self._filter(space, block, True)
+
+    @classdef.method("reject")
+    def method_reject(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("reject")])
+        return self._filter(space, block, False)
+
+    def _update(self, space, w_other, block):
+        w_other = space.convert_type(w_other, space.w_hash, "to_hash")
+        assert isinstance(w_other, W_HashObject)
+        for w_key, w_value in w_other.strategy.items(space, w_other.dict_storage):
+            if block is not None:
+                if self.contains(space, w_key):
+                    w_old = self.getitem(space, w_key)
+                    w_value = space.invoke_block(block, [w_key, w_old, w_value])
+            self.setitem(space, self.frozen_key(space, w_key), w_value)
         return self
 
-    @classdef.method("next")
-    def method_next(self, space):
-        try:
-            w_k, w_v = self.strategy.iternext(self.iterator)
-        except StopIteration:
-            raise space.error(space.w_StopIteration)
-        return space.newarray([w_k, w_v])
+    @classdef.method("merge!")
+    @classdef.method("update")
+    @check_frozen()
+    def method_update(self, space, w_other, block):
+        return self._update(space, w_other, block)
+
+    @classdef.method("merge")
+    def method_merge(self, space, w_other, block):
+        w_res = space.send(self, "dup")
+        assert isinstance(w_res, W_HashObject)
+        return w_res._update(space, w_other, block)
+
+    def _equal(self, space, w_other, name, eql):
+        if self is w_other:
+            return True
+        if not space.is_kind_of(w_other, space.w_hash):
+            return False
+        assert isinstance(w_other, W_HashObject)
+        if self.strategy.len(self.dict_storage) != w_other.strategy.len(w_other.dict_storage):
+            return False
+        with space.getexecutioncontext().recursion_guard(name, self) as in_recursion:
+            if in_recursion:
+                return True
+            for w_key, w_value in self.strategy.items(space, self.dict_storage):
+                if not w_other.contains(space, w_key):
+                    return False
+                w_other_value = w_other.getitem(space, w_key)
+                if eql:
+                    equal = space.eq_w(w_other_value, w_value)
+                else:
+                    equal = space.is_true(space.send(w_value, "==", [w_other_value]))
+                if not equal:
+                    return False
+        return True
+
+    @classdef.method("==")
+    def method_eq(self, space, w_other):
+        return space.newbool(self._equal(space, w_other, "hash_compare", False))
+
+    @classdef.method("eql?")
+    def method_eqlp(self, space, w_other):
+        return space.newbool(self._equal(space, w_other, "hash_eql", True))
@@ -16,9 +16,17 @@ from topaz.objects.floatobject import W_FloatObject
 from topaz.objects.integerobject import W_IntegerObject
 from topaz.objects.numericobject import W_NumericObject
 from topaz.objects.objectobject import W_RootObject
+from topaz.objects.procobject import block_jitdriver
 from topaz.system import IS_WINDOWS
 
 
+times_driver = block_jitdriver("Fixnum#times")
+upto_driver = block_jitdriver("Fixnum#upto")
+downto_driver = block_jitdriver("Fixnum#downto")
+step_driver = block_jitdriver("Fixnum#step")
+float_step_driver = block_jitdriver("Fixnum#step(Float)")
+
+
 class FixnumStorage(object):
     def __init__(self, space):
         self.storages = {}
@@ -366,6 +374,109 @@ class W_FixnumObject(W_RootObject):
     def method_hash(self, space):
         return self
 
+    @classdef.method("times")
+    def method_times(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("times")])
+        limit = self.intvalue
+        i = 0
+        while i < limit:
+            times_driver.jit_merge_point(block_bytecode=block.bytecode)
+            space.invoke_block(block, [space.newint(i)])
+            i += 1
+        return self
+
+    @classdef.method("upto")
+    def method_upto(self, space, w_limit, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("upto"), w_limit])
+        if not isinstance(w_limit, W_FixnumObject):
+            return self._step_generic(space, w_limit, space.newint(1), "<=", block)
+        limit = space.int_w(w_limit)
+        i = self.intvalue
+        while i <= limit:
+            upto_driver.jit_merge_point(block_bytecode=block.bytecode)
+            space.invoke_block(block, [space.newint(i)])
+            if i == limit:
+                break
+            i += 1
+        return self
+
+    @classdef.method("downto")
+    def method_downto(self, space, w_limit, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("downto"), w_limit])
+        if not isinstance(w_limit, W_FixnumObject):
+            return self._step_generic(space, w_limit, space.newint(-1), ">=", block)
+        limit = space.int_w(w_limit)
+        i = self.intvalue
+        while i >= limit:
+            downto_driver.jit_merge_point(block_bytecode=block.bytecode)
+            space.invoke_block(block, [space.newint(i)])
+            if i == limit:
+                break
+            i -= 1
+        return self
+
+    @classdef.method("step")
+    def method_step(self, space, w_limit, w_step=None, block=None):
+        if w_step is None:
+            w_step = space.newint(1)
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("step"), w_limit, w_step])
+        if isinstance(w_limit, W_FixnumObject) and isinstance(w_step, W_FixnumObject):
+            step = space.int_w(w_step)
+            if step == 0:
+                raise space.error(space.w_ArgumentError, "step can't be 0")
+            limit = space.int_w(w_limit)
+            i = self.intvalue
+            while (step > 0 and i <= limit) or (step < 0 and i >= limit):
+                step_driver.jit_merge_point(block_bytecode=block.bytecode)
+                space.invoke_block(block, [space.newint(i)])
+                try:
+                    i = ovfcheck(i + step)
+                except OverflowError:
+                    break
+        elif isinstance(w_limit, W_FloatObject) or isinstance(w_step, W_FloatObject):
+            self._float_step(space, Coerce.float(space, w_limit), Coerce.float(space, w_step), block)
+        elif space.is_true(space.send(w_step, "==", [space.newint(0)])):
+            raise space.error(space.w_ArgumentError, "step can't be 0")
+        elif space.is_true(space.send(w_step, ">", [space.newint(0)])):
+            self._step_generic(space, w_limit, w_step, "<=", block)
+        else:
+            self._step_generic(space, w_limit, w_step, ">=", block)
+        return self
+
+    def _step_generic(self, space, w_limit, w_step, cmp, block):
+        w_i = self
+        while space.is_true(space.send(w_i, cmp, [w_limit])):
+            space.invoke_block(block, [w_i])
+            w_i = space.send(w_i, "+", [w_step])
+        return self
+
+    def _float_step(self, space, end, unit, block):
+        # Computes the number of steps up front like MRI, so that rounding
+        # errors don't add or drop an iteration.
+        beg = float(self.intvalue)
+        if unit == 0.0:
+            raise space.error(space.w_ArgumentError, "step can't be 0")
+        if math.isinf(unit):
+            if (unit > 0 and beg <= end) or (unit < 0 and beg >= end):
+                space.invoke_block(block, [space.newfloat(beg)])
+            return
+        err = (abs(beg) + abs(end) + abs(end - beg)) / abs(unit) * rfloat.DBL_EPSILON
+        if err > 0.5:
+            err = 0.5
+        n = math.floor((end - beg) / unit + err)
+        i = 0.0
+        while i <= n:
+            float_step_driver.jit_merge_point(block_bytecode=block.bytecode)
+            d = i * unit + beg
+            if (unit >= 0 and end < d) or (unit < 0 and d < end):
+                d = end
+            space.invoke_block(block, [space.newfloat(d)])
+            i += 1.0
+
     if IS_WINDOWS:
         @classdef.method("size")
         def method_size(self, space):
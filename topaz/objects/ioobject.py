@@ -1,19 +1,34 @@
+import errno
 import os
+import time
+
+from rpython.rlib import rpoll, rposix
 
 from topaz.coerce import Coerce
-from topaz.error import error_for_oserror
+from topaz.error import error_for_oserror, error_for_errno
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_Object
 from topaz.objects.stringobject import W_StringObject
+from topaz.scheduler import Scheduler
+from topaz.system import IS_LINUX
 from topaz.utils.filemode import map_filemode
 
 
 class W_IOObject(W_Object):
     classdef = ClassDef("IO", W_Object.classdef)
 
-    def __init__(self, space):
-        W_Object.__init__(self, space)
+    BUFFER_SIZE = 8192
+    PIPE_BUF = 4096 if IS_LINUX else 512
+
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass)
         self.fd = -1
+        self.sync = False
+        self.line_buffered = False
+        self.read_buffer = ""
+        self.read_pos = 0
+        self.write_buffer = []
+        self.write_buffer_size = 0
 
     def __del__(self):
         # Do not close standard file streams
@@ -23,6 +38,12 @@ class W_IOObject(W_Object):
     def __deepcopy__(self, memo):
         obj = super(W_IOObject, self).__deepcopy__(memo)
         obj.fd = self.fd
+        obj.sync = self.sync
+        obj.line_buffered = self.line_buffered
+        obj.read_buffer = self.read_buffer
+        obj.read_pos = self.read_pos
+        obj.write_buffer = self.write_buffer[:]
+        obj.write_buffer_size = self.write_buffer_size
         return obj
 
     def ensure_not_closed(self, space):
@@ -32,6 +53,218 @@ class W_IOObject(W_Object):
     def getfd(self):
         return self.fd
 
+    def set_fd(self, fd):
+        self.fd = fd
+        self.read_buffer = ""
+        self.read_pos = 0
+        self.write_buffer = []
+        self.write_buffer_size = 0
+        # stderr is unbuffered and stdout is line buffered on a terminal.
+        # Everything else, including stdout redirected to a file or a pipe,
+        # is fully buffered until flushed, closed, or the process exits.
+        self.sync = fd == 2
+        self.line_buffered = fd == 1 and os.isatty(fd)
+
+    def write_str(self, space, string):
+        if self.read_pos < len(self.read_buffer):
+            self._discard_read_buffer()
+        if self.sync:
+            self.flush_buffer(space)
+            self._write_all(space, string)
+            return
+        if self.write_buffer_size == 0:
+            space.unflushed_ios_w[self] = None
+        self.write_buffer.append(string)
+        self.write_buffer_size += len(string)
+        if (self.write_buffer_size >= self.BUFFER_SIZE or
+            (self.line_buffered and string.find("\n") >= 0)):
+            self.flush_buffer(space)
+
+    def flush_buffer(self, space):
+        if self.write_buffer_size == 0:
+            return
+        data = "".join(self.write_buffer)
+        self.write_buffer = []
+        self.write_buffer_size = 0
+        try:
+            del space.unflushed_ios_w[self]
+        except KeyError:
+            pass
+        self._write_all(space, data)
+
+    def _write_all(self, space, data):
+        scheduler = space.fromcache(Scheduler)
+        pos = 0
+        while pos < len(data):
+            end = len(data)
+            if scheduler.is_cooperative(space):
+                scheduler.wait_writable(space, self.fd)
+                # A writable pipe or socket is only known to have room for
+                # this much, writing more could block.
+                end = min(end, pos + self.PIPE_BUF)
+            try:
+                assert pos >= 0
+                assert end >= pos
+                pos += os.write(self.fd, data[pos:end])
+            except OSError as e:
+                # The fd was made nonblocking by write_nonblock.
+                if e.errno != errno.EAGAIN:
+                    raise error_for_oserror(space, e)
+                scheduler.wait_for(space, {self.fd: rpoll.POLLOUT}, -1.0)
+
+    def _read(self, space, size):
+        scheduler = space.fromcache(Scheduler)
+        scheduler.wait_readable(space, self.fd)
+        while True:
+            try:
+                return os.read(self.fd, size)
+            except OSError as e:
+                if e.errno != errno.EAGAIN:
+                    raise error_for_oserror(space, e)
+                scheduler.wait_for(space, {self.fd: rpoll.POLLIN}, -1.0)
+
+    def _fill_read_buffer(self, space):
+        # Any unread input is kept at the start of the new buffer.
+        self.flush_buffer(space)
+        data = self._read(space, self.BUFFER_SIZE)
+        start = self.read_pos
+        if start < len(self.read_buffer):
+            assert start >= 0
+            self.read_buffer = self.read_buffer[start:] + data
+        else:
+            self.read_buffer = data
+        self.read_pos = 0
+        return len(data) > 0
+
+    def _discard_read_buffer(self):
+        unread = len(self.read_buffer) - self.read_pos
+        if unread > 0:
+            try:
+                os.lseek(self.fd, -unread, os.SEEK_CUR)
+            except OSError:
+                # Pipes, sockets and terminals can't seek, but their reads
+                # and writes are independent, so the buffered input stays.
+                return
+        self.read_buffer = ""
+        self.read_pos = 0
+
+    def _swallow_newlines(self, space):
+        while True:
+            if self.read_pos >= len(self.read_buffer):
+                if not self._fill_read_buffer(space):
+                    return
+            if self.read_buffer[self.read_pos] != "\n":
+                return
+            self.read_pos += 1
+
+    def getline(self, space, sep, limit=-1):
+        # Reads up to and including the next occurrence of sep, or to EOF if
+        # sep is None. An empty sep selects paragraph mode, which splits on
+        # runs of blank lines. A non-negative limit caps the length of the
+        # line. Returns None at EOF.
+        paragraph = sep is not None and len(sep) == 0
+        if paragraph:
+            sep = "\n\n"
+            self._swallow_newlines(space)
+        chunks = []
+        size = 0
+        need_more = False
+        while limit < 0 or size < limit:
+            if need_more or self.read_pos >= len(self.read_buffer):
+                if not self._fill_read_buffer(space):
+                    start = self.read_pos
+                    if start < len(self.read_buffer):
+                        assert start >= 0
+                        chunks.append(self.read_buffer[start:])
+                        size += len(self.read_buffer) - start
+                        self.read_pos = len(self.read_buffer)
+                    break
+            need_more = False
+            buf = self.read_buffer
+            start = self.read_pos
+            end = len(buf)
+            if limit >= 0 and end - start > limit - size:
+                end = start + limit - size
+            assert start >= 0
+            assert end >= start
+            found = False
+            if sep is not None:
+                idx = buf.find(sep, start, end)
+                if idx >= 0:
+                    end = idx + len(sep)
+                    found = True
+            if not found and end == len(buf):
+                # Hold back a possible partial separator at the end of the
+                # buffer, it is completed by the next read.
+                need_more = True
+                if sep is not None:
+                    end -= min(len(sep) - 1, end - start)
+            assert start >= 0
+            assert end >= start
+            self.read_pos = end
+            if not chunks and (found or not need_more):
+                # The whole line was in the buffer, avoid the extra copy.
+                line = buf[start:end]
+                if paragraph:
+                    self._swallow_newlines(space)
+                return line
+            chunks.append(buf[start:end])
+            size += end - start
+            if found:
+                break
+        if size == 0 and limit != 0:
+            return None
+        if paragraph:
+            self._swallow_newlines(space)
+        return "".join(chunks)
+
+    def _getline_args(self, space, w_sep, w_limit):
+        if w_limit is None:
+            w_limit = space.w_nil
+        if w_sep is None:
+            w_sep = space.globals.get(space, "$/")
+        elif w_limit is space.w_nil and space.is_kind_of(w_sep, space.w_fixnum):
+            w_limit = w_sep
+            w_sep = space.globals.get(space, "$/")
+        if w_sep is None or w_sep is space.w_nil:
+            sep = None
+        else:
+            sep = Coerce.str(space, w_sep)
+        if w_limit is space.w_nil:
+            limit = -1
+        else:
+            limit = Coerce.int(space, w_limit)
+        return sep, limit
+
+    def read_str(self, space, length=-1):
+        # Reads up to length bytes, or everything up to EOF if length is
+        # negative. Returns an empty string at EOF.
+        chunks = []
+        read_bytes = 0
+        while length < 0 or read_bytes < length:
+            if self.read_pos >= len(self.read_buffer):
+                if length - read_bytes >= self.BUFFER_SIZE:
+                    # Large reads bypass the buffer.
+                    self.flush_buffer(space)
+                    chunk = self._read(space, length - read_bytes)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    read_bytes += len(chunk)
+                    continue
+                if not self._fill_read_buffer(space):
+                    break
+            start = self.read_pos
+            end = len(self.read_buffer)
+            if length >= 0:
+                end = min(end, start + length - read_bytes)
+            assert start >= 0
+            assert end >= start
+            chunks.append(self.read_buffer[start:end])
+            self.read_pos = end
+            read_bytes += end - start
+        return "".join(chunks)
+
     @classdef.setup_class
     def setup_class(cls, space, w_cls):
         w_stdin = space.send(w_cls, "new", [space.newint(0)])
@@ -88,7 +321,7 @@ class W_IOObject(W_Object):
             raise space.error(space.w_NotImplementedError, "options hash for IO.new")
         if mode is None:
             mode = "r"
-        self.fd = fd
+        self.set_fd(fd)
         return self
 
     @classdef.method("read")
@@ -102,51 +335,178 @@ class W_IOObject(W_Object):
                 )
         else:
             length = -1
-        read_bytes = 0
-        read_chunks = []
-        while length < 0 or read_bytes < length:
-            if length > 0:
-                max_read = int(length - read_bytes)
-            else:
-                max_read = 8192
-            try:
-                current_read = os.read(self.fd, max_read)
-            except OSError as e:
-                raise error_for_oserror(space, e)
-            if len(current_read) == 0:
-                break
-            read_bytes += len(current_read)
-            read_chunks += current_read
+        w_buffer = self.convert_outbuf(space, w_str)
+        read_str = self.read_str(space, length)
+        if w_buffer is not None:
+            w_buffer.replace(space, [c for c in read_str])
         # Return nil on EOF if length is given
-        if read_bytes == 0:
+        if not read_str:
             return space.w_nil
-        w_read_str = space.newstr_fromchars(read_chunks)
-        if w_str is not None:
-            w_str.clear(space)
-            w_str.extend(space, w_read_str)
-            return w_str
-        else:
-            return w_read_str
+        if w_buffer is not None:
+            return w_buffer
+        return space.newstr_fromstr(read_str)
 
     @classdef.method("write")
     def method_write(self, space, w_str):
         self.ensure_not_closed(space)
         string = space.str_w(space.send(w_str, "to_s"))
+        self.write_str(space, string)
+        return space.newint(len(string))
+
+    def set_nonblocking(self, space):
+        try:
+            flags = rposix.get_status_flags(self.fd)
+            if not flags & os.O_NONBLOCK:
+                rposix.set_status_flags(self.fd, flags | os.O_NONBLOCK)
+        except OSError as e:
+            raise error_for_oserror(space, e)
+
+    def convert_outbuf(self, space, w_buffer):
+        # The optional buffer the read family stores its result in.
+        if w_buffer is None or w_buffer is space.w_nil:
+            return None
+        w_str = space.convert_type(w_buffer, space.w_string, "to_str")
+        assert isinstance(w_str, W_StringObject)
+        if space.is_true(w_str.get_flag(space, "frozen?")):
+            raise space.error(space.w_RuntimeError, "can't modify frozen String")
+        return w_str
+
+    def would_block_error(self, space, name, msg):
+        return space.error(
+            space.find_const(space.getclassfor(W_IOObject), name),
+            "Resource temporarily unavailable - %s" % msg,
+            [space.newint(errno.EAGAIN)]
+        )
+
+    @classdef.method("read_nonblock", maxlen="int")
+    def method_read_nonblock(self, space, maxlen, w_str=None):
+        self.ensure_not_closed(space)
+        if maxlen < 0:
+            raise space.error(space.w_ArgumentError,
+                "negative length %d given" % maxlen
+            )
+        w_buffer = self.convert_outbuf(space, w_str)
+        start = self.read_pos
+        if start < len(self.read_buffer):
+            end = min(len(self.read_buffer), start + maxlen)
+            assert start >= 0
+            assert end >= start
+            data = self.read_buffer[start:end]
+            self.read_pos = end
+        else:
+            self.flush_buffer(space)
+            self.set_nonblocking(space)
+            try:
+                data = os.read(self.fd, maxlen)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    raise self.would_block_error(space, "EAGAINWaitReadable", "read would block")
+                raise error_for_oserror(space, e)
+            if not data and maxlen > 0:
+                raise space.error(space.w_EOFError, "end of file reached")
+        if w_buffer is not None:
+            w_buffer.replace(space, [c for c in data])
+            return w_buffer
+        return space.newstr_fromstr(data)
+
+    @classdef.method("write_nonblock")
+    def method_write_nonblock(self, space, w_str):
+        self.ensure_not_closed(space)
+        string = space.str_w(space.send(w_str, "to_s"))
+        self.flush_buffer(space)
+        self.set_nonblocking(space)
         try:
-            bytes_written = os.write(self.fd, string)
+            written = os.write(self.fd, string)
         except OSError as e:
+            if e.errno == errno.EAGAIN:
+                raise self.would_block_error(space, "EAGAINWaitWritable", "write would block")
             raise error_for_oserror(space, e)
-        return space.newint(bytes_written)
+        return space.newint(written)
+
+    @classdef.singleton_method("select")
+    def method_select(self, space, w_read, w_write=None, w_error=None, w_timeout=None):
+        ios_w = []
+        events = []
+        for i, w_ios in enumerate([w_read, w_write, w_error]):
+            if w_ios is None or w_ios is space.w_nil:
+                continue
+            for w_obj in space.listview(space.convert_type(w_ios, space.w_array, "to_ary")):
+                w_io = space.convert_type(w_obj, space.w_io, "to_io")
+                assert isinstance(w_io, W_IOObject)
+                w_io.ensure_not_closed(space)
+                ios_w.append(w_io)
+                events.append([rpoll.POLLIN, rpoll.POLLOUT, rpoll.POLLPRI][i])
+        if w_timeout is None or w_timeout is space.w_nil:
+            timeout = -1.0
+        else:
+            timeout = space.float_w(w_timeout)
+            if timeout < 0:
+                raise space.error(space.w_ArgumentError, "time interval must be positive")
+        deadline = time.time() + timeout
+        fds = {}
+        for i, w_io in enumerate(ios_w):
+            fds[w_io.fd] = fds.get(w_io.fd, 0) | events[i]
+        scheduler = space.fromcache(Scheduler)
+        while True:
+            ready = {}
+            try:
+                for fd, revents in rpoll.poll(fds, 0):
+                    ready[fd] = revents
+            except rpoll.PollError as e:
+                raise error_for_errno(space, e.errno)
+            results_w = [[], [], []]
+            found = False
+            for i, w_io in enumerate(ios_w):
+                revents = ready.get(w_io.fd, 0)
+                if events[i] == rpoll.POLLIN:
+                    # Buffered input can be read without touching the fd.
+                    if (revents & (rpoll.POLLIN | rpoll.POLLHUP | rpoll.POLLERR) or
+                        w_io.read_pos < len(w_io.read_buffer)):
+                        results_w[0].append(w_io)
+                        found = True
+                elif events[i] == rpoll.POLLOUT:
+                    if revents & (rpoll.POLLOUT | rpoll.POLLHUP | rpoll.POLLERR):
+                        results_w[1].append(w_io)
+                        found = True
+                elif revents & rpoll.POLLPRI:
+                    results_w[2].append(w_io)
+                    found = True
+            if found:
+                return space.newarray([space.newarray(res_w) for res_w in results_w])
+            remaining = -1.0
+            if timeout >= 0:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return space.w_nil
+            scheduler.wait_for(space, fds, remaining)
 
     @classdef.method("flush")
     def method_flush(self, space):
-        # We have no internal buffers to flush!
         self.ensure_not_closed(space)
+        self.flush_buffer(space)
         return self
 
+    @classdef.method("sync")
+    def method_sync(self, space):
+        self.ensure_not_closed(space)
+        return space.newbool(self.sync)
+
+    @classdef.method("sync=")
+    def method_set_sync(self, space, w_sync):
+        self.ensure_not_closed(space)
+        self.sync = space.is_true(w_sync)
+        if self.sync:
+            self.flush_buffer(space)
+        return w_sync
+
     @classdef.method("seek", amount="int", whence="int")
     def method_seek(self, space, amount, whence=os.SEEK_SET):
         self.ensure_not_closed(space)
+        self.flush_buffer(space)
+        if whence == os.SEEK_CUR:
+            amount -= len(self.read_buffer) - self.read_pos
+        self.read_buffer = ""
+        self.read_pos = 0
         os.lseek(self.fd, amount, whence)
         return space.newint(0)
 
@@ -154,13 +514,18 @@ class W_IOObject(W_Object):
     @classdef.method("tell")
     def method_pos(self, space):
         self.ensure_not_closed(space)
+        self.flush_buffer(space)
+        pos = os.lseek(self.fd, 0, os.SEEK_CUR) - (len(self.read_buffer) - self.read_pos)
         # TODO: this currently truncates large values, switch this to use a
         # Bignum in those cases
-        return space.newint(int(os.lseek(self.fd, 0, os.SEEK_CUR)))
+        return space.newint(int(pos))
 
     @classdef.method("rewind")
     def method_rewind(self, space):
         self.ensure_not_closed(space)
+        self.flush_buffer(space)
+        self.read_buffer = ""
+        self.read_pos = 0
         os.lseek(self.fd, 0, os.SEEK_SET)
         return space.newint(0)
 
@@ -182,20 +547,52 @@ class W_IOObject(W_Object):
         else:
             end = ""
         strings = [space.str_w(space.send(w_arg, "to_s")) for w_arg in args_w]
-        os.write(self.fd, sep.join(strings))
-        os.write(self.fd, end)
+        self.write_str(space, sep.join(strings) + end)
         return space.w_nil
 
+    @classdef.method("gets")
+    def method_gets(self, space, w_sep=None, w_limit=None):
+        self.ensure_not_closed(space)
+        sep, limit = self._getline_args(space, w_sep, w_limit)
+        line = self.getline(space, sep, limit)
+        if line is None:
+            w_line = space.w_nil
+        else:
+            w_line = space.newstr_fromstr(line)
+        space.globals.set(space, "$_", w_line)
+        return w_line
+
+    @classdef.method("each_line")
+    @classdef.method("each")
+    @classdef.method("lines")
+    def method_each_line(self, space, w_sep=None, w_limit=None, block=None):
+        if block is None:
+            args_w = [space.newsymbol("each_line")]
+            if w_sep is not None:
+                args_w.append(w_sep)
+            if w_limit is not None:
+                args_w.append(w_limit)
+            return space.send(self, "enum_for", args_w)
+        sep, limit = self._getline_args(space, w_sep, w_limit)
+        if limit == 0:
+            raise space.error(space.w_ArgumentError, "invalid limit: 0 for each_line")
+        while True:
+            self.ensure_not_closed(space)
+            line = self.getline(space, sep, limit)
+            if line is None:
+                break
+            space.invoke_block(block, [space.newstr_fromstr(line)])
+        return self
+
     @classdef.method("getc")
     def method_getc(self, space):
         self.ensure_not_closed(space)
-        try:
-            c = os.read(self.fd, 1)
-        except OSError as e:
-            raise error_for_oserror(space, e)
-        if not c:
-            return space.w_nil
-        return space.newstr_fromstr(c)
+        if self.read_pos >= len(self.read_buffer):
+            if not self._fill_read_buffer(space):
+                return space.w_nil
+        pos = self.read_pos
+        self.read_pos = pos + 1
+        return space.newstr_fromstr(self.read_buffer[pos:pos + 1])
 
     @classdef.singleton_method("pipe")
     def method_pipe(self, space, block=None):
@@ -204,6 +601,8 @@ class W_IOObject(W_Object):
             space.send(self, "new", [space.newint(r)]),
             space.send(self, "new", [space.newint(w)])
         ]
+        # As in MRI, writes to a pipe aren't buffered.
+        space.send(pipes_w[1], "sync=", [space.w_true])
         if block is not None:
             try:
                 return space.invoke_block(block, pipes_w)
@@ -224,6 +623,10 @@ class W_IOObject(W_Object):
             w_io = space.send(space.getclassfor(W_FileObject), "new", args)
         assert isinstance(w_io, W_IOObject)
         w_io.ensure_not_closed(space)
+        self.flush_buffer(space)
+        w_io.flush_buffer(space)
+        self.read_buffer = ""
+        self.read_pos = 0
         os.close(self.fd)
         os.dup2(w_io.getfd(), self.fd)
         return self
@@ -241,8 +644,11 @@ class W_IOObject(W_Object):
     @classdef.method("close")
     def method_close(self, space):
         self.ensure_not_closed(space)
-        os.close(self.fd)
-        self.fd = -1
+        try:
+            self.flush_buffer(space)
+        finally:
+            os.close(self.fd)
+            self.set_fd(-1)
         return self
 
     @classdef.method("closed?")
@@ -252,6 +658,7 @@ class W_IOObject(W_Object):
     @classdef.method("stat")
     def method_stat(self, space):
         from topaz.objects.fileobject import W_FileStatObject
+        self.flush_buffer(space)
         try:
             stat_val = os.fstat(self.fd)
         except OSError as e:
@@ -9,6 +9,7 @@ from topaz.module import ClassDef, check_frozen
 from topaz.objects.functionobject import W_FunctionObject
 from topaz.objects.objectobject import W_RootObject
 from topaz.objects.procobject import W_ProcObject
+from topaz.optimizer import GUARDED_METHODS, ConstantFoldingGuard
 from topaz.scope import StaticScope
 
 
@@ -141,12 +142,22 @@ class W_ModuleObject(W_RootObject):
     def mutated(self):
         self.version = VersionTag()
 
+    def methods_mutated(self):
+        # Inline caches only check the receiver's class version, so a change
+        # to the methods here has to invalidate every class that inherits or
+        # includes this module.
+        self.mutated()
+        for w_mod in self.descendants:
+            w_mod.methods_mutated()
+
     def define_method(self, space, name, method):
         if (name == "initialize" or name == "initialize_copy" or
             method.visibility == W_FunctionObject.MODULE_FUNCTION):
             method.update_visibility(W_FunctionObject.PRIVATE)
-        self.mutated()
+        self.methods_mutated()
         self.methods_w[name] = method
+        if name in GUARDED_METHODS:
+            space.fromcache(ConstantFoldingGuard).methods_changed(space)
         if not space.bootstrap:
             if isinstance(method, UndefMethod):
                 self.method_undefined(space, space.newsymbol(name))
@@ -321,6 +332,8 @@ class W_ModuleObject(W_RootObject):
         assert isinstance(w_mod, W_ModuleObject)
         if w_mod not in self.ancestors():
             self.included_modules = [w_mod] + self.included_modules
+            self.methods_mutated()
+            space.fromcache(ConstantFoldingGuard).methods_changed(space)
             w_mod.included(space, self)
 
     def included(self, space, w_mod):
@@ -332,6 +345,8 @@ class W_ModuleObject(W_RootObject):
         if self not in w_mod.ancestors():
             self.descendants.append(w_mod)
             w_mod.included_modules = [self] + w_mod.included_modules
+            w_mod.methods_mutated()
+            space.fromcache(ConstantFoldingGuard).methods_changed(space)
 
     def set_visibility(self, space, names_w, visibility):
         names = [space.symbol_w(w_name) for w_name in names_w]
@@ -781,7 +796,9 @@ class W_ModuleObject(W_RootObject):
                 "method `%s' not defined in %s" % (name, cls_name)
             )
         del self.methods_w[name]
-        self.mutated()
+        self.methods_mutated()
+        if name in GUARDED_METHODS:
+            space.fromcache(ConstantFoldingGuard).methods_changed(space)
         self.method_removed(space, space.newsymbol(name))
         return self
 
@@ -0,0 +1,104 @@
+import copy
+import time
+
+from rpython.rlib.rfloat import round_double
+
+from topaz.module import ClassDef
+from topaz.objects.objectobject import W_Object
+from topaz.scheduler import Scheduler
+
+
+class W_MutexObject(W_Object):
+    classdef = ClassDef("Mutex", W_Object.classdef)
+
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass)
+        self.w_owner = None
+        self.waiting_w = []
+
+    def __deepcopy__(self, memo):
+        obj = super(W_MutexObject, self).__deepcopy__(memo)
+        obj.w_owner = copy.deepcopy(self.w_owner, memo)
+        obj.waiting_w = copy.deepcopy(self.waiting_w, memo)
+        return obj
+
+    def acquire(self, space):
+        scheduler = space.fromcache(Scheduler)
+        w_current = scheduler.get_current(space)
+        if self.w_owner is w_current:
+            raise space.error(space.w_ThreadError, "deadlock; recursive locking")
+        while self.w_owner is not None:
+            self.waiting_w.append(w_current)
+            try:
+                scheduler.block(space)
+            finally:
+                if w_current in self.waiting_w:
+                    self.waiting_w.remove(w_current)
+        self.w_owner = w_current
+        w_current.mutexes_w.append(self)
+
+    def release(self, space):
+        w_owner = self.w_owner
+        if w_owner is None:
+            raise space.error(space.w_ThreadError, "Attempt to unlock a mutex which is not locked")
+        if w_owner is not space.fromcache(Scheduler).get_current(space):
+            raise space.error(space.w_ThreadError,
+                "Attempt to unlock a mutex which is locked by another thread"
+            )
+        w_owner.mutexes_w.remove(self)
+        self.w_owner = None
+        if self.waiting_w:
+            space.fromcache(Scheduler).wake(space, self.waiting_w.pop(0))
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_MutexObject(space, self)
+
+    @classdef.method("lock")
+    def method_lock(self, space):
+        self.acquire(space)
+        return self
+
+    @classdef.method("unlock")
+    def method_unlock(self, space):
+        self.release(space)
+        return self
+
+    @classdef.method("try_lock")
+    def method_try_lock(self, space):
+        if self.w_owner is not None:
+            return space.w_false
+        self.acquire(space)
+        return space.w_true
+
+    @classdef.method("locked?")
+    def method_lockedp(self, space):
+        return space.newbool(self.w_owner is not None)
+
+    @classdef.method("owned?")
+    def method_ownedp(self, space):
+        return space.newbool(self.w_owner is space.fromcache(Scheduler).get_current(space))
+
+    @classdef.method("synchronize")
+    def method_synchronize(self, space, block):
+        if block is None:
+            raise space.error(space.w_ThreadError, "must be called with a block")
+        self.acquire(space)
+        try:
+            return space.invoke_block(block, [])
+        finally:
+            self.release(space)
+
+    @classdef.method("sleep")
+    def method_sleep(self, space, w_timeout=None):
+        if w_timeout is None or w_timeout is space.w_nil:
+            timeout = -1.0
+        else:
+            timeout = space.float_w(w_timeout)
+        start = time.time()
+        self.release(space)
+        try:
+            space.fromcache(Scheduler).sleep(space, timeout)
+        finally:
+            self.acquire(space)
+        return space.newint(int(round_double(time.time() - start, 0)))
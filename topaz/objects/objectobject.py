@@ -196,6 +196,16 @@ class W_Object(W_RootObject):
         assert isinstance(w_other, W_Object)
         w_other.map.copy_attrs(space, w_other, self)
 
+    def instance_variable_names(self):
+        names = []
+        node = self.map
+        while node is not None:
+            if isinstance(node, mapdict.AttributeNode):
+                names.append(node.name)
+            node = node.getprev()
+        names.reverse()
+        return names
+
     def get_flag(self, space, name):
         node = jit.promote(self.map).find(mapdict.FlagNode, name)
         return space.w_false if node is None else node.read(space, self)
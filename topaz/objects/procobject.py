@@ -1,7 +1,26 @@
+from rpython.rlib import jit
+
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_Object
 
 
+def block_jitdriver(name):
+    """
+    A JitDriver for a builtin method that loops over a block, green on the
+    block's bytecode so each block gets its own loop.
+    """
+    def get_printable_location(block_bytecode):
+        return "%s with block %s" % (name, block_bytecode.name)
+
+    return jit.JitDriver(
+        name=name,
+        greens=["block_bytecode"],
+        reds="auto",
+        get_printable_location=get_printable_location,
+        check_untranslated=False
+    )
+
+
 class W_ProcObject(W_Object):
     classdef = ClassDef("Proc", W_Object.classdef)
 
@@ -0,0 +1,69 @@
+import copy
+
+from topaz.module import ClassDef
+from topaz.objects.objectobject import W_Object
+from topaz.scheduler import Scheduler
+
+
+class W_QueueObject(W_Object):
+    classdef = ClassDef("Queue", W_Object.classdef)
+
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass)
+        self.items_w = []
+        self.waiting_w = []
+
+    def __deepcopy__(self, memo):
+        obj = super(W_QueueObject, self).__deepcopy__(memo)
+        obj.items_w = copy.deepcopy(self.items_w, memo)
+        obj.waiting_w = copy.deepcopy(self.waiting_w, memo)
+        return obj
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_QueueObject(space, self)
+
+    @classdef.method("push")
+    @classdef.method("<<")
+    @classdef.method("enq")
+    def method_push(self, space, w_obj):
+        self.items_w.append(w_obj)
+        if self.waiting_w:
+            space.fromcache(Scheduler).wake(space, self.waiting_w.pop(0))
+        return self
+
+    @classdef.method("pop")
+    @classdef.method("shift")
+    @classdef.method("deq")
+    def method_pop(self, space, w_non_block=None):
+        non_block = w_non_block is not None and space.is_true(w_non_block)
+        scheduler = space.fromcache(Scheduler)
+        while not self.items_w:
+            if non_block:
+                raise space.error(space.w_ThreadError, "queue empty")
+            w_current = scheduler.get_current(space)
+            self.waiting_w.append(w_current)
+            try:
+                scheduler.block(space)
+            finally:
+                if w_current in self.waiting_w:
+                    self.waiting_w.remove(w_current)
+        return self.items_w.pop(0)
+
+    @classdef.method("size")
+    @classdef.method("length")
+    def method_size(self, space):
+        return space.newint(len(self.items_w))
+
+    @classdef.method("empty?")
+    def method_emptyp(self, space):
+        return space.newbool(not self.items_w)
+
+    @classdef.method("clear")
+    def method_clear(self, space):
+        del self.items_w[:]
+        return self
+
+    @classdef.method("num_waiting")
+    def method_num_waiting(self, space):
+        return space.newint(len(self.waiting_w))
@@ -1,6 +1,29 @@
 from topaz.module import ClassDef
+from topaz.modules import enumerable
 from topaz.modules.enumerable import Enumerable
+from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.objectobject import W_Object
+from topaz.objects.procobject import block_jitdriver
+
+
+each_driver = block_jitdriver("Range#each")
+
+
+class FixnumRangeIterator(enumerable.ItemIterator):
+    def __init__(self, start, end):
+        self.current = start
+        self.end = end
+        self.done = start > end
+
+    def next(self, space):
+        if self.done:
+            return None
+        w_item = space.newint(self.current)
+        if self.current == self.end:
+            self.done = True
+        else:
+            self.current += 1
+        return w_item
 
 
 class W_RangeObject(W_Object):
@@ -39,3 +62,113 @@ class W_RangeObject(W_Object):
     @classdef.method("exclude_end?")
     def method_exclude_end(self, space):
         return space.newbool(self.exclusive)
+
+    @classdef.method("each")
+    def method_each(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for")
+        w_start = self.w_start
+        w_end = self.w_end
+        if not space.respond_to(w_start, "succ"):
+            raise space.error(space.w_TypeError,
+                "can't iterate from %s" % space.obj_to_s(space.getnonsingletonclass(w_start))
+            )
+        if isinstance(w_start, W_FixnumObject) and isinstance(w_end, W_FixnumObject):
+            i = space.int_w(w_start)
+            end = space.int_w(w_end)
+            if self.exclusive:
+                end -= 1
+            while i <= end:
+                each_driver.jit_merge_point(block_bytecode=block.bytecode)
+                space.invoke_block(block, [space.newint(i)])
+                if i == end:
+                    break
+                i += 1
+        elif space.is_kind_of(w_start, space.w_string):
+            space.send(w_start, "upto", [w_end, space.newbool(self.exclusive)], block)
+        elif space.is_kind_of(w_start, space.w_symbol):
+            w_strs = space.send(
+                space.send(w_start, "to_s"), "upto",
+                [space.send(w_end, "to_s"), space.newbool(self.exclusive)]
+            )
+            for w_str in space.listview(space.send(w_strs, "to_a")):
+                space.invoke_block(block, [space.send(w_str, "to_sym")])
+        else:
+            w_zero = space.newint(0)
+            cmp = "<" if self.exclusive else "<="
+            w_i = w_start
+            while space.is_true(space.send(space.send(w_i, "<=>", [w_end]), cmp, [w_zero])):
+                space.invoke_block(block, [w_i])
+                w_i = space.send(w_i, "succ")
+        return self
+
+    def _item_iterator(self, space):
+        # Only ranges of Fixnums are walked directly, everything else goes
+        # through #each.
+        if space.getclass(self) is not space.getclassfor(W_RangeObject):
+            return None
+        if not isinstance(self.w_start, W_FixnumObject) or not isinstance(self.w_end, W_FixnumObject):
+            return None
+        end = space.int_w(self.w_end)
+        if self.exclusive:
+            end -= 1
+        return FixnumRangeIterator(space.int_w(self.w_start), end)
+
+    @classdef.method("map")
+    @classdef.method("collect")
+    def method_map(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("map")])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.getclassfor(W_RangeObject), self, "map", [], block)
+        return enumerable.iter_map(space, it, block)
+
+    @classdef.method("select")
+    @classdef.method("find_all")
+    def method_select(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("select")])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.getclassfor(W_RangeObject), self, "select", [], block)
+        return enumerable.iter_select(space, it, block)
+
+    @classdef.method("reject")
+    def method_reject(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("reject")])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.getclassfor(W_RangeObject), self, "reject", [], block)
+        return enumerable.iter_reject(space, it, block)
+
+    @classdef.method("inject")
+    @classdef.method("reduce")
+    def method_inject(self, space, args_w, block):
+        it = self._item_iterator(space)
+        w_res = None
+        if it is not None:
+            w_res = enumerable.iter_inject(space, it, args_w, block)
+        if w_res is None:
+            return space.send_super(space.getclassfor(W_RangeObject), self, "inject", args_w, block)
+        return w_res
+
+    @classdef.method("each_with_index")
+    def method_each_with_index(self, space, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_with_index")])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.getclassfor(W_RangeObject), self, "each_with_index", [], block)
+        enumerable.iter_each_with_index(space, it, block)
+        return self
+
+    @classdef.method("each_slice")
+    def method_each_slice(self, space, w_num, block):
+        if block is None:
+            return space.send(self, "enum_for", [space.newsymbol("each_slice"), w_num])
+        it = self._item_iterator(space)
+        if it is None:
+            return space.send_super(space.getclassfor(W_RangeObject), self, "each_slice", [w_num], block)
+        return enumerable.iter_each_slice(space, it, w_num, block)
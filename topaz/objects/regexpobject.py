@@ -1,5 +1,7 @@
+from rpython.rlib import jit
 from rpython.rlib.rsre import rsre_core
 
+from topaz.celldict import VersionTag
 from topaz.coerce import Coerce
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_Object
@@ -31,19 +33,115 @@ RE_ESCAPE_TABLE[ord("|")] = "\\|"
 RE_ESCAPE_TABLE[ord("}")] = "\\}"
 
 
+class RegexpCacheEntry(object):
+    _immutable_fields_ = ["key", "compiled_regexp"]
+
+    def __init__(self, key, compiled_regexp):
+        self.key = key
+        self.compiled_regexp = compiled_regexp
+        self.prev = None
+        self.next = None
+
+
 class RegexpCache(object):
-    # TODO: this should use an LRU cache, and be elidable for the JIT.
+    # A size-bounded LRU cache of compiled regexps, keyed on (pattern, flags).
+    # Entries are kept in a doubly linked list, most recently used first.
+    # Finding an entry is elidable on the version, which changes whenever an
+    # entry is added or evicted, so the JIT can fold the lookup of a constant
+    # pattern; what's left is moving the entry to the front, which is only a
+    # comparison when the same regexp is used repeatedly, and the counters.
+    _immutable_fields_ = ["version?"]
+
+    DEFAULT_LIMIT = 256
+
     def __init__(self, space):
         self._contents = {}
+        self.version = VersionTag()
+        self.limit = self.DEFAULT_LIMIT
+        self.newest = None
+        self.oldest = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _mutated(self):
+        self.version = VersionTag()
 
-    def contains(self, pattern, flags):
-        return (pattern, flags) in self._contents
+    @jit.elidable
+    def _lookup_pure(self, pattern, flags, version):
+        return self._contents.get((pattern, flags), None)
 
     def get(self, pattern, flags):
-        return self._contents[pattern, flags]
+        """
+        Returns the entry for the pattern, or None.
+        """
+        entry = self._lookup_pure(pattern, flags, self.version)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if entry is not self.newest:
+            self._unlink(entry)
+            self._push(entry)
+        return entry
 
     def set(self, pattern, flags, compiled_regexp):
-        self._contents[pattern, flags] = compiled_regexp
+        """
+        Returns a new entry for the compiled regexp, which is only kept if
+        the limit allows it.
+        """
+        key = (pattern, flags)
+        entry = RegexpCacheEntry(key, compiled_regexp)
+        if self.limit <= 0:
+            return entry
+        old_entry = self._contents.get(key, None)
+        if old_entry is not None:
+            self._unlink(old_entry)
+        else:
+            self._evict(self.limit - 1)
+        self._contents[key] = entry
+        self._push(entry)
+        self._mutated()
+        return entry
+
+    def size(self):
+        return len(self._contents)
+
+    def set_limit(self, limit):
+        self.limit = limit
+        self._evict(limit)
+
+    def _push(self, entry):
+        entry.prev = None
+        entry.next = self.newest
+        if self.newest is not None:
+            self.newest.prev = entry
+        else:
+            self.oldest = entry
+        self.newest = entry
+
+    def _unlink(self, entry):
+        if entry.prev is not None:
+            entry.prev.next = entry.next
+        else:
+            self.newest = entry.next
+        if entry.next is not None:
+            entry.next.prev = entry.prev
+        else:
+            self.oldest = entry.prev
+        entry.prev = None
+        entry.next = None
+
+    def _evict(self, limit):
+        if len(self._contents) <= limit:
+            return
+        while len(self._contents) > max(limit, 0):
+            entry = self.oldest
+            assert entry is not None
+            self._unlink(entry)
+            del self._contents[entry.key]
+            self.evictions += 1
+        self._mutated()
 
 
 class W_RegexpObject(W_Object):
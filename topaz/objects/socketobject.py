@@ -0,0 +1,588 @@
+import errno
+
+from rpython.rlib import rpoll, rsocket
+from rpython.rlib.buffer import Buffer
+
+from topaz.error import RubyError, error_for_errno
+from topaz.module import ClassDef
+from topaz.objects.exceptionobject import W_SocketError
+from topaz.objects.ioobject import W_IOObject
+from topaz.objects.stringobject import W_StringObject
+from topaz.objects.symbolobject import W_SymbolObject
+from topaz.scheduler import Scheduler
+
+
+SOCKET_CONSTANTS = [
+    "AF_INET", "AF_INET6", "AF_UNIX", "AF_UNSPEC", "PF_INET", "PF_INET6",
+    "PF_UNIX", "PF_UNSPEC", "SOCK_STREAM", "SOCK_DGRAM", "SOL_SOCKET",
+    "SO_REUSEADDR", "SO_REUSEPORT", "SO_KEEPALIVE", "SO_RCVBUF", "SO_SNDBUF",
+    "SO_ERROR", "SO_LINGER", "SO_BROADCAST", "IPPROTO_IP", "IPPROTO_TCP",
+    "IPPROTO_UDP", "TCP_NODELAY", "SOMAXCONN", "SHUT_RD", "SHUT_WR",
+    "SHUT_RDWR", "MSG_PEEK", "MSG_DONTWAIT", "MSG_OOB", "MSG_WAITALL",
+    "AI_PASSIVE", "AI_CANONNAME", "AI_NUMERICHOST",
+]
+
+# rsocket.constants also holds a few non-integer values, which would make the
+# dict unusable from RPython.
+INT_CONSTANTS = dict([
+    (name, value) for name, value in rsocket.constants.iteritems()
+    if isinstance(value, int)
+])
+
+# The prefixes a level or option name given as a Symbol may omit.
+LEVEL_PREFIXES = ["SOL_", "IPPROTO_"]
+OPTION_PREFIXES = {
+    rsocket.SOL_SOCKET: "SO_",
+    rsocket.IPPROTO_TCP: "TCP_",
+    rsocket.IPPROTO_IP: "IP_",
+}
+
+FAMILY_NAMES = {
+    rsocket.AF_INET: "AF_INET",
+    rsocket.AF_INET6: "AF_INET6",
+    rsocket.AF_UNIX: "AF_UNIX",
+}
+
+
+def error_for_socket_error(space, e):
+    if isinstance(e, rsocket.CSocketError):
+        return error_for_errno(space, e.errno)
+    if isinstance(e, rsocket.GAIError):
+        return space.error(space.getclassfor(W_SocketError), "getaddrinfo: %s" % e.get_msg())
+    return space.error(space.getclassfor(W_SocketError), e.get_msg())
+
+
+def is_would_block(e):
+    return (isinstance(e, rsocket.CSocketError) and
+        (e.errno == errno.EAGAIN or e.errno == errno.EWOULDBLOCK))
+
+
+def socket_constant(space, w_obj, prefixes):
+    if isinstance(w_obj, W_SymbolObject) or isinstance(w_obj, W_StringObject):
+        name = space.str_w(space.send(w_obj, "to_s"))
+        for prefix in [""] + prefixes:
+            value = INT_CONSTANTS.get(prefix + name, -1)
+            if value >= 0:
+                return value
+        raise space.error(space.getclassfor(W_SocketError), "unknown socket constant: %s" % name)
+    return space.int_w(w_obj)
+
+
+def port_string(space, w_port):
+    if w_port is space.w_nil:
+        return "0"
+    if isinstance(w_port, W_StringObject):
+        return space.str_w(w_port)
+    return str(space.int_w(w_port))
+
+
+def host_string(space, w_host):
+    if w_host is space.w_nil:
+        return None
+    host = space.str_w(w_host)
+    if host == "":
+        return None
+    return host
+
+
+class CharListBuffer(Buffer):
+    """
+    Lets rsocket receive into the character list of a mutable String.
+    """
+
+    _immutable_ = True
+
+    def __init__(self, chars):
+        self.chars = chars
+        self.readonly = False
+
+    def getlength(self):
+        return len(self.chars)
+
+    def getitem(self, index):
+        return self.chars[index]
+
+    def setitem(self, index, char):
+        self.chars[index] = char
+
+    def get_raw_address(self):
+        raise ValueError
+
+
+class W_BasicSocketObject(W_IOObject):
+    classdef = ClassDef("BasicSocket", W_IOObject.classdef)
+
+    def __init__(self, space, klass=None):
+        W_IOObject.__init__(self, space, klass)
+        self.sock = None
+
+    def __del__(self):
+        # The RSocket owns the fd and closes it itself.
+        pass
+
+    def __deepcopy__(self, memo):
+        obj = super(W_BasicSocketObject, self).__deepcopy__(memo)
+        obj.sock = self.sock
+        return obj
+
+    def set_socket(self, sock):
+        self.sock = sock
+        self.set_fd(sock.fd)
+        # As in MRI, writes to a socket aren't buffered.
+        self.sync = True
+
+    def getsocket(self, space):
+        self.ensure_not_closed(space)
+        sock = self.sock
+        if sock is None:
+            raise space.error(space.w_IOError, "uninitialized stream")
+        return sock
+
+    def connect_socket(self, space, sock, addr):
+        scheduler = space.fromcache(Scheduler)
+        if scheduler.is_cooperative(space):
+            sock.setblocking(False)
+            err = sock.connect_ex(addr)
+            if err == errno.EINPROGRESS:
+                while not scheduler.fd_ready(sock.fd, rpoll.POLLOUT):
+                    scheduler.wait_for(space, {sock.fd: rpoll.POLLOUT}, -1.0)
+                err = sock.getsockopt_int(rsocket.SOL_SOCKET, rsocket.SO_ERROR)
+            sock.setblocking(True)
+        else:
+            err = sock.connect_ex(addr)
+        if err:
+            raise error_for_errno(space, err)
+
+    def accept_socket(self, space, nonblock):
+        sock = self.getsocket(space)
+        scheduler = space.fromcache(Scheduler)
+        if nonblock:
+            sock.setblocking(False)
+        while True:
+            if not nonblock:
+                scheduler.wait_readable(space, self.fd)
+            try:
+                fd, addr = sock.accept()
+            except rsocket.SocketError as e:
+                if not is_would_block(e):
+                    raise error_for_socket_error(space, e)
+                if nonblock:
+                    raise self.would_block_error(space, "EAGAINWaitReadable", "accept(2) would block")
+                # Another thread took the connection.
+                scheduler.wait_for(space, {self.fd: rpoll.POLLIN}, -1.0)
+            else:
+                w_sock = self.new_accepted(space)
+                w_sock.set_socket(rsocket.make_socket(fd, sock.family, sock.type, sock.proto))
+                return w_sock
+
+    def new_accepted(self, space):
+        raise NotImplementedError
+
+    def recv_into(self, space, chars, maxlen, flags, nonblock):
+        # Replaces the contents of chars with up to maxlen received bytes,
+        # reusing the list's storage.
+        sock = self.getsocket(space)
+        if maxlen < 0:
+            raise space.error(space.w_ArgumentError,
+                "negative length %d given" % maxlen
+            )
+        start = self.read_pos
+        if start < len(self.read_buffer):
+            end = min(len(self.read_buffer), start + maxlen)
+            del chars[:]
+            for i in xrange(start, end):
+                chars.append(self.read_buffer[i])
+            self.read_pos = end
+            return
+        self.flush_buffer(space)
+        scheduler = space.fromcache(Scheduler)
+        if nonblock:
+            flags |= rsocket.MSG_DONTWAIT
+        while len(chars) < maxlen:
+            chars.append("\0")
+        while True:
+            if not nonblock:
+                scheduler.wait_readable(space, self.fd)
+            try:
+                received = sock.recvinto(CharListBuffer(chars), maxlen, flags)
+            except rsocket.SocketError as e:
+                if not is_would_block(e):
+                    del chars[:]
+                    raise error_for_socket_error(space, e)
+                if nonblock:
+                    del chars[:]
+                    raise self.would_block_error(space, "EAGAINWaitReadable", "recvfrom(2) would block")
+                scheduler.wait_for(space, {self.fd: rpoll.POLLIN}, -1.0)
+            else:
+                assert received >= 0
+                del chars[received:]
+                return
+
+    def send_str(self, space, data, flags):
+        sock = self.getsocket(space)
+        self.flush_buffer(space)
+        scheduler = space.fromcache(Scheduler)
+        if scheduler.is_cooperative(space):
+            # Only send what fits, instead of blocking everything else.
+            flags |= rsocket.MSG_DONTWAIT
+        while True:
+            try:
+                return sock.send(data, flags)
+            except rsocket.SocketError as e:
+                if not is_would_block(e):
+                    raise error_for_socket_error(space, e)
+                scheduler.wait_for(space, {self.fd: rpoll.POLLOUT}, -1.0)
+
+    def address_w(self, space, addr):
+        raise NotImplementedError
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_BasicSocketObject(space, self)
+
+    @classdef.method("initialize")
+    def method_initialize(self, space, args_w):
+        raise space.error(space.w_NotImplementedError, "BasicSocket.new")
+
+    @classdef.method("close")
+    def method_close(self, space):
+        sock = self.getsocket(space)
+        try:
+            self.flush_buffer(space)
+        finally:
+            self.set_fd(-1)
+            try:
+                sock.close()
+            except rsocket.SocketError as e:
+                raise error_for_socket_error(space, e)
+        return space.w_nil
+
+    @classdef.method("setsockopt")
+    def method_setsockopt(self, space, w_level, w_optname, w_value):
+        sock = self.getsocket(space)
+        level = socket_constant(space, w_level, LEVEL_PREFIXES)
+        prefix = OPTION_PREFIXES.get(level, "")
+        optname = socket_constant(space, w_optname, [prefix] if prefix else [])
+        try:
+            if w_value is space.w_true or w_value is space.w_false:
+                sock.setsockopt_int(level, optname, int(w_value is space.w_true))
+            elif isinstance(w_value, W_StringObject):
+                sock.setsockopt(level, optname, space.str_w(w_value))
+            else:
+                sock.setsockopt_int(level, optname, space.int_w(w_value))
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        return space.newint(0)
+
+    @classdef.method("getsockopt")
+    def method_getsockopt(self, space, w_level, w_optname):
+        sock = self.getsocket(space)
+        level = socket_constant(space, w_level, LEVEL_PREFIXES)
+        prefix = OPTION_PREFIXES.get(level, "")
+        optname = socket_constant(space, w_optname, [prefix] if prefix else [])
+        try:
+            return space.newint(sock.getsockopt_int(level, optname))
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+
+    @classdef.method("send", flags="int")
+    @classdef.method("sendmsg", flags="int")
+    def method_send(self, space, w_mesg, flags=0):
+        return space.newint(self.send_str(space, space.str_w(w_mesg), flags))
+
+    @classdef.method("recv", maxlen="int", flags="int")
+    def method_recv(self, space, maxlen, flags=0, w_buffer=None):
+        return self.recv_w(space, maxlen, flags, False, w_buffer)
+
+    @classdef.method("recv_nonblock", maxlen="int", flags="int")
+    def method_recv_nonblock(self, space, maxlen, flags=0, w_buffer=None):
+        return self.recv_w(space, maxlen, flags, True, w_buffer)
+
+    def recv_w(self, space, maxlen, flags, nonblock, w_buffer):
+        w_str = self.convert_outbuf(space, w_buffer)
+        if w_str is None:
+            w_str = space.newstr_fromchars([])
+        self.recv_into(space, w_str.mutable_chars(space), maxlen, flags, nonblock)
+        return w_str
+
+    @classdef.method("shutdown")
+    def method_shutdown(self, space, w_how=None):
+        sock = self.getsocket(space)
+        how = rsocket.SHUT_RDWR
+        if w_how is not None:
+            how = socket_constant(space, w_how, ["SHUT_"])
+        try:
+            sock.shutdown(how)
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        return space.newint(0)
+
+    @classdef.method("addr")
+    def method_addr(self, space):
+        try:
+            addr = self.getsocket(space).getsockname()
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        return self.address_w(space, addr)
+
+    @classdef.method("peeraddr")
+    def method_peeraddr(self, space):
+        try:
+            addr = self.getsocket(space).getpeername()
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        return self.address_w(space, addr)
+
+
+class W_SocketObject(W_BasicSocketObject):
+    classdef = ClassDef("Socket", W_BasicSocketObject.classdef)
+
+    @classdef.setup_class
+    def setup_class(cls, space, w_cls):
+        w_constants = space.newmodule("Constants", w_cls)
+        for name in SOCKET_CONSTANTS:
+            if name.startswith("PF_"):
+                value = INT_CONSTANTS.get("AF_" + name[len("PF_"):], -1)
+            else:
+                value = INT_CONSTANTS.get(name, -1)
+            if value >= 0:
+                space.set_const(w_cls, name, space.newint(value))
+                space.set_const(w_constants, name, space.newint(value))
+        space.set_const(w_cls, "Constants", w_constants)
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_SocketObject(space, self)
+
+    @classdef.singleton_method("gethostname")
+    def singleton_method_gethostname(self, space):
+        try:
+            return space.newstr_fromstr(rsocket.gethostname())
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+
+
+class W_IPSocketObject(W_BasicSocketObject):
+    classdef = ClassDef("IPSocket", W_BasicSocketObject.classdef)
+
+    def address_w(self, space, addr):
+        if isinstance(addr, rsocket.INETAddress):
+            host = addr.get_host()
+            port = addr.get_port()
+        elif isinstance(addr, rsocket.INET6Address):
+            host = addr.get_host()
+            port = addr.get_port()
+        else:
+            raise space.error(space.getclassfor(W_SocketError), "unsupported address family")
+        return space.newarray([
+            space.newstr_fromstr(FAMILY_NAMES.get(addr.family, "AF_UNSPEC")),
+            space.newint(port),
+            space.newstr_fromstr(host),
+            space.newstr_fromstr(host),
+        ])
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_IPSocketObject(space, self)
+
+
+class W_TCPSocketObject(W_IPSocketObject):
+    classdef = ClassDef("TCPSocket", W_IPSocketObject.classdef)
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_TCPSocketObject(space, self)
+
+    @classdef.method("initialize")
+    def method_initialize(self, space, w_host, w_port):
+        try:
+            infos = rsocket.getaddrinfo(
+                host_string(space, w_host), port_string(space, w_port),
+                rsocket.AF_UNSPEC, rsocket.SOCK_STREAM
+            )
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        error = None
+        for family, socktype, proto, _, addr in infos:
+            try:
+                sock = rsocket.RSocket(family, socktype, proto)
+            except rsocket.SocketError as e:
+                error = error_for_socket_error(space, e)
+                continue
+            try:
+                self.connect_socket(space, sock, addr)
+            except RubyError as e:
+                sock.close()
+                error = e
+                continue
+            self.set_socket(sock)
+            return self
+        if error is not None:
+            raise error
+        raise space.error(space.getclassfor(W_SocketError), "getaddrinfo: no address found")
+
+
+class W_TCPServerObject(W_TCPSocketObject):
+    classdef = ClassDef("TCPServer", W_TCPSocketObject.classdef)
+
+    def new_accepted(self, space):
+        return W_TCPSocketObject(space)
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_TCPServerObject(space, self)
+
+    @classdef.method("initialize")
+    def method_initialize(self, space, w_host, w_port=None):
+        if w_port is None:
+            w_host, w_port = space.w_nil, w_host
+        try:
+            infos = rsocket.getaddrinfo(
+                host_string(space, w_host), port_string(space, w_port),
+                rsocket.AF_UNSPEC, rsocket.SOCK_STREAM, 0, rsocket.AI_PASSIVE
+            )
+            family, socktype, proto, _, addr = infos[0]
+            sock = rsocket.RSocket(family, socktype, proto)
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        try:
+            sock.setsockopt_int(rsocket.SOL_SOCKET, rsocket.SO_REUSEADDR, 1)
+            sock.bind(addr)
+            sock.listen(rsocket.SOMAXCONN)
+        except rsocket.SocketError as e:
+            sock.close()
+            raise error_for_socket_error(space, e)
+        self.set_socket(sock)
+        return self
+
+    @classdef.method("listen", backlog="int")
+    def method_listen(self, space, backlog):
+        try:
+            self.getsocket(space).listen(backlog)
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        return space.newint(0)
+
+    @classdef.method("accept")
+    def method_accept(self, space):
+        return self.accept_socket(space, False)
+
+    @classdef.method("accept_nonblock")
+    def method_accept_nonblock(self, space):
+        return self.accept_socket(space, True)
+
+
+class W_UNIXSocketObject(W_BasicSocketObject):
+    classdef = ClassDef("UNIXSocket", W_BasicSocketObject.classdef)
+
+    def __init__(self, space, klass=None):
+        W_BasicSocketObject.__init__(self, space, klass)
+        self.path = ""
+
+    def __deepcopy__(self, memo):
+        obj = super(W_UNIXSocketObject, self).__deepcopy__(memo)
+        obj.path = self.path
+        return obj
+
+    def address_w(self, space, addr):
+        path = ""
+        if isinstance(addr, rsocket.UNIXAddress):
+            path = addr.get_path()
+        return space.newarray([
+            space.newstr_fromstr("AF_UNIX"),
+            space.newstr_fromstr(path),
+        ])
+
+    def unix_address(self, space, path):
+        try:
+            return rsocket.UNIXAddress(path)
+        except rsocket.SocketError as e:
+            raise space.error(space.w_ArgumentError, e.get_msg())
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_UNIXSocketObject(space, self)
+
+    @classdef.singleton_method("pair")
+    @classdef.singleton_method("socketpair")
+    def singleton_method_pair(self, space, w_type=None, w_protocol=None):
+        socktype = rsocket.SOCK_STREAM
+        if w_type is not None:
+            socktype = socket_constant(space, w_type, ["SOCK_"])
+        protocol = 0
+        if w_protocol is not None:
+            protocol = space.int_w(w_protocol)
+        try:
+            sock1, sock2 = rsocket.socketpair(rsocket.AF_UNIX, socktype, protocol)
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        socks_w = []
+        for sock in [sock1, sock2]:
+            w_sock = W_UNIXSocketObject(space, self)
+            w_sock.set_socket(sock)
+            socks_w.append(w_sock)
+        return space.newarray(socks_w)
+
+    @classdef.method("initialize", path="path")
+    def method_initialize(self, space, path):
+        addr = self.unix_address(space, path)
+        try:
+            sock = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        try:
+            self.connect_socket(space, sock, addr)
+        except RubyError:
+            sock.close()
+            raise
+        self.set_socket(sock)
+        return self
+
+    @classdef.method("path")
+    def method_path(self, space):
+        self.getsocket(space)
+        return space.newstr_fromstr(self.path)
+
+
+class W_UNIXServerObject(W_UNIXSocketObject):
+    classdef = ClassDef("UNIXServer", W_UNIXSocketObject.classdef)
+
+    def new_accepted(self, space):
+        return W_UNIXSocketObject(space)
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_UNIXServerObject(space, self)
+
+    @classdef.method("initialize", path="path")
+    def method_initialize(self, space, path):
+        addr = self.unix_address(space, path)
+        try:
+            sock = rsocket.RSocket(rsocket.AF_UNIX, rsocket.SOCK_STREAM)
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        try:
+            sock.bind(addr)
+            sock.listen(rsocket.SOMAXCONN)
+        except rsocket.SocketError as e:
+            sock.close()
+            raise error_for_socket_error(space, e)
+        self.path = path
+        self.set_socket(sock)
+        return self
+
+    @classdef.method("listen", backlog="int")
+    def method_listen(self, space, backlog):
+        try:
+            self.getsocket(space).listen(backlog)
+        except rsocket.SocketError as e:
+            raise error_for_socket_error(space, e)
+        return space.newint(0)
+
+    @classdef.method("accept")
+    def method_accept(self, space):
+        return self.accept_socket(space, False)
+
+    @classdef.method("accept_nonblock")
+    def method_accept_nonblock(self, space):
+        return self.accept_socket(space, True)
@@ -70,6 +70,46 @@ def expand_trans_str(source, res_len, inv=False):
     return expanded_source
 
 
+ROPE_MIN_LENGTH = 64
+
+
+class StringChunks(object):
+    """
+    The first ``count`` pieces of a piece list that can be shared between
+    strings. Appending to a view that covers the whole list extends it in
+    place, any other view copies its pieces first.
+    """
+
+    def __init__(self, pieces, count, length):
+        self.pieces = pieces
+        self.count = count
+        self.length = length
+        self.flat = None
+
+    def flatten(self):
+        flat = self.flat
+        if flat is None:
+            count = self.count
+            assert count >= 0
+            flat = self.flat = "".join(self.pieces[:count])
+        return flat
+
+    def extend(self, pieces, length):
+        if self.flat is not None and self.count > 1:
+            new_pieces = [self.flat]
+        elif self.count == len(self.pieces):
+            new_pieces = self.pieces
+        else:
+            count = self.count
+            assert count >= 0
+            new_pieces = self.pieces[:count]
+        new_pieces.extend(pieces)
+        return StringChunks(new_pieces, len(new_pieces), self.length + length)
+
+    def append(self, piece):
+        return self.extend([piece], len(piece))
+
+
 class StringStrategy(object):
     def __init__(self, space):
         pass
@@ -111,10 +151,74 @@ class ConstantStringStrategy(StringStrategy):
     def extend_into(self, src_storage, dst_storage):
         dst_storage += self.unerase(src_storage)
 
+    def chunks(self, storage):
+        strvalue = self.unerase(storage)
+        return StringChunks([strvalue], 1, len(strvalue))
+
+    def append_to(self, storage, chunks):
+        return chunks.append(self.unerase(storage))
+
     def mul(self, space, storage, times):
         return space.newstr_fromstr(self.unerase(storage) * times)
 
 
+class RopeStringStrategy(StringStrategy):
+    """
+    Strings built by concatenation keep their pieces until something needs
+    the actual bytes, so building a string piece by piece doesn't copy
+    everything built so far on every step.
+    """
+
+    erase, unerase = new_static_erasing_pair("rope")
+
+    def str_w(self, storage):
+        return self.unerase(storage).flatten()
+
+    def liststr_w(self, storage):
+        return [c for c in self.unerase(storage).flatten()]
+
+    def length(self, storage):
+        return self.unerase(storage).length
+
+    def getitem(self, storage, idx):
+        return self.unerase(storage).flatten()[idx]
+
+    def getslice(self, space, storage, start, end):
+        return space.newstr_fromstr(self.unerase(storage).flatten()[start:end])
+
+    def hash(self, storage):
+        return compute_hash(self.unerase(storage).flatten())
+
+    def copy(self, storage):
+        return storage
+
+    def to_mutable(self, space, s):
+        s.strategy = strategy = space.fromcache(MutableStringStrategy)
+        s.str_storage = strategy.erase(self.liststr_w(s.str_storage))
+
+    def extend_into(self, src_storage, dst_storage):
+        chunks = self.unerase(src_storage)
+        if chunks.flat is not None:
+            dst_storage += chunks.flat
+        else:
+            for i in xrange(chunks.count):
+                dst_storage += chunks.pieces[i]
+
+    def chunks(self, storage):
+        return self.unerase(storage)
+
+    def append_to(self, storage, chunks):
+        other = self.unerase(storage)
+        if other.flat is not None:
+            return chunks.append(other.flat)
+        count = other.count
+        assert count >= 0
+        return chunks.extend(other.pieces[:count], other.length)
+
+    def mul(self, space, storage, times):
+        return space.newstr_fromstr(self.unerase(storage).flatten() * times)
+
+
 class MutableStringStrategy(StringStrategy):
     erase, unerase = new_static_erasing_pair("mutable")
 
@@ -158,6 +262,13 @@ class MutableStringStrategy(StringStrategy):
     def extend_into(self, src_storage, dst_storage):
         dst_storage += self.unerase(src_storage)
 
+    def chunks(self, storage):
+        strvalue = self.str_w(storage)
+        return StringChunks([strvalue], 1, len(strvalue))
+
+    def append_to(self, storage, chunks):
+        return chunks.append(self.str_w(storage))
+
     def clear(self, s):
         storage = self.unerase(s.str_storage)
         del storage[:]
@@ -388,12 +499,33 @@ class W_StringObject(W_Object):
             assert isinstance(w_item, W_StringObject)
             total_length += w_item.length()
 
+        # Only a string that extends an existing rope (e.g. "#{s}...") is
+        # worth keeping in pieces, short results are cheaper to copy.
+        if total_length >= ROPE_MIN_LENGTH:
+            w_first = strs_w[0]
+            assert isinstance(w_first, W_StringObject)
+            extends_rope = isinstance(w_first.strategy, RopeStringStrategy)
+        else:
+            extends_rope = False
+        if extends_rope:
+            chunks = StringChunks([], 0, 0)
+            for w_item in strs_w:
+                assert isinstance(w_item, W_StringObject)
+                chunks = w_item.strategy.append_to(w_item.str_storage, chunks)
+            return W_StringObject.newstr_fromchunks(space, chunks)
+
         storage = newlist_hint(total_length)
         for w_item in strs_w:
             assert isinstance(w_item, W_StringObject)
             w_item.strategy.extend_into(w_item.str_storage, storage)
         return space.newstr_fromchars(storage)
 
+    @staticmethod
+    def newstr_fromchunks(space, chunks):
+        strategy = space.fromcache(RopeStringStrategy)
+        storage = strategy.erase(chunks)
+        return W_StringObject(space, storage, strategy)
+
     @staticmethod
     def newstr_fromchars(space, chars):
         strategy = space.fromcache(MutableStringStrategy)
@@ -415,17 +547,36 @@ class W_StringObject(W_Object):
     def copy(self, space):
         return W_StringObject(space, self.strategy.copy(self.str_storage), self.strategy)
 
+    def mutable_chars(self, space):
+        """
+        Returns the character list backing this string, which callers may
+        change in place.
+        """
+        self.strategy.to_mutable(space, self)
+        return space.fromcache(MutableStringStrategy).unerase(self.str_storage)
+
     def replace(self, space, chars):
         strategy = space.fromcache(MutableStringStrategy)
         self.str_storage = strategy.erase(chars)
         self.strategy = strategy
 
     def extend(self, space, w_other):
-        self.strategy.to_mutable(space, self)
         strategy = self.strategy
-        assert isinstance(strategy, MutableStringStrategy)
-        storage = strategy.unerase(self.str_storage)
-        w_other.strategy.extend_into(w_other.str_storage, storage)
+        if isinstance(strategy, MutableStringStrategy):
+            storage = strategy.unerase(self.str_storage)
+            w_other.strategy.extend_into(w_other.str_storage, storage)
+        else:
+            chunks = w_other.strategy.append_to(
+                w_other.str_storage, strategy.chunks(self.str_storage)
+            )
+            self.strategy = strategy = space.fromcache(RopeStringStrategy)
+            self.str_storage = strategy.erase(chunks)
+
+    def concat(self, space, w_other):
+        chunks = w_other.strategy.append_to(
+            w_other.str_storage, self.strategy.chunks(self.str_storage)
+        )
+        return W_StringObject.newstr_fromchunks(space, chunks)
 
     def clear(self, space):
         self.strategy.to_mutable(space, self)
@@ -505,10 +656,7 @@ class W_StringObject(W_Object):
     def method_plus(self, space, w_obj):
         w_other = space.convert_type(w_obj, space.w_string, "to_str")
         assert isinstance(w_other, W_StringObject)
-        total_size = self.length() + w_other.length()
-        s = space.newstr_fromchars(newlist_hint(total_size))
-        s.extend(space, self)
-        s.extend(space, w_other)
+        s = self.concat(space, w_other)
         space.infect(s, self)
         space.infect(s, w_other)
         return s
@@ -1,26 +1,197 @@
 import copy
+import time
 
+from topaz.error import RubyError
+from topaz.executioncontext import ExecutionContext
+from topaz.interpreter import RaiseReturn, RaiseBreak
 from topaz.module import ClassDef
 from topaz.objects.objectobject import W_Object
+from topaz.scheduler import Scheduler
 
 
 class W_ThreadObject(W_Object):
+    """
+    Threads are green threads, see topaz.scheduler. A thread is either
+    running (it's the scheduler's current thread), runnable, blocked or dead.
+    """
     classdef = ClassDef("Thread", W_Object.classdef)
 
-    def __init__(self, space):
-        W_Object.__init__(self, space)
+    def __init__(self, space, klass=None):
+        W_Object.__init__(self, space, klass)
         # TODO: This should be a map dict.
         self.local_storage = {}
+        self.ec = None
+        # self.h is only set once the thread has a stacklet of its own.
+        self.has_stack = False
+        self.w_fiber = None
+        self.w_block = None
+        self.args_w = []
+        self.started = False
+        self.alive = True
+        self.w_value = None
+        self.error = None
+        self.pending_error = None
+        self.joiners_w = []
+        self.blocked = False
+        self.wakeup_time = -1.0
+        self.wait_fds = None
+        self.mutexes_w = []
 
     def __deepcopy__(self, memo):
         obj = super(W_ThreadObject, self).__deepcopy__(memo)
         obj.local_storage = copy.deepcopy(self.local_storage, memo)
+        obj.ec = copy.deepcopy(self.ec, memo)
+        obj.has_stack = self.has_stack
+        if self.has_stack:
+            obj.h = self.h
+        obj.w_fiber = copy.deepcopy(self.w_fiber, memo)
+        obj.w_block = copy.deepcopy(self.w_block, memo)
+        obj.args_w = copy.deepcopy(self.args_w, memo)
+        obj.started = self.started
+        obj.alive = self.alive
+        obj.w_value = copy.deepcopy(self.w_value, memo)
+        obj.error = copy.deepcopy(self.error, memo)
+        obj.pending_error = copy.deepcopy(self.pending_error, memo)
+        obj.joiners_w = copy.deepcopy(self.joiners_w, memo)
+        obj.blocked = self.blocked
+        obj.wakeup_time = self.wakeup_time
+        obj.wait_fds = copy.deepcopy(self.wait_fds, memo)
+        obj.mutexes_w = copy.deepcopy(self.mutexes_w, memo)
         return obj
 
+    def run(self, space):
+        try:
+            try:
+                self.w_value = space.invoke_block(self.w_block, self.args_w)
+            except RaiseReturn:
+                raise space.error(space.w_LocalJumpError, "unexpected return")
+            except RaiseBreak:
+                raise space.error(space.w_LocalJumpError, "break from proc-closure")
+        except RubyError as e:
+            self.error = e
+        # Locks held by a dead thread would never be released otherwise.
+        for w_mutex in self.mutexes_w[:]:
+            w_mutex.release(space)
+        self.alive = False
+        self.w_block = None
+        self.args_w = []
+
+    def join(self, space, timeout):
+        scheduler = space.fromcache(Scheduler)
+        w_current = scheduler.get_current(space)
+        if self is w_current:
+            raise space.error(space.w_ThreadError, "Target thread must not be current thread")
+        if self is space.w_main_thread and not self.alive:
+            return True
+        deadline = time.time() + timeout
+        while self.alive:
+            remaining = -1.0
+            if timeout >= 0:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+            self.joiners_w.append(w_current)
+            try:
+                scheduler.block(space, timeout=remaining)
+            finally:
+                self.joiners_w.remove(w_current)
+        if self.error is not None:
+            raise self.error
+        return True
+
+    @classdef.singleton_method("allocate")
+    def singleton_method_allocate(self, space):
+        return W_ThreadObject(space, self)
+
     @classdef.singleton_method("current")
     def method_current(self, space):
+        return space.fromcache(Scheduler).get_current(space)
+
+    @classdef.singleton_method("main")
+    def method_main(self, space):
         return space.w_main_thread
 
+    @classdef.singleton_method("list")
+    def method_list(self, space):
+        threads_w = [space.w_main_thread]
+        threads_w.extend(space.fromcache(Scheduler).threads_w)
+        return space.newarray(threads_w)
+
+    @classdef.singleton_method("pass")
+    def method_pass(self, space):
+        space.fromcache(Scheduler).pass_current(space)
+        return space.w_nil
+
+    @classdef.singleton_method("stop")
+    def method_stop(self, space):
+        scheduler = space.fromcache(Scheduler)
+        if not scheduler.has_threads:
+            raise space.error(space.w_ThreadError,
+                "stopping only thread\n\tnote: use sleep to stop forever"
+            )
+        scheduler.sleep(space, -1.0)
+        return space.w_nil
+
+    @classdef.method("initialize")
+    def method_initialize(self, space, args_w, block):
+        if block is None:
+            raise space.error(space.w_ThreadError, "must be called with a block")
+        if self.started:
+            raise space.error(space.w_ThreadError, "already initialized thread")
+        self.started = True
+        self.w_block = block
+        self.args_w = args_w
+        self.ec = ExecutionContext()
+        space.fromcache(Scheduler).spawn(space, self)
+        return self
+
+    @classdef.method("join")
+    def method_join(self, space, w_timeout=None):
+        if w_timeout is None or w_timeout is space.w_nil:
+            timeout = -1.0
+        else:
+            timeout = space.float_w(w_timeout)
+        if self.join(space, timeout):
+            return self
+        return space.w_nil
+
+    @classdef.method("value")
+    def method_value(self, space):
+        self.join(space, -1.0)
+        return self.w_value or space.w_nil
+
+    @classdef.method("alive?")
+    def method_alivep(self, space):
+        return space.newbool(self.alive)
+
+    @classdef.method("stop?")
+    def method_stopp(self, space):
+        return space.newbool(not self.alive or self.blocked)
+
+    @classdef.method("status")
+    def method_status(self, space):
+        if self.alive:
+            if self.blocked:
+                return space.newstr_fromstr("sleep")
+            return space.newstr_fromstr("run")
+        elif self.error is not None:
+            return space.w_nil
+        else:
+            return space.w_false
+
+    @classdef.method("wakeup")
+    def method_wakeup(self, space):
+        if not self.alive:
+            raise space.error(space.w_ThreadError, "killed thread")
+        space.fromcache(Scheduler).wake(space, self)
+        return self
+
+    @classdef.method("run")
+    def method_run(self, space):
+        space.send(self, "wakeup")
+        space.fromcache(Scheduler).pass_current(space)
+        return self
+
     @classdef.method("[]", key="str")
     def method_subscript(self, space, key):
         return self.local_storage.get(key, space.w_nil)
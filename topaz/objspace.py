@@ -15,9 +15,10 @@ from rpython.rtyper.lltypesystem import llmemory, rffi
 
 from rply.errors import ParsingError
 
-from topaz import system
+from topaz import consts, system
 from topaz.astcompiler import CompilerContext, SymbolTable
 from topaz.celldict import GlobalsDict
+from topaz.codecache import CodeCache
 from topaz.closure import ClosureCell
 from topaz.error import RubyError, print_traceback
 from topaz.executioncontext import ExecutionContext, ExecutionContextHolder
@@ -41,6 +42,7 @@ from topaz.objects.bindingobject import W_BindingObject
 from topaz.objects.boolobject import W_TrueObject, W_FalseObject
 from topaz.objects.classobject import W_ClassObject
 from topaz.objects.codeobject import W_CodeObject
+from topaz.objects.conditionvariableobject import W_ConditionVariableObject
 from topaz.objects.dirobject import W_DirObject
 from topaz.objects.encodingobject import W_EncodingObject
 from topaz.objects.envobject import W_EnvObject
@@ -50,28 +52,34 @@ from topaz.objects.exceptionobject import (W_ExceptionObject, W_NoMethodError,
     W_SystemCallError, W_NameError, W_IndexError, W_KeyError, W_StopIteration,
     W_NotImplementedError, W_RangeError, W_LocalJumpError, W_IOError,
     W_RegexpError, W_ThreadError, W_FiberError, W_EOFError, W_FloatDomainError,
-    W_SystemStackError)
+    W_SystemStackError, W_SocketError)
 from topaz.objects.fiberobject import W_FiberObject
 from topaz.objects.fileobject import W_FileObject
 from topaz.objects.floatobject import W_FloatObject
 from topaz.objects.functionobject import W_UserFunction
-from topaz.objects.hashobject import W_HashObject, W_HashIterator
+from topaz.objects.hashobject import W_HashObject
 from topaz.objects.integerobject import W_IntegerObject
 from topaz.objects.intobject import W_FixnumObject
 from topaz.objects.ioobject import W_IOObject
 from topaz.objects.methodobject import W_MethodObject, W_UnboundMethodObject
 from topaz.objects.moduleobject import W_ModuleObject
+from topaz.objects.mutexobject import W_MutexObject
 from topaz.objects.nilobject import W_NilObject
 from topaz.objects.numericobject import W_NumericObject
 from topaz.objects.objectobject import W_Object, W_BaseObject, W_Root
 from topaz.objects.procobject import W_ProcObject
+from topaz.objects.queueobject import W_QueueObject
 from topaz.objects.randomobject import W_RandomObject
 from topaz.objects.rangeobject import W_RangeObject
 from topaz.objects.regexpobject import W_RegexpObject, W_MatchDataObject
+from topaz.objects.socketobject import (W_BasicSocketObject, W_SocketObject,
+    W_IPSocketObject, W_TCPSocketObject, W_TCPServerObject, W_UNIXSocketObject,
+    W_UNIXServerObject)
 from topaz.objects.stringobject import W_StringObject
 from topaz.objects.symbolobject import W_SymbolObject
 from topaz.objects.threadobject import W_ThreadObject
 from topaz.objects.timeobject import W_TimeObject
+from topaz.optimizer import ConstantFoldingGuard
 from topaz.parser import Parser
 from topaz.utils.ll_file import isdir
 
@@ -94,7 +102,11 @@ class ObjectSpace(object):
         self._executioncontexts = ExecutionContextHolder()
         self.globals = GlobalsDict()
         self.bootstrap = True
+        self.optimize_bytecode = True
         self.exit_handlers_w = []
+        self.code_cache = CodeCache()
+        self.kernel_loaded = False
+        self.unflushed_ios_w = {}
 
         self.w_true = W_TrueObject(self)
         self.w_false = W_FalseObject(self)
@@ -143,6 +155,7 @@ class ObjectSpace(object):
         self.w_RangeError = self.getclassfor(W_RangeError)
         self.w_FloatDomainError = self.getclassfor(W_FloatDomainError)
         self.w_RegexpError = self.getclassfor(W_RegexpError)
+        self.w_ThreadError = self.getclassfor(W_ThreadError)
         self.w_RuntimeError = self.getclassfor(W_RuntimeError)
         self.w_StandardError = self.getclassfor(W_StandardError)
         self.w_StopIteration = self.getclassfor(W_StopIteration)
@@ -184,6 +197,16 @@ class ObjectSpace(object):
             self.getclassfor(W_IntegerObject),
             self.getclassfor(W_RandomObject),
             self.getclassfor(W_ThreadObject),
+            self.getclassfor(W_MutexObject),
+            self.getclassfor(W_ConditionVariableObject),
+            self.getclassfor(W_QueueObject),
+            self.getclassfor(W_BasicSocketObject),
+            self.getclassfor(W_SocketObject),
+            self.getclassfor(W_IPSocketObject),
+            self.getclassfor(W_TCPSocketObject),
+            self.getclassfor(W_TCPServerObject),
+            self.getclassfor(W_UNIXSocketObject),
+            self.getclassfor(W_UNIXServerObject),
             self.getclassfor(W_TimeObject),
             self.getclassfor(W_MethodObject),
             self.getclassfor(W_UnboundMethodObject),
@@ -191,7 +214,8 @@ class ObjectSpace(object):
             self.getclassfor(W_MatchDataObject),
 
             self.getclassfor(W_ExceptionObject),
-            self.getclassfor(W_ThreadError),
+            self.getclassfor(W_SocketError),
+            self.w_ThreadError,
 
             self.getmoduleobject(Comparable.moduledef),
             self.getmoduleobject(Enumerable.moduledef),
@@ -209,7 +233,7 @@ class ObjectSpace(object):
             )
 
         for w_cls in [
-            self.getclassfor(W_EnvObject), self.getclassfor(W_HashIterator),
+            self.getclassfor(W_EnvObject),
         ]:
             self.set_const(
                 self.w_topaz,
@@ -224,6 +248,10 @@ class ObjectSpace(object):
         self.send(self.w_object, "include", [self.w_kernel])
         self.bootstrap = False
 
+        guard = self.fromcache(ConstantFoldingGuard)
+        for w_cls in [self.w_fixnum, self.w_float]:
+            guard.guard_methods(self, w_cls, consts.BINARY_OPERATORS.keys())
+
         self.w_load_path = self.newarray([])
         self.globals.define_virtual("$LOAD_PATH", lambda space: space.w_load_path)
         self.globals.define_virtual("$:", lambda space: space.w_load_path)
@@ -262,7 +290,7 @@ class ObjectSpace(object):
         path = rpath.rabspath(self.find_executable(executable))
         # Fallback to a path relative to the compiled location.
         lib_path = self.base_lib_path
-        kernel_path = os.path.join(os.path.join(lib_path, os.path.pardir), "lib-topaz")
+        kernel_path = self.base_kernel_path()
         while True:
             par_path = rpath.rabspath(os.path.join(path, os.path.pardir))
             if par_path == path:
@@ -273,7 +301,17 @@ class ObjectSpace(object):
                 kernel_path = os.path.join(path, "lib-topaz")
                 break
         self.send(self.w_load_path, "unshift", [self.newstr_fromstr(lib_path)])
-        self.load_kernel(kernel_path)
+        # The standard streams are created when the space is built, which
+        # may have been at translation time.
+        for name in ["STDIN", "STDOUT", "STDERR"]:
+            w_io = self.find_const(self.w_object, name)
+            assert isinstance(w_io, W_IOObject)
+            w_io.set_fd(w_io.fd)
+        if not self.kernel_loaded:
+            self.load_kernel(kernel_path)
+
+    def base_kernel_path(self):
+        return os.path.join(os.path.join(self.base_lib_path, os.path.pardir), "lib-topaz")
 
     def load_kernel(self, kernel_path):
         self.send(
@@ -281,6 +319,16 @@ class ObjectSpace(object):
             "load",
             [self.newstr_fromstr(os.path.join(kernel_path, "bootstrap.rb"))]
         )
+        self.fromcache(ConstantFoldingGuard).guard_core_methods(self)
+
+    def snapshot_kernel(self):
+        """
+        Loads the Ruby kernel ahead of time, so that a space translated after
+        this call starts with the kernel's classes and methods already built.
+        """
+        self.load_kernel(self.base_kernel_path())
+        self.kernel_loaded = True
+        self._executioncontexts.clear()
 
     @specialize.memo()
     def fromcache(self, key):
@@ -316,6 +364,9 @@ class ObjectSpace(object):
     def execute(self, source, w_self=None, lexical_scope=None, filepath="-e",
                 initial_lineno=1):
         bc = self.compile(source, filepath, initial_lineno=initial_lineno)
+        return self.execute_code(bc, w_self=w_self, lexical_scope=lexical_scope)
+
+    def execute_code(self, bc, w_self=None, lexical_scope=None):
         frame = self.create_frame(bc, w_self=w_self, lexical_scope=lexical_scope)
         with self.getexecutioncontext().visit_frame(frame):
             return self.execute_frame(frame, bc)
@@ -406,7 +457,7 @@ class ObjectSpace(object):
         return W_StringObject.newstr_fromstrs(self, strs_w)
 
     def newarray(self, items_w):
-        return W_ArrayObject(self, items_w)
+        return W_ArrayObject.newarray(self, items_w)
 
     def newhash(self):
         return W_HashObject(self)
@@ -631,6 +682,11 @@ class ObjectSpace(object):
         raw_method = w_cls.find_method(self, name)
         return self._send_raw(name, raw_method, w_receiver, w_cls, args_w, block)
 
+    def send_cached(self, cache, w_receiver, name, args_w, block=None):
+        w_cls = self.getclass(w_receiver)
+        raw_method = cache.find_method(self, w_cls, name)
+        return self._send_raw(name, raw_method, w_receiver, w_cls, args_w, block)
+
     def send_super(self, w_cls, w_receiver, name, args_w, block=None):
         raw_method = w_cls.find_method_super(self, name)
         return self._send_raw(name, raw_method, w_receiver, w_cls, args_w, block)
@@ -709,8 +765,16 @@ class ObjectSpace(object):
                     status = w_exc.status
                 else:
                     print_traceback(self, e.w_value)
+        self.flush_io_buffers()
         return status
 
+    def flush_io_buffers(self):
+        for w_io in self.unflushed_ios_w.keys():
+            try:
+                w_io.flush_buffer(self)
+            except RubyError as e:
+                print_traceback(self, e.w_value)
+
     def subscript_access(self, length, w_idx, w_count):
         inclusive = False
         as_range = False
@@ -0,0 +1,290 @@
+from topaz import consts
+from topaz.astcompiler import Instruction
+from topaz.error import RubyError
+from topaz.objects.bignumobject import W_BignumObject
+from topaz.objects.codeobject import W_FoldedValue
+from topaz.objects.floatobject import W_FloatObject
+from topaz.objects.functionobject import W_BuiltinFunction
+from topaz.objects.intobject import W_FixnumObject
+from topaz.objects.stringobject import W_StringObject
+from topaz.objects.symbolobject import W_SymbolObject
+
+
+FOLDABLE_METHODS = dict.fromkeys([
+    "+", "-", "*", "/", "%", "&", "|", "^", "<", ">", "<=", ">=", "==",
+])
+# Redefining any of these may invalidate folded constants or jump tables.
+GUARDED_METHODS = dict.fromkeys(FOLDABLE_METHODS.keys() + ["==="])
+# Don't bloat the constants with the results of things like "-" * 10000.
+MAX_FOLDED_STRING_LENGTH = 256
+
+TERMINATORS = [
+    consts.JUMP, consts.RETURN, consts.RAISE_RETURN, consts.CONTINUE_LOOP,
+    consts.BREAK_LOOP, consts.RAISE_BREAK,
+]
+
+
+class ConstantFoldingGuard(object):
+    """
+    Records the core methods that were evaluated at compile time. Once any of
+    them is redefined, every LOAD_FOLDED computes its value again and every
+    JUMP_TABLE falls back to the original code.
+    """
+
+    _immutable_fields_ = ["invalidated?"]
+
+    def __init__(self, space):
+        self.invalidated = False
+        self.classes_w = []
+        self.names = []
+        self.methods = []
+
+    def record(self, w_cls, name, method):
+        for i in xrange(len(self.classes_w)):
+            if self.classes_w[i] is w_cls and self.names[i] == name:
+                return
+        self.classes_w.append(w_cls)
+        self.names.append(name)
+        self.methods.append(method)
+
+    def guard_methods(self, space, w_cls, names):
+        if self.invalidated:
+            return False
+        for name in names:
+            self.record(w_cls, name, w_cls.find_method(space, name))
+        return True
+
+    def guard_core_methods(self, space):
+        # Called once the kernel is loaded, so that redefining any of these
+        # is noticed even before the first code relying on them is compiled
+        # or read from the code cache.
+        for w_cls in [space.w_fixnum, space.w_bignum, space.w_float, space.w_string, space.w_symbol]:
+            for name in GUARDED_METHODS:
+                method = w_cls.find_method(space, name)
+                if method is not None:
+                    self.record(w_cls, name, method)
+
+    def methods_changed(self, space):
+        if self.invalidated:
+            return
+        for i in xrange(len(self.classes_w)):
+            if self.classes_w[i].find_method(space, self.names[i]) is not self.methods[i]:
+                self.invalidated = True
+                return
+
+
+class FoldedInstruction(Instruction):
+    def __init__(self, w_folded, lineno):
+        Instruction.__init__(self, consts.LOAD_FOLDED, 0, -1, lineno)
+        self.w_folded = w_folded
+
+
+class Optimizer(object):
+    """
+    Optimizes the basic blocks of a CompilerContext in place: folds constant
+    arithmetic on literals, removes redundant stack shuffles and dead code,
+    threads jumps and drops unreachable blocks.
+    """
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.space = ctx.space
+
+    def optimize(self, first_block):
+        blocks = self.get_blocks(first_block)
+        for block in blocks:
+            block.instrs = self.peephole(self.fold_constants(block.instrs))
+            self.truncate_after_terminator(block)
+            self.expand_folded(block)
+        for block in blocks:
+            self.thread_jumps(block)
+        self.remove_unreachable_blocks(first_block)
+
+    def get_blocks(self, first_block):
+        blocks = []
+        block = first_block
+        while block is not None:
+            blocks.append(block)
+            block = block.next_block
+        return blocks
+
+    def _operand(self, instrs, end):
+        # Returns the start of the literal ending at instrs[end - 1] and its
+        # value, which is a W_FoldedValue for an already folded operation,
+        # or (-1, None).
+        if end < 1:
+            return -1, None
+        instr = instrs[end - 1]
+        if isinstance(instr, FoldedInstruction):
+            return end - 1, instr.w_folded
+        if instr.opcode == consts.LOAD_CONST:
+            w_const = self.ctx.consts[instr.arg0]
+            if (isinstance(w_const, W_FixnumObject) or
+                isinstance(w_const, W_BignumObject) or
+                isinstance(w_const, W_FloatObject)):
+                return end - 1, w_const
+        elif instr.opcode == consts.COERCE_STRING and end >= 2:
+            prev = instrs[end - 2]
+            if prev.opcode == consts.LOAD_CONST and not isinstance(prev, FoldedInstruction):
+                w_const = self.ctx.consts[prev.arg0]
+                if isinstance(w_const, W_SymbolObject):
+                    return end - 2, self.space.newstr_fromstr(w_const.symbol)
+        return -1, None
+
+    def _is_number(self, w_obj):
+        return (isinstance(w_obj, W_FixnumObject) or
+            isinstance(w_obj, W_BignumObject) or
+            isinstance(w_obj, W_FloatObject))
+
+    def _can_fold(self, w_receiver, w_arg):
+        if self._is_number(w_receiver):
+            return self._is_number(w_arg)
+        return (isinstance(w_receiver, W_StringObject) and
+            (isinstance(w_arg, W_StringObject) or isinstance(w_arg, W_FixnumObject)))
+
+    def _value(self, w_operand):
+        if isinstance(w_operand, W_FoldedValue):
+            return w_operand.w_value
+        return w_operand
+
+    def fold(self, w_receiver, name, w_arg):
+        space = self.space
+        guard = space.fromcache(ConstantFoldingGuard)
+        if guard.invalidated or not self._can_fold(w_receiver, w_arg):
+            return None
+        w_cls = space.getclass(w_receiver)
+        method = w_cls.find_method(space, name)
+        if not isinstance(method, W_BuiltinFunction):
+            return None
+        try:
+            w_res = space.send(w_receiver, name, [w_arg])
+        except RubyError:
+            return None
+        if isinstance(w_res, W_StringObject):
+            if w_res.length() > MAX_FOLDED_STRING_LENGTH:
+                return None
+        elif not (self._is_number(w_res) or w_res is space.w_true or w_res is space.w_false):
+            return None
+        guard.record(w_cls, name, method)
+        return w_res
+
+    def _is_binary_send(self, instr):
+        if isinstance(instr, FoldedInstruction):
+            return False
+        if instr.opcode == consts.SEND:
+            return instr.arg1 == 1
+        for opcode in consts.BINARY_OPERATORS.itervalues():
+            if instr.opcode == opcode:
+                return True
+        return False
+
+    def fold_constants(self, instrs):
+        out = []
+        for instr in instrs:
+            if self._is_binary_send(instr):
+                w_name = self.ctx.consts[instr.arg0]
+                assert isinstance(w_name, W_SymbolObject)
+                if w_name.symbol in FOLDABLE_METHODS:
+                    arg_start, w_arg = self._operand(out, len(out))
+                    recv_start, w_receiver = self._operand(out, arg_start)
+                    if w_receiver is not None:
+                        w_res = self.fold(
+                            self._value(w_receiver), w_name.symbol, self._value(w_arg)
+                        )
+                        if w_res is not None:
+                            assert recv_start >= 0
+                            del out[recv_start:]
+                            w_folded = W_FoldedValue(w_res, w_receiver, w_name.symbol, w_arg)
+                            out.append(FoldedInstruction(w_folded, instr.lineno))
+                            continue
+            out.append(instr)
+        return out
+
+    def _is_plain(self, instr, opcode):
+        return instr.opcode == opcode and not isinstance(instr, FoldedInstruction)
+
+    def peephole(self, instrs):
+        out = []
+        for instr in instrs:
+            if out and self._is_plain(instr, consts.DISCARD_TOP):
+                prev = out[-1]
+                if (self._is_plain(prev, consts.DUP_TOP) or
+                    self._is_plain(prev, consts.LOAD_CONST) or
+                    self._is_plain(prev, consts.LOAD_SELF)):
+                    out.pop()
+                    continue
+            if (out and self._is_plain(instr, consts.ROT_TWO) and
+                self._is_plain(out[-1], consts.ROT_TWO)):
+                out.pop()
+                continue
+            out.append(instr)
+        return out
+
+    def truncate_after_terminator(self, block):
+        for i, instr in enumerate(block.instrs):
+            if instr.opcode in TERMINATORS and not isinstance(instr, FoldedInstruction):
+                del block.instrs[i + 1:]
+                return
+
+    def expand_folded(self, block):
+        for i, instr in enumerate(block.instrs):
+            if isinstance(instr, FoldedInstruction):
+                block.instrs[i] = Instruction(
+                    consts.LOAD_FOLDED, self.ctx.create_const(instr.w_folded), -1,
+                    instr.lineno
+                )
+
+    def _resolve_target(self, block):
+        seen = {}
+        while block not in seen:
+            seen[block] = None
+            if not block.instrs:
+                if block.next_block is None:
+                    break
+                block = block.next_block
+            elif block.instrs[0].opcode == consts.JUMP:
+                block = block.instrs[0].jump
+            else:
+                break
+        return block
+
+    def _next_code_block(self, block):
+        block = block.next_block
+        while block is not None and not block.instrs:
+            block = block.next_block
+        return block
+
+    def thread_jumps(self, block):
+        for instr in block.instrs:
+            if (instr.opcode == consts.JUMP or instr.opcode == consts.JUMP_IF_TRUE or
+                instr.opcode == consts.JUMP_IF_FALSE):
+                instr.jump = self._resolve_target(instr.jump)
+        if block.instrs:
+            last = block.instrs[-1]
+            if (last.opcode == consts.JUMP and
+                last.jump is self._next_code_block(block)):
+                block.instrs.pop()
+
+    def remove_unreachable_blocks(self, first_block):
+        reachable = {}
+        pending = [first_block]
+        while pending:
+            block = pending.pop()
+            if block in reachable:
+                continue
+            reachable[block] = None
+            falls_through = True
+            for instr in block.instrs:
+                if instr.has_jump():
+                    pending.append(instr.jump)
+            if block.instrs and block.instrs[-1].opcode in TERMINATORS:
+                falls_through = False
+            if falls_through and block.next_block is not None:
+                pending.append(block.next_block)
+
+        block = first_block
+        while block.next_block is not None:
+            if block.next_block in reachable:
+                block = block.next_block
+            else:
+                block.next_block = block.next_block.next_block
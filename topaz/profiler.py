@@ -0,0 +1,110 @@
+import signal as host_signal
+
+from rpython.rlib import jit, rsignal
+from rpython.rlib.listsort import make_timsort_class
+from rpython.rlib.objectmodel import we_are_translated
+from rpython.rtyper.lltypesystem import lltype
+
+
+StackSorter = make_timsort_class()
+
+
+class Profiler(object):
+    """
+    Sampling profiler. A SIGPROF interval timer marks a sample as pending and
+    the interpreter records the Ruby stack at the next bytecode boundary.
+    Samples are kept as collapsed stacks, the input format of flame graph
+    tools.
+    """
+
+    _immutable_fields_ = ["active?"]
+
+    # In microseconds of CPU time.
+    DEFAULT_INTERVAL = 1000
+
+    def __init__(self, space):
+        self.active = False
+        self.host_pending = False
+        self.stacks = {}
+        self.sample_count = 0
+
+    def start(self, interval):
+        if self.active:
+            return False
+        if we_are_translated():
+            rsignal.pypysig_setflag(rsignal.SIGPROF)
+        else:
+            # Going through ll2ctypes for every bytecode is far too slow when
+            # running untranslated, use the host's signal handling instead.
+            host_signal.signal(host_signal.SIGPROF, self._host_handler)
+        self._set_timer(interval)
+        self.active = True
+        return True
+
+    def stop(self):
+        if not self.active:
+            return False
+        self._set_timer(0)
+        # SIGPROF terminates the process by default, a tick that is already
+        # in flight has to be ignored.
+        if we_are_translated():
+            rsignal.pypysig_ignore(rsignal.SIGPROF)
+        else:
+            host_signal.signal(host_signal.SIGPROF, host_signal.SIG_IGN)
+            self.host_pending = False
+        self.active = False
+        return True
+
+    def reset(self):
+        self.stacks = {}
+        self.sample_count = 0
+
+    def _host_handler(self, signum, frame):
+        self.host_pending = True
+
+    def _set_timer(self, interval):
+        if not we_are_translated():
+            host_signal.setitimer(host_signal.ITIMER_PROF, interval / 1000000.0, interval / 1000000.0)
+            return
+        with lltype.scoped_alloc(rsignal.itimervalP.TO, 1) as timer:
+            timer[0].c_it_value.c_tv_sec = interval / 1000000
+            timer[0].c_it_value.c_tv_usec = interval % 1000000
+            timer[0].c_it_interval.c_tv_sec = interval / 1000000
+            timer[0].c_it_interval.c_tv_usec = interval % 1000000
+            rsignal.c_setitimer(rsignal.ITIMER_PROF, timer, lltype.nullptr(rsignal.itimervalP.TO))
+
+    def sample_pending(self):
+        if we_are_translated():
+            return rsignal.pypysig_getaddr_occurred().c_value < 0
+        return self.host_pending
+
+    @jit.dont_look_inside
+    def take_sample(self, space):
+        if we_are_translated():
+            rsignal.pypysig_getaddr_occurred().c_value = 0
+            while rsignal.pypysig_poll() != -1:
+                pass
+        else:
+            self.host_pending = False
+        names = []
+        frame = space.getexecutioncontext().gettopframe()
+        prev_frame = None
+        while frame is not None and frame.has_contents():
+            names.append("%s (%s:%d)" % (
+                frame.get_code_name(),
+                frame.get_filename(),
+                frame.get_lineno(prev_frame),
+            ))
+            prev_frame = frame
+            frame = frame.backref()
+        names.reverse()
+        self.record(";".join(names))
+
+    def record(self, stack):
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.sample_count += 1
+
+    def report(self):
+        stacks = self.stacks.keys()
+        StackSorter(stacks).sort()
+        return "".join(["%s %d\n" % (stack, self.stacks[stack]) for stack in stacks])
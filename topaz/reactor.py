@@ -0,0 +1,217 @@
+import errno
+import time
+
+from rpython.rlib import rpoll
+
+from topaz.utils import ll_epoll
+
+
+class ParkedFiber(object):
+    def __init__(self, w_fiber, fds, deadline):
+        self.w_fiber = w_fiber
+        self.fds = fds
+        self.deadline = deadline
+
+
+class Reactor(object):
+    """
+    Event loop over file descriptors, using epoll where it's available and
+    poll otherwise. Threads blocked on IO are woken up from it, and fibers
+    started with Fiber.schedule are parked here while their IO would block,
+    to be resumed once it's ready.
+    """
+
+    MAX_EVENTS = 256
+
+    def __init__(self, space):
+        self.epfd = -1
+        # Maps each fd to the events of every waiter on it.
+        self.watched = {}
+        self.registered = {}
+        # epoll refuses regular files, which are always ready anyway.
+        self.unpollable = {}
+        self.parked = []
+
+    def has_watches(self):
+        return len(self.watched) > 0
+
+    def watch(self, fd, events):
+        if fd not in self.watched:
+            self.watched[fd] = []
+        self.watched[fd].append(events)
+        self._update(fd)
+
+    def unwatch(self, fd, events):
+        masks = self.watched[fd]
+        masks.remove(events)
+        if not masks:
+            del self.watched[fd]
+        self._update(fd)
+
+    def _update(self, fd):
+        mask = 0
+        for events in self.watched.get(fd, []):
+            mask |= events
+        if mask == 0 and fd in self.unpollable:
+            del self.unpollable[fd]
+        if not ll_epoll.HAS_EPOLL:
+            return
+        old = self.registered.get(fd, 0)
+        if mask == old:
+            return
+        if mask == 0:
+            del self.registered[fd]
+        else:
+            self.registered[fd] = mask
+        epoll_mask = 0
+        if mask & rpoll.POLLIN:
+            epoll_mask |= ll_epoll.EPOLLIN
+        if mask & rpoll.POLLOUT:
+            epoll_mask |= ll_epoll.EPOLLOUT
+        if self.epfd < 0:
+            self.epfd = ll_epoll.epoll_create()
+        try:
+            if old == 0:
+                ll_epoll.epoll_ctl(self.epfd, ll_epoll.EPOLL_CTL_ADD, fd, epoll_mask)
+            elif mask == 0:
+                ll_epoll.epoll_ctl(self.epfd, ll_epoll.EPOLL_CTL_DEL, fd, 0)
+            else:
+                self._modify(fd, epoll_mask)
+        except OSError:
+            # A closed fd is dropped by epoll itself. Anything else is
+            # reported as ready, so the IO operation raises the error.
+            if mask != 0:
+                del self.registered[fd]
+                self.unpollable[fd] = None
+
+    def _modify(self, fd, epoll_mask):
+        try:
+            ll_epoll.epoll_ctl(self.epfd, ll_epoll.EPOLL_CTL_MOD, fd, epoll_mask)
+        except OSError as e:
+            # The fd was closed and reopened since it was registered.
+            if e.errno != errno.ENOENT:
+                raise
+            ll_epoll.epoll_ctl(self.epfd, ll_epoll.EPOLL_CTL_ADD, fd, epoll_mask)
+
+    def poll(self, timeout):
+        """
+        Waits up to timeout milliseconds (forever if negative) for any of the
+        watched fds, and returns a dict of the ready ones.
+        """
+        ready = {}
+        for fd in self.unpollable:
+            ready[fd] = rpoll.POLLIN | rpoll.POLLOUT
+            timeout = 0
+        if ll_epoll.HAS_EPOLL:
+            if self.registered:
+                for fd, events in ll_epoll.epoll_wait(self.epfd, self.MAX_EVENTS, timeout):
+                    revents = 0
+                    if events & (ll_epoll.EPOLLIN | ll_epoll.EPOLLERR | ll_epoll.EPOLLHUP):
+                        revents |= rpoll.POLLIN
+                    if events & (ll_epoll.EPOLLOUT | ll_epoll.EPOLLERR | ll_epoll.EPOLLHUP):
+                        revents |= rpoll.POLLOUT
+                    ready[fd] = revents
+            elif timeout > 0:
+                time.sleep(timeout / 1000.0)
+        else:
+            fds = {}
+            for fd, masks in self.watched.iteritems():
+                mask = 0
+                for events in masks:
+                    mask |= events
+                fds[fd] = mask
+            try:
+                for fd, revents in rpoll.poll(fds, timeout):
+                    ready[fd] = revents
+            except rpoll.PollError:
+                for fd in fds:
+                    ready[fd] = rpoll.POLLIN | rpoll.POLLOUT
+        return ready
+
+    def current_scheduled_fiber(self, space):
+        from topaz.objects.fiberobject import State
+
+        w_fiber = space.fromcache(State).current
+        if w_fiber is not None and w_fiber.scheduled:
+            return w_fiber
+        return None
+
+    def is_active(self, space):
+        return len(self.parked) > 0 or self.current_scheduled_fiber(space) is not None
+
+    def park(self, space, w_fiber, fds, timeout):
+        """
+        Suspends a scheduled fiber until one of fds is ready or timeout
+        seconds pass. Control goes back to whoever resumed the fiber.
+        """
+        from topaz.objects.fiberobject import W_FiberObject
+
+        deadline = -1.0
+        if timeout >= 0:
+            deadline = time.time() + timeout
+        parked = ParkedFiber(w_fiber, fds, deadline)
+        self.parked.append(parked)
+        if fds is not None:
+            for fd, events in fds.iteritems():
+                self.watch(fd, events)
+        try:
+            space.send(space.getclassfor(W_FiberObject), "yield")
+        finally:
+            self._unpark(parked)
+
+    def _unpark(self, parked):
+        if parked in self.parked:
+            self.parked.remove(parked)
+            if parked.fds is not None:
+                for fd, events in parked.fds.iteritems():
+                    self.unwatch(fd, events)
+
+    def can_progress(self):
+        for parked in self.parked:
+            if (parked.fds is not None and len(parked.fds) > 0) or parked.deadline >= 0:
+                return True
+        return False
+
+    def run_once(self, space, fds, timeout):
+        """
+        Waits for the parked fibers and, at the same time, for fds or timeout
+        seconds. Resumes every fiber that is ready.
+        """
+        now = time.time()
+        deadline = -1.0
+        if timeout >= 0:
+            deadline = now + timeout
+        for parked in self.parked:
+            if parked.deadline >= 0 and (deadline < 0 or parked.deadline < deadline):
+                deadline = parked.deadline
+        timeout_ms = -1
+        if deadline >= 0:
+            timeout_ms = max(int((deadline - now) * 1000) + 1, 0)
+        if fds is not None:
+            for fd, events in fds.iteritems():
+                self.watch(fd, events)
+        try:
+            ready = self.poll(timeout_ms)
+        finally:
+            if fds is not None:
+                for fd, events in fds.iteritems():
+                    self.unwatch(fd, events)
+        now = time.time()
+        resumable = []
+        for parked in self.parked:
+            if parked.deadline >= 0 and now >= parked.deadline:
+                resumable.append(parked)
+            elif parked.fds is not None:
+                for fd in parked.fds:
+                    if fd in ready:
+                        resumable.append(parked)
+                        break
+        for parked in resumable:
+            # A fiber resumed earlier may have resumed this one already.
+            if parked in self.parked:
+                self._unpark(parked)
+                space.send(parked.w_fiber, "resume")
+
+    def run(self, space):
+        while self.parked and self.can_progress():
+            self.run_once(space, None, -1.0)
@@ -0,0 +1,291 @@
+import time
+
+from rpython.rlib import jit, rpoll
+
+from topaz.reactor import Reactor
+
+
+class Scheduler(object):
+    """
+    Schedules green threads. Every thread besides the main one runs on its
+    own stacklet. A thread gives up control when it blocks (sleeping, joining,
+    waiting for a lock, a queue or a file descriptor) or once its timeslice,
+    counted in bytecodes, runs out.
+    """
+
+    _immutable_fields_ = ["has_threads?"]
+
+    TIMESLICE = 10000
+
+    def __init__(self, space):
+        self.has_threads = False
+        self.w_current = None
+        self.w_switching_from = None
+        self.threads_w = []
+        self.runnable_w = []
+        self.blocked_w = []
+        self.ticks = self.TIMESLICE
+        self.sthread = None
+
+    def get_current(self, space):
+        return self.w_current or space.w_main_thread
+
+    def tick(self, space):
+        self.ticks -= 1
+        if self.ticks <= 0:
+            self.ticks = self.TIMESLICE
+            self.pass_current(space)
+
+    @jit.dont_look_inside
+    def spawn(self, space, w_thread):
+        from topaz.objects.fiberobject import W_FiberObject
+
+        if self.sthread is None:
+            self.sthread = W_FiberObject.get_sthread(space, space.getexecutioncontext())
+        w_thread.ec.fiber_thread = self.sthread
+        self.threads_w.append(w_thread)
+        self.has_threads = True
+        # The new thread puts itself on the run queue and immediately hands
+        # control back, so every queued thread has a stacklet to switch to.
+        global_state.space = space
+        self.switch_to(space, w_thread)
+
+    @jit.dont_look_inside
+    def pass_current(self, space):
+        self.wake_ready(space, 0)
+        if self.runnable_w:
+            self.runnable_w.append(self.get_current(space))
+            self.switch_to(space, self.runnable_w.pop(0))
+
+    def sleep(self, space, timeout):
+        reactor = space.fromcache(Reactor)
+        if self.has_threads or reactor.current_scheduled_fiber(space) is not None:
+            self.wait_for(space, None, timeout)
+        elif timeout >= 0:
+            deadline = time.time() + timeout
+            while reactor.parked and reactor.can_progress():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                reactor.run_once(space, None, remaining)
+            remaining = deadline - time.time()
+            if remaining > 0:
+                time.sleep(remaining)
+        else:
+            self.block(space)
+
+    def wait_readable(self, space, fd):
+        self.wait_ready(space, fd, rpoll.POLLIN)
+
+    def wait_writable(self, space, fd):
+        self.wait_ready(space, fd, rpoll.POLLOUT)
+
+    def is_cooperative(self, space):
+        """
+        Whether blocking would hold up other threads or scheduled fibers.
+        """
+        return self.has_threads or space.fromcache(Reactor).is_active(space)
+
+    def wait_ready(self, space, fd, events):
+        # With nothing else to run, the IO operation itself may block.
+        if self.is_cooperative(space):
+            while not self.fd_ready(fd, events):
+                self.wait_for(space, {fd: events}, -1.0)
+
+    def fd_ready(self, fd, events):
+        try:
+            return len(rpoll.poll({fd: events}, 0)) > 0
+        except rpoll.PollError:
+            # Let the IO operation itself report the error.
+            return True
+
+    def wait_for(self, space, fds, timeout):
+        """
+        Waits until one of fds (a dict of fds to poll events) may be ready or
+        timeout seconds pass, letting other threads and scheduled fibers run
+        in the meantime. Callers have to check what is actually ready.
+        """
+        reactor = space.fromcache(Reactor)
+        w_fiber = reactor.current_scheduled_fiber(space)
+        if w_fiber is not None:
+            reactor.park(space, w_fiber, fds, timeout)
+        elif self.has_threads:
+            self.block(space, timeout=timeout, fds=fds)
+        elif reactor.parked and reactor.can_progress():
+            reactor.run_once(space, fds, timeout)
+        elif fds is not None:
+            timeout_ms = -1
+            if timeout >= 0:
+                timeout_ms = int(timeout * 1000)
+            try:
+                rpoll.poll(fds, timeout_ms)
+            except rpoll.PollError:
+                pass
+        elif timeout >= 0:
+            time.sleep(timeout)
+        else:
+            self.block(space)
+
+    @jit.dont_look_inside
+    def block(self, space, timeout=-1.0, fds=None):
+        """
+        Suspends the current thread until it's woken up, its timeout (in
+        seconds) expires or one of fds is ready. Callers have to recheck
+        whatever they were waiting for.
+        """
+        w_current = self.get_current(space)
+        w_current.blocked = True
+        if timeout >= 0:
+            w_current.wakeup_time = time.time() + timeout
+        else:
+            w_current.wakeup_time = -1.0
+        w_current.wait_fds = fds
+        if fds is not None:
+            reactor = space.fromcache(Reactor)
+            for fd, events in fds.iteritems():
+                reactor.watch(fd, events)
+        self.blocked_w.append(w_current)
+        self.schedule(space, w_current)
+        error = w_current.pending_error
+        if error is not None:
+            w_current.pending_error = None
+            raise error
+
+    def schedule(self, space, w_current):
+        while True:
+            self.wake_ready(space, 0)
+            if self.runnable_w:
+                self.switch_to(space, self.runnable_w.pop(0))
+                return
+            if not w_current.blocked:
+                return
+            if not self.can_wait():
+                self.unblock(space, w_current)
+                raise space.error(space.w_ThreadError, "No live threads left. Deadlock?")
+            self.wait(space)
+
+    def next_after_exit(self, space):
+        while True:
+            self.wake_ready(space, 0)
+            if self.runnable_w:
+                return self.runnable_w.pop(0)
+            if self.can_wait():
+                self.wait(space)
+            else:
+                # Every remaining thread waits for something that will never
+                # happen, at least the main thread has to be told.
+                w_main = space.w_main_thread
+                w_main.pending_error = space.error(space.w_ThreadError, "No live threads left. Deadlock?")
+                self.wake(space, w_main)
+
+    def can_wait(self):
+        for w_thread in self.blocked_w:
+            if w_thread.wakeup_time >= 0 or w_thread.wait_fds is not None:
+                return True
+        return False
+
+    def wait(self, space):
+        timeout = -1
+        now = time.time()
+        for w_thread in self.blocked_w:
+            if w_thread.wakeup_time >= 0:
+                ms = int((w_thread.wakeup_time - now) * 1000) + 1
+                if ms < 0:
+                    ms = 0
+                if timeout < 0 or ms < timeout:
+                    timeout = ms
+        self.wake_ready(space, timeout)
+
+    def wake_ready(self, space, timeout):
+        if not self.blocked_w:
+            return
+        reactor = space.fromcache(Reactor)
+        ready = None
+        if reactor.has_watches():
+            ready = reactor.poll(timeout)
+        elif timeout > 0:
+            time.sleep(timeout / 1000.0)
+        now = time.time()
+        for w_thread in self.blocked_w[:]:
+            if w_thread.wakeup_time >= 0 and now >= w_thread.wakeup_time:
+                self.wake(space, w_thread)
+            elif w_thread.wait_fds is not None and ready is not None:
+                for fd in w_thread.wait_fds:
+                    if fd in ready:
+                        self.wake(space, w_thread)
+                        break
+
+    def unblock(self, space, w_thread):
+        if w_thread.blocked:
+            w_thread.blocked = False
+            w_thread.wakeup_time = -1.0
+            if w_thread.wait_fds is not None:
+                reactor = space.fromcache(Reactor)
+                for fd, events in w_thread.wait_fds.iteritems():
+                    reactor.unwatch(fd, events)
+                w_thread.wait_fds = None
+            self.blocked_w.remove(w_thread)
+
+    def wake(self, space, w_thread):
+        if w_thread.blocked:
+            self.unblock(space, w_thread)
+            self.runnable_w.append(w_thread)
+
+    def enter(self, space, w_thread):
+        from topaz.objects.fiberobject import State
+
+        self.w_current = w_thread
+        space._executioncontexts.set(w_thread.ec)
+        space.fromcache(State).current = w_thread.w_fiber
+
+    def switch_to(self, space, w_next):
+        from topaz.objects.fiberobject import State
+
+        w_current = self.get_current(space)
+        if w_next is w_current:
+            return
+        w_current.ec = space.getexecutioncontext()
+        w_current.w_fiber = space.fromcache(State).current
+        self.w_switching_from = w_current
+        self.enter(space, w_next)
+        if not w_next.has_stack:
+            h = self.sthread.new(new_thread_callback)
+        else:
+            h = self.sthread.switch(w_next.h)
+        w_current = self.w_switching_from
+        w_current.h = h
+        w_current.has_stack = True
+        self.w_switching_from = None
+
+    def thread_exited(self, space, w_thread):
+        self.threads_w.remove(w_thread)
+        if not self.threads_w:
+            self.has_threads = False
+        for w_joiner in w_thread.joiners_w:
+            self.wake(space, w_joiner)
+
+
+class GlobalState(object):
+    def __init__(self):
+        self.space = None
+global_state = GlobalState()
+
+
+def new_thread_callback(h, arg):
+    space = global_state.space
+    self = space.fromcache(Scheduler)
+    w_thread = self.w_current
+    w_creator = self.w_switching_from
+    w_creator.h = h
+    w_creator.has_stack = True
+    self.w_switching_from = None
+
+    self.runnable_w.append(w_thread)
+    self.switch_to(space, w_creator)
+
+    w_thread.run(space)
+    self.thread_exited(space, w_thread)
+    w_next = self.next_after_exit(space)
+    self.w_switching_from = w_thread
+    self.enter(space, w_next)
+    return w_next.h
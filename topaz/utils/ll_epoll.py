@@ -0,0 +1,92 @@
+import errno
+
+from rpython.rlib import rposix
+from rpython.rtyper.lltypesystem import rffi, lltype
+from rpython.rtyper.tool import rffi_platform as platform
+from rpython.translator.tool.cbuild import ExternalCompilationInfo
+
+from topaz.system import IS_LINUX
+
+
+HAS_EPOLL = IS_LINUX
+
+if HAS_EPOLL:
+    eci = ExternalCompilationInfo(
+        includes=["sys/epoll.h"]
+    )
+
+    class CConfig:
+        _compilation_info_ = eci
+    CConfig.epoll_data = platform.Struct("union epoll_data", [
+        ("fd", rffi.INT),
+    ])
+    CConfig.epoll_event = platform.Struct("struct epoll_event", [
+        ("events", rffi.UINT),
+        ("data", CConfig.epoll_data),
+    ])
+    for name in ["EPOLLIN", "EPOLLOUT", "EPOLLERR", "EPOLLHUP",
+                 "EPOLL_CTL_ADD", "EPOLL_CTL_MOD", "EPOLL_CTL_DEL",
+                 "EPOLL_CLOEXEC"]:
+        setattr(CConfig, name, platform.ConstantInteger(name))
+    config = platform.configure(CConfig)
+
+    EPOLLIN = config["EPOLLIN"]
+    EPOLLOUT = config["EPOLLOUT"]
+    EPOLLERR = config["EPOLLERR"]
+    EPOLLHUP = config["EPOLLHUP"]
+    EPOLL_CTL_ADD = config["EPOLL_CTL_ADD"]
+    EPOLL_CTL_MOD = config["EPOLL_CTL_MOD"]
+    EPOLL_CTL_DEL = config["EPOLL_CTL_DEL"]
+    EPOLL_CLOEXEC = config["EPOLL_CLOEXEC"]
+    EPOLL_EVENT = config["epoll_event"]
+
+    c_epoll_create1 = rffi.llexternal("epoll_create1",
+        [rffi.INT], rffi.INT,
+        compilation_info=eci,
+        save_err=rffi.RFFI_SAVE_ERRNO
+    )
+    c_epoll_ctl = rffi.llexternal("epoll_ctl",
+        [rffi.INT, rffi.INT, rffi.INT, lltype.Ptr(EPOLL_EVENT)], rffi.INT,
+        compilation_info=eci,
+        save_err=rffi.RFFI_SAVE_ERRNO
+    )
+    c_epoll_wait = rffi.llexternal("epoll_wait",
+        [rffi.INT, rffi.CArrayPtr(EPOLL_EVENT), rffi.INT, rffi.INT], rffi.INT,
+        compilation_info=eci,
+        save_err=rffi.RFFI_SAVE_ERRNO
+    )
+
+    def epoll_create():
+        epfd = c_epoll_create1(EPOLL_CLOEXEC)
+        if epfd < 0:
+            raise OSError(rposix.get_saved_errno(), "error in epoll_create")
+        return epfd
+
+    def epoll_ctl(epfd, op, fd, events):
+        with lltype.scoped_alloc(EPOLL_EVENT) as ev:
+            ev.c_events = rffi.cast(rffi.UINT, events)
+            rffi.setintfield(ev.c_data, "c_fd", fd)
+            if c_epoll_ctl(epfd, op, fd, ev) < 0:
+                raise OSError(rposix.get_saved_errno(), "error in epoll_ctl")
+
+    def epoll_wait(epfd, maxevents, timeout):
+        """
+        Returns a list of (fd, events) pairs. Being interrupted by a signal
+        counts as a timeout.
+        """
+        with lltype.scoped_alloc(rffi.CArray(EPOLL_EVENT), maxevents) as evs:
+            n = c_epoll_wait(epfd, evs, maxevents, timeout)
+            if n < 0:
+                err = rposix.get_saved_errno()
+                if err == errno.EINTR:
+                    return []
+                raise OSError(err, "error in epoll_wait")
+            result = []
+            for i in xrange(n):
+                ev = evs[i]
+                result.append((rffi.getintfield(ev.c_data, "c_fd"), rffi.cast(lltype.Signed, ev.c_events)))
+            return result
+else:
+    def epoll_create():
+        raise NotImplementedError("epoll is only available on Linux")
+    epoll_ctl = epoll_wait = epoll_create
@@ -1314,6 +1314,7 @@ def _compile_no_cache(pattern, flags):
 
 
 def compile(cache, pattern, flags=0):
-    if not cache.contains(pattern, flags):
-        cache.set(pattern, flags, _compile_no_cache(pattern, flags))
-    return cache.get(pattern, flags)
+    entry = cache.get(pattern, flags)
+    if entry is None:
+        entry = cache.set(pattern, flags, _compile_no_cache(pattern, flags))
+    return entry.compiled_regexp